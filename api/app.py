@@ -6,14 +6,25 @@ import os
 from flask import Flask, current_app, jsonify, redirect, request
 from werkzeug.exceptions import RequestEntityTooLarge
 
+from auth import get_user_from_request, http_pool_stats, userinfo_cache
+from commands import register_commands
+
 # Configuration
 from config import configure_app
+from error_handlers import APIError, error_handler
 from routes.admin_routes import admin_bp
 from routes.session_routes import session_bp
 from routes.story_routes import story_bp
+from storage.cache import metadata_cache
 
 # Constants
 MOLSTAR_STORIES_URL = "https://molstar.org/mol-view-stories"
+# Token subjects allowed to read /stats; the endpoint is disabled when empty
+STATS_USER_IDS = {
+    user_id.strip()
+    for user_id in os.getenv("STATS_USER_IDS", "").split(",")
+    if user_id.strip()
+}
 
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -34,6 +45,9 @@ app.register_blueprint(session_bp)
 app.register_blueprint(story_bp)
 app.register_blueprint(admin_bp)
 
+# Register maintenance CLI commands
+register_commands(app)
+
 
 @app.route("/health", methods=["GET"])
 @app.route("/ready", methods=["GET"])
@@ -46,17 +60,19 @@ def health():
 
         health_status["timestamp"] = datetime.utcnow().isoformat() + "Z"
 
-        # Check MinIO connectivity
+        # Check MinIO connectivity, or the local storage directory
+        check_name = "minio"
         try:
-            from storage.client import MINIO_BUCKET, MINIO_ENABLED, minio_client
+            from storage.client import get_storage_backend
 
-            if MINIO_ENABLED and minio_client:
-                # Test MinIO connection by listing buckets
-                buckets = minio_client.list_buckets()
-                health_status["checks"]["minio"] = {
+            backend = get_storage_backend()
+            if backend.name != "minio":
+                check_name = "storage"
+            if backend.is_configured():
+                health_status["checks"][check_name] = {
                     "status": "healthy",
-                    "buckets_count": len(buckets),
-                    "configured_bucket": MINIO_BUCKET,
+                    "backend": backend.name,
+                    **backend.ping(),
                 }
             else:
                 health_status["checks"]["minio"] = {
@@ -64,7 +80,10 @@ def health():
                     "message": "MinIO not configured",
                 }
         except Exception as e:
-            health_status["checks"]["minio"] = {"status": "unhealthy", "error": str(e)}
+            health_status["checks"][check_name] = {
+                "status": "unhealthy",
+                "error": str(e),
+            }
             health_status["status"] = "unhealthy"
 
         # Check Flask app status
@@ -168,6 +187,31 @@ def health_check():
     return jsonify({"status": "healthy", "message": "Service is ready"}), 200
 
 
+@app.route("/stats", methods=["GET"])
+@error_handler
+def stats():
+    """Runtime statistics of this worker process, for cache sizing.
+
+    Only the users listed in STATS_USER_IDS may read them.
+    """
+    if not STATS_USER_IDS:
+        raise APIError("Not found", status_code=404)
+    _, user_id = get_user_from_request()
+    if user_id not in STATS_USER_IDS:
+        raise APIError("Access denied", status_code=403)
+
+    return (
+        jsonify(
+            {
+                "metadata_cache": metadata_cache.stats(),
+                "userinfo_cache": userinfo_cache.stats(),
+                "oidc_http_pool": http_pool_stats(),
+            }
+        ),
+        200,
+    )
+
+
 if __name__ == "__main__":
     # Development server - only used when running directly with python
     app.run(host="0.0.0.0", port=5000, debug=False)
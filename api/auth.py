@@ -1,16 +1,207 @@
 """Authentication and authorization utilities."""
 
+import copy
+import hashlib
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 
 import requests
 from flask import request, session
+from jose import JWTError, jwt
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from error_handlers import APIError
 
 logger = logging.getLogger(__name__)
 
+# Userinfo of recently seen tokens is kept for USERINFO_CACHE_TTL_SECONDS, so
+# a token revoked at the identity provider stays usable for at most that long.
+# Tokens the provider rejected are remembered for a shorter time.
+USERINFO_CACHE_MAX_ENTRIES = int(os.getenv("USERINFO_CACHE_MAX_ENTRIES", "10000"))
+USERINFO_CACHE_TTL_SECONDS = float(os.getenv("USERINFO_CACHE_TTL_SECONDS", "60"))
+USERINFO_CACHE_REJECTED_TTL_SECONDS = float(
+    os.getenv("USERINFO_CACHE_REJECTED_TTL_SECONDS", "10")
+)
+
+# Connection pool and retry policy of the HTTP client used for OIDC calls
+OIDC_HTTP_POOL_SIZE = int(os.getenv("OIDC_HTTP_POOL_SIZE", "10"))
+OIDC_HTTP_RETRIES = int(os.getenv("OIDC_HTTP_RETRIES", "2"))
+OIDC_HTTP_CONNECT_TIMEOUT = float(os.getenv("OIDC_HTTP_CONNECT_TIMEOUT", "3"))
+OIDC_HTTP_READ_TIMEOUT = float(os.getenv("OIDC_HTTP_READ_TIMEOUT", "5"))
+
+# Token validation mode: "userinfo" asks the OIDC provider about every new
+# token; "jwt" verifies JWT access tokens locally against the provider's JWKS
+# and only sends opaque tokens to the userinfo endpoint.
+AUTH_MODE = os.getenv("AUTH_MODE", "userinfo").lower()
+OIDC_JWKS_URL = os.getenv(
+    "OIDC_JWKS_URL", "https://login.aai.lifescience-ri.eu/oidc/jwk"
+)
+OIDC_ISSUER = os.getenv("OIDC_ISSUER", "https://login.aai.lifescience-ri.eu/oidc/")
+OIDC_AUDIENCE = os.getenv("OIDC_AUDIENCE") or None
+OIDC_JWKS_REFRESH_SECONDS = float(os.getenv("OIDC_JWKS_REFRESH_SECONDS", "3600"))
+
+# Without an audience check, a token the provider issued to any other client
+# would be accepted
+if AUTH_MODE == "jwt" and OIDC_AUDIENCE is None:
+    raise ValueError(
+        "OIDC_AUDIENCE environment variable is required with AUTH_MODE=jwt"
+    )
+
+# Unknown key IDs trigger a JWKS refresh at most this often
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = 30
+JWT_ALGORITHMS = ["RS256", "RS384", "RS512", "ES256", "ES384", "ES512"]
+
+_http_session = None
+_http_session_pid = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Get the pooled HTTP session for OIDC calls, recreated after a fork.
+
+    Connections are kept alive between requests, so only the first call of
+    a worker process pays for the TCP and TLS handshakes. Connection errors
+    and 502/503/504 responses are retried with backoff.
+    """
+    global _http_session, _http_session_pid
+
+    with _http_session_lock:
+        if _http_session is None or _http_session_pid != os.getpid():
+            retries = Retry(
+                total=OIDC_HTTP_RETRIES,
+                backoff_factor=0.2,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=OIDC_HTTP_POOL_SIZE,
+                max_retries=retries,
+            )
+            http_session = requests.Session()
+            http_session.mount("https://", adapter)
+            http_session.mount("http://", adapter)
+            # Connections inherited from the parent process are not reused
+            _http_session = http_session
+            _http_session_pid = os.getpid()
+        return _http_session
+
+
+def http_pool_stats():
+    """Get the connection pool usage of the OIDC HTTP client, per host."""
+    with _http_session_lock:
+        http_session = _http_session if _http_session_pid == os.getpid() else None
+    if http_session is None:
+        return {"pool_size": OIDC_HTTP_POOL_SIZE, "hosts": {}}
+
+    hosts = {}
+    adapters = {id(adapter): adapter for adapter in http_session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "in_use": pool.pool.maxsize - pool.pool.qsize(),
+                "idle": idle,
+            }
+    return {"pool_size": OIDC_HTTP_POOL_SIZE, "hosts": hosts}
+
+
+class UserinfoCache:
+    """Size-bounded LRU cache of userinfo results keyed by token hash.
+
+    Tokens themselves are never stored. A rejected token is cached as None.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, rejected_ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.rejected_ttl_seconds = rejected_ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.rejected_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def token_key(token):
+        """Get the cache key of a bearer token."""
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Get a cached result as a (found, userinfo) tuple.
+
+        userinfo is None for a token the provider rejected.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            userinfo = entry[0]
+            if userinfo is None:
+                self.rejected_hits += 1
+            else:
+                self.hits += 1
+        return True, copy.deepcopy(userinfo)
+
+    def put(self, key, userinfo):
+        """Cache a userinfo result, or None for a rejected token."""
+        ttl = self.ttl_seconds if userinfo is not None else self.rejected_ttl_seconds
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(userinfo), time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.rejected_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Get the cache counters for sizing and monitoring."""
+        with self._lock:
+            lookups = self.hits + self.rejected_hits + self.misses
+            hits = self.hits + self.rejected_hits
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "rejected_ttl_seconds": self.rejected_ttl_seconds,
+                "hits": self.hits,
+                "rejected_hits": self.rejected_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+            }
+
+
+userinfo_cache = UserinfoCache(
+    USERINFO_CACHE_MAX_ENTRIES,
+    USERINFO_CACHE_TTL_SECONDS,
+    USERINFO_CACHE_REJECTED_TTL_SECONDS,
+)
+
 
 def session_required(f):
     """Decorator to ensure the request has a valid session."""
@@ -27,26 +218,204 @@ def session_required(f):
     return decorated
 
 
+class JwksCache:
+    """Signing keys of the OIDC provider, refreshed in the background.
+
+    The first lookup fetches the key set; a daemon thread then refreshes it
+    every refresh interval. A token signed with an unknown key ID triggers
+    an early refresh, so key rotation is picked up without waiting. If a
+    refresh fails, the previously fetched keys stay in use.
+    """
+
+    def __init__(self, url, refresh_seconds):
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refresher_pid = None
+
+    def refresh(self):
+        """Fetch the key set now. Returns True if it was fetched."""
+        try:
+            response = get_http_session().get(
+                self.url,
+                timeout=(OIDC_HTTP_CONNECT_TIMEOUT, OIDC_HTTP_READ_TIMEOUT),
+            )
+            response.raise_for_status()
+            keys = {
+                key["kid"]: key
+                for key in response.json().get("keys", [])
+                if key.get("kid") and key.get("use", "sig") == "sig"
+            }
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Failed to fetch JWKS from {self.url}: {e}")
+            return False
+
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+        logger.info(f"Fetched {len(keys)} signing keys from {self.url}")
+        return True
+
+    def _refresh_periodically(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            self.refresh()
+
+    def _ensure_refresher(self):
+        """Start the background refresh thread of this process, once."""
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+        threading.Thread(
+            target=self._refresh_periodically, name="jwks-refresh", daemon=True
+        ).start()
+
+    def get_key(self, kid):
+        """Get a signing key by its ID.
+
+        Returns:
+            dict or None: The JWK, or None if the provider does not list it
+
+        Raises:
+            LookupError: If no key set could be fetched at all
+        """
+        self._ensure_refresher()
+        with self._lock:
+            key = self._keys.get(kid)
+            fetched_at = self._fetched_at
+        if key is not None:
+            return key
+
+        if (
+            fetched_at is None
+            or time.monotonic() - fetched_at >= JWKS_MIN_REFRESH_INTERVAL_SECONDS
+        ):
+            self.refresh()
+        with self._lock:
+            if self._fetched_at is None:
+                raise LookupError(f"No JWKS available from {self.url}")
+            return self._keys.get(kid)
+
+    def clear(self):
+        """Forget the fetched keys."""
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+
+
+jwks_cache = JwksCache(OIDC_JWKS_URL, OIDC_JWKS_REFRESH_SECONDS)
+
+
+def is_jwt(token):
+    """Check whether a bearer token looks like a JWT rather than an opaque token."""
+    return token.count(".") == 2
+
+
+def verify_jwt_token(token):
+    """Verify a JWT access token locally and map its claims to userinfo.
+
+    Returns:
+        dict: Userinfo with 'sub', 'name' and 'email', as create_metadata expects
+
+    Raises:
+        APIError: 401 if the token is invalid, expired or signed by an unknown key
+        LookupError: If the provider's signing keys are unavailable
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+        key = jwks_cache.get_key(header.get("kid"))
+        if key is None:
+            raise JWTError("Token is signed with an unknown key")
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=JWT_ALGORITHMS,
+            audience=OIDC_AUDIENCE,
+            issuer=OIDC_ISSUER,
+            options={"require_aud": True, "verify_at_hash": False},
+        )
+    except JWTError as e:
+        logger.warning(f"JWT validation failed: {e}")
+        raise APIError(
+            "Failed to validate token", status_code=401, details={"error": str(e)}
+        )
+
+    if not claims.get("sub"):
+        raise APIError(
+            "Failed to validate token",
+            status_code=401,
+            details={"error": "Token has no subject"},
+        )
+
+    return {
+        "sub": claims["sub"],
+        "name": claims.get("name") or claims.get("preferred_username", ""),
+        "email": claims.get("email", ""),
+        "preferred_username": claims.get("preferred_username", ""),
+    }
+
+
+def authenticate_token(token):
+    """Validate a bearer token and get the userinfo of its owner.
+
+    In "jwt" mode, JWT access tokens are verified locally. Opaque tokens, and
+    all tokens while the provider's signing keys cannot be fetched, are
+    validated by the userinfo endpoint.
+    """
+    if AUTH_MODE == "jwt" and is_jwt(token):
+        try:
+            return verify_jwt_token(token)
+        except LookupError as e:
+            logger.warning(f"{e}; validating token with userinfo instead")
+    return make_userinfo_request(token)
+
+
 def make_userinfo_request(token):
-    """Make a request to the OIDC /userinfo endpoint to validate the token."""
+    """Make a request to the OIDC /userinfo endpoint to validate the token.
+
+    Results are cached per token, including rejections by the provider, so
+    repeated requests with the same token cost no round trip.
+    """
+    cache_key = UserinfoCache.token_key(token)
+    found, userinfo = userinfo_cache.get(cache_key)
+    if found:
+        if userinfo is None:
+            raise APIError(
+                "Failed to validate token",
+                status_code=401,
+                details={"error": "Token was rejected by the identity provider"},
+            )
+        return userinfo
+
     userinfo_endpoint = os.getenv(
         "OIDC_USERINFO_URL", "https://login.aai.lifescience-ri.eu/oidc/userinfo"
     )
     headers = {"Authorization": f"Bearer {token}"}
 
     try:
-        with requests.Session() as session:
-            response = session.get(userinfo_endpoint, headers=headers, timeout=5)
+        response = get_http_session().get(
+            userinfo_endpoint,
+            headers=headers,
+            timeout=(OIDC_HTTP_CONNECT_TIMEOUT, OIDC_HTTP_READ_TIMEOUT),
+        )
         response.raise_for_status()
         userinfo = response.json()
         logger.info(f'Userinfo request successful: {userinfo.get("name")}')
-        return userinfo
     except requests.exceptions.RequestException as e:
         logger.error(f"Error during userinfo request: {e}")
+        # Only a definite rejection is cached; outages must not lock users out
+        if getattr(e.response, "status_code", None) == 401:
+            userinfo_cache.put(cache_key, None)
         raise APIError(
             "Failed to validate token", status_code=401, details={"error": str(e)}
         )
 
+    userinfo_cache.put(cache_key, userinfo)
+    return userinfo
+
 
 def get_user_from_request():
     """Extract and validate user info from Authorization header."""
@@ -59,5 +428,5 @@ def get_user_from_request():
         raise APIError("Invalid token format", status_code=401)
 
     token = parts[1]
-    user_info = make_userinfo_request(token)
+    user_info = authenticate_token(token)
     return user_info, user_info.get("sub")
@@ -0,0 +1,27 @@
+"""Flask CLI commands for storage maintenance.
+
+Run from the API directory, e.g. ``flask --app app rebuild-index``.
+"""
+
+import click
+
+
+def register_commands(app):
+    """Register the maintenance commands on the Flask app."""
+
+    @app.cli.command("rebuild-index")
+    def rebuild_index_command():
+        """Rebuild the story/session ID index from a full storage scan."""
+        from storage import rebuild_id_index
+
+        written = rebuild_id_index()
+        for data_type, count in written.items():
+            click.echo(f"Indexed {count} {data_type} objects")
+
+    @app.cli.command("rebuild-catalog")
+    def rebuild_catalog_command():
+        """Rebuild the public story catalog from a full storage scan."""
+        from storage import rebuild_story_catalog
+
+        count = rebuild_story_catalog()
+        click.echo(f"Catalogued {count} stories")
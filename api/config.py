@@ -5,7 +5,7 @@ import os
 
 from flask_cors import CORS
 
-from utils import SizeValidationMiddleware
+from utils import SizeValidationMiddleware, SpooledUploadRequest
 
 
 def configure_cors(app):
@@ -16,14 +16,42 @@ def configure_cors(app):
             r"/api/story/*/data": {
                 "origins": "*",  # Allow any origin for public story data
                 "methods": ["GET", "OPTIONS"],
-                "allow_headers": ["Content-Type", "Accept"],
-                "expose_headers": ["Content-Type"],
+                "allow_headers": [
+                    "Content-Type",
+                    "Accept",
+                    "Range",
+                    "If-None-Match",
+                    "If-Modified-Since",
+                    "If-Range",
+                ],
+                "expose_headers": [
+                    "Content-Type",
+                    "Content-Length",
+                    "Content-Range",
+                    "Accept-Ranges",
+                    "ETag",
+                    "Last-Modified",
+                ],
             },
             r"/api/story/*/session-data": {
                 "origins": "*",  # Allow any origin for public session data
                 "methods": ["GET", "HEAD", "OPTIONS"],
-                "allow_headers": ["Content-Type", "Accept"],
-                "expose_headers": ["Content-Type", "Content-Length"],
+                "allow_headers": [
+                    "Content-Type",
+                    "Accept",
+                    "Range",
+                    "If-None-Match",
+                    "If-Modified-Since",
+                    "If-Range",
+                ],
+                "expose_headers": [
+                    "Content-Type",
+                    "Content-Length",
+                    "Content-Range",
+                    "Accept-Ranges",
+                    "ETag",
+                    "Last-Modified",
+                ],
             },
             r"/*": {
                 "origins": [
@@ -43,7 +71,7 @@ def configure_cors(app):
                     "Origin",
                     "X-Requested-With",
                 ],
-                "expose_headers": ["Content-Type"],
+                "expose_headers": ["Content-Type", "X-Next-Cursor"],
                 "supports_credentials": True,
                 "max_age": 86400,  # Cache preflight requests for 24 hours
             },
@@ -77,6 +105,9 @@ def configure_app(app):
     app.config["MAX_CONTENT_LENGTH"] = max_size_bytes
     app.config["MAX_UPLOAD_SIZE_MB"] = max_upload_size_mb  # Store for use in decorators
 
+    # Spool uploaded files to disk beyond a small in-memory buffer
+    app.request_class = SpooledUploadRequest
+
     # Add WSGI middleware for request size validation
     # This provides early validation before Flask processes the request
     logger = logging.getLogger(__name__)
@@ -4,7 +4,7 @@ import logging
 
 from flask import Blueprint, jsonify, request
 
-from auth import make_userinfo_request
+from auth import authenticate_token
 from error_handlers import APIError, error_handler
 
 logger = logging.getLogger(__name__)
@@ -26,7 +26,7 @@ def userinfo():
         raise APIError("Invalid token format", status_code=401)
 
     token = parts[1]
-    userinfo = make_userinfo_request(token)
+    userinfo = authenticate_token(token)
     return jsonify(userinfo), 200
 
 
@@ -43,6 +43,6 @@ def verify():
         raise APIError("Invalid token format", status_code=401)
 
     token = parts[1]
-    userinfo = make_userinfo_request(token)
+    userinfo = authenticate_token(token)
     logger.info(f'Token verified for user: {userinfo.get("name")}')
     return jsonify({"authenticated": True, "user": userinfo}), 200
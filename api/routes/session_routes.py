@@ -14,20 +14,25 @@ from auth import get_user_from_request
 from error_handlers import APIError, error_handler
 from schemas import SessionUpdate
 from storage import (
-    MINIO_BUCKET,
+    SESSION_ENCODING_LEGACY_WRAPPER,
+    SESSION_ENCODING_MSGPACK,
     check_user_session_limit,
-    count_user_sessions,
-    count_user_stories,
+    count_user_objects,
     create_metadata,
     delete_all_user_data,
     delete_session_by_id,
+    detect_session_encoding,
     find_object_by_id,
-    list_objects_by_type,
-    minio_client,
+    get_session_encoding,
+    list_objects_page,
+    open_minio_object,
+    parse_pagination_args,
+    read_job,
     save_object,
+    submit_job,
     update_session_by_id,
 )
-from utils import validate_payload_size
+from utils import get_upload_stream, validate_payload_size
 
 # update
 logger = logging.getLogger(__name__)
@@ -87,47 +92,36 @@ def _extract_and_validate_file(files):
     if not isinstance(file, FileStorage) or not file.filename:
         raise APIError("Invalid file upload", status_code=400)
 
-    # Read file data
-    try:
-        file_data = file.read()
-        if not file_data:
-            raise APIError("File cannot be empty", status_code=400)
-    except Exception as e:
-        raise APIError(f"Error reading file: {str(e)}", status_code=400)
+    # Get the spooled upload without reading it into memory
+    file_stream, file_size = get_upload_stream(file)
+    if not file_size:
+        raise APIError("File cannot be empty", status_code=400)
 
     # Validate file size
     max_size_mb = current_app.config.get("MAX_UPLOAD_SIZE_MB", 100)
     max_size_bytes = max_size_mb * 1024 * 1024
-    if len(file_data) > max_size_bytes:
-        size_mb = len(file_data) / (1024 * 1024)
+    if file_size > max_size_bytes:
+        size_mb = file_size / (1024 * 1024)
         raise APIError(
             f"File too large: {size_mb:.1f}MB (max: {max_size_mb}MB)", status_code=413
         )
 
-    # Validate file content (should be valid msgpack)
-    try:
-        from schemas import _decompress_msgpack_data, _validate_msgpack_format
-
-        msgpack_data = _decompress_msgpack_data(file_data)
-        _validate_msgpack_format(msgpack_data)
-    except Exception as e:
-        raise APIError(f"Invalid session file format: {str(e)}", status_code=400)
-
-    return file_data
+    # The content is validated while it is uploaded to storage
+    return file_stream
 
 
 def _validate_session_formdata(form_data, files):
     """Validate FormData input for session creation/update."""
     title, description, tags, filename = _parse_form_fields(form_data)
     _validate_required_fields(title, filename)
-    file_data = _extract_and_validate_file(files)
+    file_stream = _extract_and_validate_file(files)
 
     return {
         "title": title,
         "description": description,
         "tags": tags,
         "filename": filename,
-        "file_data": file_data,
+        "file_data": file_stream,
     }
 
 
@@ -180,7 +174,7 @@ def _create_session_formdata():
         "title": validated_data["title"],
         "description": validated_data["description"],
         "tags": validated_data["tags"],
-        "data": validated_data["file_data"],  # Raw binary data
+        "data": validated_data["file_data"],  # Spooled binary upload
     }
 
     # Save the session
@@ -195,9 +189,17 @@ def list_sessions():
     # Get user info from request (always required since sessions are private)
     user_info, user_id = get_user_from_request()
 
-    # Get all sessions for this user (they're all private)
-    sessions = list_objects_by_type("session", user_id=user_id)
-    return jsonify(sessions), 200
+    sort, limit, after = parse_pagination_args(request.args)
+
+    # Get this user's sessions (they're all private)
+    sessions, next_cursor = list_objects_page(
+        "session", user_id=user_id, sort=sort, after=after, limit=limit
+    )
+
+    response = jsonify(sessions)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
 
 
 def _handle_get_session(session_id):
@@ -365,29 +367,23 @@ def _process_optional_file_update(files):
         return None
 
     try:
-        file_data = file.read()
-        if not file_data:  # Skip empty files
+        # Get the spooled upload without reading it into memory
+        file_stream, file_size = get_upload_stream(file)
+        if not file_size:  # Skip empty files
             return None
 
         # Validate file size
         max_size_mb = current_app.config.get("MAX_UPLOAD_SIZE_MB", 100)
         max_size_bytes = max_size_mb * 1024 * 1024
-        if len(file_data) > max_size_bytes:
-            size_mb = len(file_data) / (1024 * 1024)
+        if file_size > max_size_bytes:
+            size_mb = file_size / (1024 * 1024)
             raise APIError(
                 f"File too large: {size_mb:.1f}MB (max: {max_size_mb}MB)",
                 status_code=413,
             )
 
-        # Validate file content
-        try:
-            from schemas import _decompress_msgpack_data, _validate_msgpack_format
-
-            msgpack_data = _decompress_msgpack_data(file_data)
-            _validate_msgpack_format(msgpack_data)
-            return file_data
-        except Exception as e:
-            raise APIError(f"Invalid session file format: {str(e)}", status_code=400)
+        # The content is validated while it is uploaded to storage
+        return file_stream
 
     except Exception as e:
         raise APIError(f"Error reading file: {str(e)}", status_code=400)
@@ -397,9 +393,9 @@ def _validate_session_formdata_update(form_data, files):
     """Validate FormData input for session update (all fields optional)."""
     update_data = _parse_optional_form_fields(form_data)
 
-    file_data = _process_optional_file_update(files)
-    if file_data:
-        update_data["data"] = file_data
+    file_stream = _process_optional_file_update(files)
+    if file_stream is not None:
+        update_data["data"] = file_stream
 
     if not update_data:
         raise APIError("No valid update data provided", status_code=400)
@@ -440,32 +436,23 @@ def session_by_id(session_id):
         return _handle_delete_session(session_id)
 
 
-def _is_legacy_msgpack(data):
-    """Check if data is legacy msgpack format without throwing exceptions."""
-    try:
-        parsed = msgpack.unpackb(data, raw=False)
-        return isinstance(parsed, dict) and "data" in parsed
-    except (msgpack.exceptions.ExtraData, ValueError, TypeError):
-        return False
-
-
-def _is_old_msgpack(data):
-    """Check if data is old msgpack format (parseable but no wrapper)."""
-    try:
-        parsed = msgpack.unpackb(data, raw=False)
-        return not (isinstance(parsed, dict) and "data" in parsed)
-    except (msgpack.exceptions.ExtraData, ValueError, TypeError):
-        return False
+def _convert_session_data_to_base64(raw_bytes, encoding=None):
+    """Convert session data to base64 based on its stored encoding.
 
+    Args:
+        raw_bytes: The stored session blob
+        encoding: The encoding recorded when the blob was stored, or None for
+            blobs stored before encodings were recorded, which are sniffed
+    """
+    if encoding is None:
+        encoding = detect_session_encoding(raw_bytes)
 
-def _convert_session_data_to_base64(raw_bytes):
-    """Convert session data to base64 based on format detection."""
-    if _is_legacy_msgpack(raw_bytes):
+    if encoding == SESSION_ENCODING_LEGACY_WRAPPER:
         # Legacy format: msgpack wrapper with metadata
         file_data = msgpack.unpackb(raw_bytes, raw=False)
         safe_data = _bytes_to_base64(file_data["data"])
         logger.info("Loaded session data in legacy format (msgpack wrapper)")
-    elif _is_old_msgpack(raw_bytes):
+    elif encoding == SESSION_ENCODING_MSGPACK:
         # Old format: raw msgpack without wrapper
         file_data = msgpack.unpackb(raw_bytes, raw=False)
         safe_data = _bytes_to_base64(file_data)
@@ -507,11 +494,12 @@ def get_session_data(session_id):
         data_path = f"{object_path}/data.mvstory"
 
         logger.info(f"Attempting to read session data from: {data_path}")
-        response = minio_client.get_object(MINIO_BUCKET, data_path)
-        raw_bytes = response.read()
-        response.close()
+        stat, read = open_minio_object(data_path)
+        raw_bytes = b"".join(read())
 
-        safe_data = _convert_session_data_to_base64(raw_bytes)
+        safe_data = _convert_session_data_to_base64(
+            raw_bytes, get_session_encoding(stat)
+        )
         return jsonify(safe_data), 200
 
     except Exception as e:
@@ -528,8 +516,12 @@ def delete_all_user_data_endpoint():
     - All sessions created by the user (always private)
     - All stories created by the user (always public)
 
+    With `?async=true`, the deletion runs in the background and its progress
+    can be polled at /api/user/delete-all/<job_id>.
+
     Returns:
         200: Success with deletion summary
+        202: Deletion started in the background, with the job ID
         401: Authentication required
         500: Server error during deletion
     """
@@ -540,6 +532,20 @@ def delete_all_user_data_endpoint():
         f"Delete all data request from user: {user_id} ({user_info.get('name', 'Unknown')})"
     )
 
+    # Very large accounts can be deleted in the background
+    if request.args.get("async", "").lower() == "true":
+        job = submit_job("delete_all_user_data", user_id, delete_all_user_data, user_id)
+        return (
+            jsonify(
+                {
+                    "job_id": job["job_id"],
+                    "status": job["status"],
+                    "status_uri": f"/api/user/delete-all/{job['job_id']}",
+                }
+            ),
+            202,
+        )
+
     # Perform the deletion
     result = delete_all_user_data(user_id)
 
@@ -548,6 +554,31 @@ def delete_all_user_data_endpoint():
     return jsonify(result), 200
 
 
+@session_bp.route("/api/user/delete-all/<job_id>", methods=["GET"])
+@error_handler
+def get_delete_all_job(job_id):
+    """Get the status of a background deletion started by the current user.
+
+    Returns:
+        200: Job record with status 'pending', 'running', 'completed' (with
+            the deletion summary as 'result'), 'failed' (with 'error') or
+            'interrupted' (its worker was restarted; submit it again)
+        401: Authentication required
+        404: No such job for this user
+    """
+    user_info, user_id = get_user_from_request()
+
+    job = read_job(job_id)
+    if (
+        not job
+        or job.get("type") != "delete_all_user_data"
+        or job.get("user_id") != user_id
+    ):
+        raise APIError("Job not found", status_code=404)
+
+    return jsonify(job), 200
+
+
 @session_bp.route("/api/user/quota", methods=["GET"])
 @error_handler
 def get_user_quota():
@@ -569,9 +600,10 @@ def get_user_quota():
     )
 
     try:
-        # Get current counts
-        current_sessions = count_user_sessions(user_id)
-        current_stories = count_user_stories(user_id)
+        # Get current counts from a single listing
+        counts = count_user_objects(user_id)
+        current_sessions = counts["session"]
+        current_stories = counts["story"]
 
         # Get limits from config
         max_sessions = current_app.config.get("MAX_SESSIONS_PER_USER", 100)
@@ -1,28 +1,41 @@
 """Story-related route handlers."""
 
-import io
 import json
 import logging
 from datetime import datetime, timezone
 
-from flask import Blueprint, current_app, jsonify, request, send_file
+from flask import Blueprint, current_app, jsonify, make_response, request
 from pydantic import ValidationError
 
 from auth import get_user_from_request
 from error_handlers import APIError, error_handler
-from schemas import BaseItemUpdate, StoryInput
+from schemas import BaseItemUpdate, StoryInput, validate_mvsx_stream
 from storage import (
-    MINIO_BUCKET,
+    GZIP_VARIANT_SUFFIX,
+    ObjectChangedError,
+    ObjectNotFoundError,
     check_user_story_limit,
     create_metadata,
     delete_story_by_id,
-    list_objects_by_type,
-    minio_client,
+    find_object_by_id,
+    get_gzip_variant_etag,
+    is_wrapped_mvsj,
+    list_objects_page,
+    lookup_object,
+    open_minio_object,
+    parse_pagination_args,
     save_object,
     save_story_with_session,
     update_story_by_id,
 )
-from utils import validate_payload_size
+from utils import (
+    conditional_object_response,
+    get_upload_stream,
+    set_object_validators,
+    stream_json_array,
+    stream_object_response,
+    validate_payload_size,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -40,14 +53,20 @@ def generate_public_uri(object_type, object_id):
 
 def _get_story_by_id(story_id):
     """Find a story by ID and return it with public URI."""
-    stories = list_objects_by_type("story")
+    story_obj = find_object_by_id(story_id, "story")
+    if not story_obj:
+        raise APIError("Story not found", status_code=404)
+
+    story_obj["public_uri"] = generate_public_uri("story", story_id)
+    return story_obj
 
-    # Find the requested story
-    for story_obj in stories:
-        if story_obj.get("id") == story_id:
-            story_obj["public_uri"] = generate_public_uri("story", story_id)
-            return story_obj
-    raise APIError("Story not found", status_code=404)
+
+def _get_story_location(story_id):
+    """Find a story's index record (metadata plus data extension) by ID."""
+    entry = lookup_object(story_id, "story")
+    if not entry:
+        raise APIError("Story not found", status_code=404)
+    return entry
 
 
 def _validate_payload_size_inline(max_size_mb):
@@ -281,20 +300,21 @@ def _validate_and_process_story_file(files, title):
     if not story_file or not story_file.filename:
         raise APIError(f"Story {story_type} file must have a filename", status_code=400)
 
-    # Read and process story data
-    story_data = story_file.read()
-    if not story_data:
+    # Get the spooled upload without reading it into memory
+    story_stream, story_size = get_upload_stream(story_file)
+    if not story_size:
         raise APIError(f"Story {story_type} file cannot be empty", status_code=400)
 
     if story_type == "mvsx":
-        # For .mvsx files, keep as binary
-        processed_story_data = story_data
-    else:  # mvsj
-        # For .mvsj files, parse as JSON
+        # For .mvsx files, check the zip directory and stream it to storage
         try:
-            processed_story_data = json.loads(story_data.decode("utf-8"))
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            raise APIError("Invalid .mvsj file format", status_code=400)
+            validate_mvsx_stream(story_stream)
+        except ValueError as e:
+            raise APIError(f"Invalid .mvsx file format: {str(e)}", status_code=400)
+        processed_story_data = story_stream
+    else:  # mvsj
+        # .mvsj files are validated and stored as uploaded, without parsing
+        processed_story_data = story_stream
 
     return story_filename, processed_story_data
 
@@ -312,30 +332,32 @@ def _validate_and_process_session_file(files, title):
     elif not session_file.filename.endswith(".mvstory"):
         raise APIError("Session file must have .mvstory extension", status_code=400)
 
-    session_data = session_file.read()
-    if not session_data:
+    # Get the spooled upload without reading it into memory
+    session_stream, session_size = get_upload_stream(session_file)
+    if not session_size:
         raise APIError("Session file cannot be empty", status_code=400)
 
-    return session_data
+    return session_stream
+
 
+def _get_story_data_extensions(requested_format, known_extension=None):
+    """Get list of extensions to try based on requested format.
 
-def _get_story_data_extensions(requested_format):
-    """Get list of extensions to try based on requested format."""
+    The extension recorded in the ID index is tried first, so a story is
+    normally served with a single storage read.
+    """
     if requested_format in ["mvsj", "mvsx"]:
         return [f".{requested_format}"]
+    elif known_extension == ".mvsx":
+        return [".mvsx", ".mvsj"]
     else:
         return [".mvsj", ".mvsx"]
 
 
-def _serve_mvsx_file(file_bytes, matching_story, story_id):
-    """Serve MVSX file as binary ZIP."""
+def _serve_mvsx_file(stat, read, matching_story, story_id):
+    """Serve MVSX file as binary ZIP, streamed from storage."""
     filename = matching_story.get("filename", f"story_{story_id}.mvsx")
-    return send_file(
-        io.BytesIO(file_bytes),
-        mimetype="application/zip",
-        as_attachment=True,
-        download_name=filename,
-    )
+    return stream_object_response(stat, read, "application/zip", download_name=filename)
 
 
 def _serve_mvsj_file(file_bytes):
@@ -349,19 +371,73 @@ def _serve_mvsj_file(file_bytes):
         return file_data, 200
 
 
+def _open_gzip_variant(data_path, stat):
+    """Open the precompressed gzip variant of a stored .mvsj, if it is current."""
+    variant_etag = get_gzip_variant_etag(stat)
+    if not variant_etag:
+        return None
+    try:
+        variant_stat, variant_read = open_minio_object(
+            f"{data_path}{GZIP_VARIANT_SUFFIX}"
+        )
+    except Exception as e:
+        logger.warning(f"Could not open gzip variant of {data_path}: {str(e)}")
+        return None
+    if variant_stat.etag != variant_etag:
+        return None
+    return variant_stat, variant_read
+
+
+def _serve_stored_mvsj_file(data_path, stat, read):
+    """Serve stored MVSJ bytes as is, gzip-encoded if the client accepts it."""
+    variant = None
+    if request.accept_encodings.quality("gzip") > 0:
+        variant = _open_gzip_variant(data_path, stat)
+
+    if variant is None:
+        response = stream_object_response(stat, read, "application/json")
+    else:
+        response = stream_object_response(*variant, "application/json")
+        if response.status_code in (200, 206):
+            response.content_encoding = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
 def _try_read_story_file(object_path, ext, matching_story, story_id):
     """Try to read a story file with given extension."""
     data_path = f"{object_path}/data{ext}"
     logger.info(f"Attempting to read story data from: {data_path}")
 
-    response = minio_client.get_object(MINIO_BUCKET, data_path)
-    file_bytes = response.read()
-    response.close()
+    stat, read = open_minio_object(data_path)
 
     if ext == ".mvsx":
-        return _serve_mvsx_file(file_bytes, matching_story, story_id)
-    else:
-        return _serve_mvsj_file(file_bytes)
+        return _serve_mvsx_file(stat, read, matching_story, story_id)
+
+    # Stored bytes that need no unwrapping are served verbatim
+    if is_wrapped_mvsj(stat) is False:
+        return _serve_stored_mvsj_file(data_path, stat, read)
+
+    not_modified = conditional_object_response(stat)
+    if not_modified is not None:
+        return not_modified
+    response = make_response(_serve_mvsj_file(b"".join(read())))
+    set_object_validators(response, stat)
+    return response
+
+
+def _read_story_file(object_path, ext, matching_story, story_id):
+    """Read a story file, retrying once if it is replaced while being read."""
+    try:
+        return _try_read_story_file(object_path, ext, matching_story, story_id)
+    except ObjectChangedError as e:
+        logger.info(f"Story data changed while being read, retrying: {str(e)}")
+    try:
+        return _try_read_story_file(object_path, ext, matching_story, story_id)
+    except ObjectChangedError as e:
+        raise APIError(
+            "Story data is being updated, please retry shortly", status_code=503
+        ) from e
 
 
 @story_bp.route("/api/story", methods=["POST"])
@@ -557,18 +633,25 @@ def list_stories():
             # If token is invalid, return 401
             raise APIError("Invalid or expired token", status_code=401)
 
+    sort, limit, after = parse_pagination_args(request.args)
+
     # If user_id is present, filter by user; else, return all stories
-    if user_id:
-        stories = list_objects_by_type("story", user_id=user_id)
-    else:
-        stories = list_objects_by_type("story")
+    stories, next_cursor = list_objects_page(
+        "story", user_id=user_id, sort=sort, after=after, limit=limit
+    )
 
-    # Add public URIs to all stories
-    for story in stories:
-        if "id" in story:
-            story["public_uri"] = generate_public_uri("story", story["id"])
+    # Add public URIs to copies of the stories (the listing may be shared)
+    # while they are encoded; the generator runs outside the app context
+    base_uri = generate_public_uri("story", "")
+    stories_with_uris = (
+        dict(story, public_uri=base_uri + story["id"]) if "id" in story else story
+        for story in stories
+    )
 
-    return jsonify(stories), 200
+    response = stream_json_array(stories_with_uris)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 
 @story_bp.route("/api/story/<story_id>", methods=["GET", "PUT", "DELETE"])
@@ -602,7 +685,8 @@ def get_story_data(story_id):
     - No format parameter (tries both .mvsj and .mvsx)
     """
     # Find the story (no authentication needed since stories are public)
-    matching_story = _get_story_by_id(story_id)
+    story_location = _get_story_location(story_id)
+    matching_story = story_location["metadata"]
 
     # Get the data file from storage
     try:
@@ -614,12 +698,14 @@ def get_story_data(story_id):
 
         # Check if a specific format is requested
         requested_format = request.args.get("format", "").lower()
-        extensions_to_try = _get_story_data_extensions(requested_format)
+        extensions_to_try = _get_story_data_extensions(
+            requested_format, story_location.get("data_extension")
+        )
 
         for ext in extensions_to_try:
             try:
-                return _try_read_story_file(object_path, ext, matching_story, story_id)
-            except Exception as e:
+                return _read_story_file(object_path, ext, matching_story, story_id)
+            except ObjectNotFoundError as e:
                 logger.debug(f"Failed to read {ext} file: {str(e)}")
                 continue
 
@@ -634,6 +720,8 @@ def get_story_data(story_id):
         else:
             logger.error(f"No valid story data found for story: {story_id}")
             raise APIError("Story data not found", status_code=404)
+    except APIError:
+        raise
     except Exception as e:
         logger.error(f"Error reading story data: {str(e)}")
         raise APIError("Story data not found", status_code=404)
@@ -648,7 +736,6 @@ def get_story_session_data(story_id):
 
     try:
         story_user_id = matching_story["creator"]["id"]
-        from storage import MINIO_BUCKET, minio_client
         from storage.utils import get_plural_type
 
         path_type = get_plural_type("story")
@@ -657,15 +744,13 @@ def get_story_session_data(story_id):
 
         # Check if session data exists
         try:
-            response = minio_client.get_object(MINIO_BUCKET, session_path)
-            session_bytes = response.read()
-            response.close()
-
-            # Return raw binary data with appropriate content type
-            return send_file(
-                io.BytesIO(session_bytes),
-                mimetype="application/x-deflate",
-                as_attachment=True,
+            stat, read = open_minio_object(session_path)
+
+            # Stream raw binary data with appropriate content type
+            return stream_object_response(
+                stat,
+                read,
+                "application/x-deflate",
                 download_name=f"{matching_story.get('title', story_id)}.mvstory",
             )
 
@@ -683,17 +768,17 @@ def get_story_session_data(story_id):
 def get_story_format(story_id):
     """Return the format (mvsj or mvsx) of the story's data file based on S3 extension."""
     # Find the story (no authentication needed since stories are public)
-    stories = list_objects_by_type("story")
-    matching_story = None
-    for story_obj in stories:
-        if story_obj.get("id") == story_id:
-            matching_story = story_obj
-            break
-    if not matching_story:
-        raise APIError("Story not found", status_code=404)
+    story_location = _get_story_location(story_id)
+    matching_story = story_location["metadata"]
+
+    # The index records the data extension, so no storage call is needed
+    data_extension = story_location.get("data_extension")
+    if data_extension in [".mvsj", ".mvsx"]:
+        return jsonify({"format": data_extension[1:]})
+
     try:
         story_user_id = matching_story["creator"]["id"]
-        from storage import MINIO_BUCKET, minio_client
+        from storage import stat_object
         from storage.utils import get_plural_type
 
         path_type = get_plural_type("story")
@@ -702,7 +787,7 @@ def get_story_format(story_id):
         for ext in [".mvsj", ".mvsx"]:
             data_path = f"{object_path}/data{ext}"
             try:
-                minio_client.stat_object(MINIO_BUCKET, data_path)
+                stat_object(data_path)
                 return jsonify({"format": ext[1:]})  # Remove dot
             except Exception:
                 continue
@@ -1,8 +1,12 @@
 """Schema definitions for metadata validation."""
 
 import base64
+import codecs
+import io
 import json
 import os
+import re
+import struct
 import zlib
 from typing import Any, Dict, List, Optional, Union
 
@@ -67,6 +71,16 @@ story_metadata_schema = {
     },
 }
 
+# Uploads are validated in chunks of this many (decompressed) bytes
+VALIDATION_CHUNK_SIZE = 64 * 1024
+
+# The compression ratio is only checked past this much decompressed data
+SESSION_COMPRESSION_RATIO_MIN_BYTES = 1024 * 1024
+MVSX_COMPRESSION_RATIO_MIN_BYTES = 1024 * 1024
+
+# JSON uploads up to this size are validated with the (faster) C parser
+JSON_IN_MEMORY_VALIDATION_MAX_BYTES = 8 * 1024 * 1024
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -99,21 +113,462 @@ def _decode_and_validate_base64(data_str, data_type="data"):
     return byte_data
 
 
-def _decompress_msgpack_data(byte_data):
-    """Try to decompress data, fallback to raw bytes if not compressed."""
+def _is_zlib_header(head):
+    """Check whether two bytes form a valid zlib stream header."""
+    return (
+        len(head) == 2
+        and head[0] & 0x0F == 8
+        and head[0] >> 4 <= 7
+        and (head[0] << 8 | head[1]) % 31 == 0
+    )
+
+
+class SessionDataValidator:
+    """Incremental validator for session data: msgpack, optionally zlib-compressed.
+
+    Data is fed in chunks of any size. Compressed data is inflated a bounded
+    chunk at a time, and the msgpack structure is checked by skipping over
+    values as they complete, so memory stays bounded by the chunk size and
+    the largest single value instead of growing with the payload, and no
+    Python objects are built.
+
+    The decompressed size and the compression ratio are capped, so a small
+    upload cannot inflate to gigabytes.
+    """
+
+    def __init__(self, max_decompressed_bytes=None, max_compression_ratio=None):
+        self.max_decompressed_bytes = (
+            max_decompressed_bytes
+            if max_decompressed_bytes is not None
+            else get_max_session_decompressed_bytes()
+        )
+        self.max_compression_ratio = (
+            max_compression_ratio
+            if max_compression_ratio is not None
+            else get_max_session_compression_ratio()
+        )
+        self.compressed = None
+        self.input_bytes = 0
+        self.decompressed_bytes = 0
+        self._head = b""
+        self._decompressor = None
+        self._unpacker = msgpack.Unpacker(
+            max_buffer_size=max(self.max_decompressed_bytes, 1)
+        )
+        self._values = 0
+
+    def feed(self, chunk):
+        """Validate the next chunk of data.
+
+        Raises:
+            ValueError: If the data is invalid or exceeds the limits
+        """
+        if not chunk:
+            return
+        self.input_bytes += len(chunk)
+
+        if self.compressed is None:
+            # The format is known once the two zlib header bytes are in
+            self._head += chunk
+            if len(self._head) < 2:
+                return
+            chunk, self._head = self._head, b""
+            self._start(_is_zlib_header(chunk[:2]))
+
+        if not self.compressed:
+            self._feed_msgpack(chunk)
+            return
+
+        try:
+            data = self._decompressor.decompress(chunk, VALIDATION_CHUNK_SIZE)
+            self._feed_msgpack(data)
+            while self._decompressor.unconsumed_tail:
+                data = self._decompressor.decompress(
+                    self._decompressor.unconsumed_tail, VALIDATION_CHUNK_SIZE
+                )
+                self._feed_msgpack(data)
+        except zlib.error as e:
+            raise ValueError(f"Invalid compressed session data: {str(e)}")
+
+    def finish(self):
+        """Check that the data fed so far is one complete msgpack value.
+
+        Raises:
+            ValueError: If the data is incomplete, empty or invalid
+        """
+        if self.compressed is None:
+            self._start(False)
+            self._feed_msgpack(self._head)
+            self._head = b""
+
+        if self.compressed:
+            try:
+                self._feed_msgpack(self._decompressor.flush())
+            except zlib.error as e:
+                raise ValueError(f"Invalid compressed session data: {str(e)}")
+            if not self._decompressor.eof:
+                raise ValueError(
+                    "Invalid compressed session data: incomplete or truncated stream"
+                )
+
+        if self._values != 1:
+            raise ValueError("Invalid msgpack data: incomplete or empty")
+
+    def _start(self, compressed):
+        self.compressed = compressed
+        if compressed:
+            self._decompressor = zlib.decompressobj()
+
+    def _feed_msgpack(self, data):
+        if not data:
+            return
+        self.decompressed_bytes += len(data)
+        if self.decompressed_bytes > self.max_decompressed_bytes:
+            raise ValueError(
+                f"Session data too large: more than {self.max_decompressed_bytes} "
+                f"bytes when decompressed"
+            )
+        if (
+            self.compressed
+            and self.decompressed_bytes > SESSION_COMPRESSION_RATIO_MIN_BYTES
+            and self.decompressed_bytes > self.max_compression_ratio * self.input_bytes
+        ):
+            raise ValueError(
+                f"Session data compression ratio exceeds {self.max_compression_ratio:g}"
+            )
+
+        self._unpacker.feed(data)
+        while self._skip_value():
+            self._values += 1
+            if self._values > 1:
+                raise ValueError("Invalid msgpack data: extra data after value")
+
+    def _skip_value(self):
+        """Skip one complete msgpack value; False if more data is needed."""
+        try:
+            self._unpacker.skip()
+            return True
+        except msgpack.OutOfData:
+            return False
+        except (msgpack.UnpackException, msgpack.BufferFull, ValueError) as e:
+            raise ValueError(f"Invalid msgpack data: {str(e) or type(e).__name__}")
+
+
+def validate_session_bytes(byte_data):
+    """Validate that session data is (deflated) msgpack without unpacking it."""
+    validator = SessionDataValidator()
+    view = memoryview(byte_data)
+    for start in range(0, len(view), VALIDATION_CHUNK_SIZE):
+        validator.feed(view[start : start + VALIDATION_CHUNK_SIZE])
+    validator.finish()
+
+
+def validate_session_stream(stream):
+    """Validate a seekable session data stream in chunks, then rewind it."""
+    validator = SessionDataValidator()
     try:
-        return zlib.decompress(byte_data)
-    except zlib.error:
-        # Not compressed, use raw bytes
-        return byte_data
+        while True:
+            chunk = stream.read(VALIDATION_CHUNK_SIZE)
+            if not chunk:
+                break
+            validator.feed(chunk)
+        validator.finish()
+    finally:
+        stream.seek(0)
+
+
+_JSON_WS = r"[ \t\n\r]*"
+_JSON_STRING = r'"(?:[^"\\\x00-\x1f]|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*"'
+_JSON_NUMBER = r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?"
+_JSON_SCALAR = rf"(?:{_JSON_STRING}|{_JSON_NUMBER}|true|false|null)"
+_JSON_WS_RE = re.compile(_JSON_WS)
+_JSON_STRING_RE = re.compile(_JSON_STRING)
+_JSON_STRING_BODY_RE = re.compile(
+    r'(?:[^"\\\x00-\x1f]+|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*'
+)
+_JSON_PARTIAL_ESCAPE_RE = re.compile(r"\\(?:u[0-9a-fA-F]{0,3})?\Z")
+_JSON_NUMBER_RE = re.compile(_JSON_NUMBER)
+_JSON_NUMBER_CHARS_RE = re.compile(r"[-+.eE0-9]*")
+# Runs of scalar items ("1, 2, 3," or '"a": 1, "b": 2,') are consumed by a
+# single regex match, which keeps e.g. coordinate arrays fast
+_JSON_ARRAY_RUN_RE = re.compile(rf"(?:{_JSON_WS}{_JSON_SCALAR}{_JSON_WS},)+")
+_JSON_OBJECT_RUN_RE = re.compile(
+    rf"(?:{_JSON_WS}{_JSON_STRING}{_JSON_WS}:{_JSON_WS}{_JSON_SCALAR}{_JSON_WS},)+"
+)
+_JSON_WHITESPACE = " \t\n\r"
+_JSON_LITERALS = {"t": "true", "f": "false", "n": "null"}
+_JSON_MAX_NUMBER_CHARS = 1024
+
+# What the JSON tokenizer expects next
+_VALUE, _VALUE_OR_CLOSE, _KEY, _KEY_OR_CLOSE, _COLON, _COMMA_OR_CLOSE, _DONE = range(7)
+
+
+class JsonSyntaxValidator:
+    """Incremental JSON syntax validator.
+
+    UTF-8 data is fed in chunks of any size and checked token by token,
+    without building any Python objects, so memory stays bounded by the
+    chunk size and the longest number. The keys of a top-level object are
+    collected in top_level_keys.
+    """
+
+    def __init__(self):
+        self.top_level_keys = set()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._offset = 0
+        self._stack = []
+        self._state = _VALUE
+        self._in_string = False
+        self._key_parts = None
+
+    def feed(self, chunk):
+        """Validate the next chunk of data.
+
+        Raises:
+            ValueError: If the data is not valid JSON
+        """
+        self._scan(self._decode(chunk, final=False), final=False)
+
+    def finish(self):
+        """Check that the data fed so far is one complete JSON value.
+
+        Raises:
+            ValueError: If the data is incomplete or not valid JSON
+        """
+        self._scan(self._decode(b"", final=True), final=True)
+        if self._in_string or self._state != _DONE:
+            raise ValueError("Invalid JSON: unexpected end of data")
+
+    def _decode(self, chunk, final):
+        try:
+            return self._decoder.decode(chunk, final)
+        except UnicodeDecodeError as e:
+            raise ValueError(f"Invalid JSON: not UTF-8 ({str(e)})")
+
+    def _error(self, pos, message):
+        return ValueError(f"Invalid JSON at character {self._offset + pos}: {message}")
+
+    def _scan(self, text, final):
+        # A token cut off by the end of the previous chunk is completed first
+        buffer = self._buffer + text if self._buffer else text
+        pos = self._scan_tokens(buffer, final)
+        self._offset += pos
+        self._buffer = buffer[pos:]
+
+    def _scan_tokens(self, buffer, final):
+        """Consume the tokens in buffer and return where its unread tail starts."""
+        stack = self._stack
+        state = self._state
+        end = len(buffer)
+        pos = 0
+        while True:
+            if self._in_string:
+                stop = _JSON_STRING_BODY_RE.match(buffer, pos).end()
+                if self._key_parts is not None:
+                    self._key_parts.append(buffer[pos:stop])
+                if stop < end and buffer[stop] == '"':
+                    self._in_string = False
+                    pos = stop + 1
+                    state = self._end_string(state, stack)
+                    continue
+                if stop == end or (
+                    not final and _JSON_PARTIAL_ESCAPE_RE.match(buffer, stop)
+                ):
+                    pos = stop
+                    break
+                raise self._error(stop, "invalid character in string")
+
+            if pos == end:
+                break
+            char = buffer[pos]
+            if char in _JSON_WHITESPACE:
+                pos = _JSON_WS_RE.match(buffer, pos).end()
+                if pos == end:
+                    break
+                char = buffer[pos]
+
+            if state == _COMMA_OR_CLOSE:
+                if char == ",":
+                    pos += 1
+                    if stack[-1] == "[":
+                        state = _VALUE
+                        run = _JSON_ARRAY_RUN_RE.match(buffer, pos)
+                    else:
+                        state = _KEY
+                        run = len(stack) > 1 and _JSON_OBJECT_RUN_RE.match(buffer, pos)
+                    if run:
+                        pos = run.end()
+                elif char == ("]" if stack[-1] == "[" else "}"):
+                    pos += 1
+                    stack.pop()
+                    state = _COMMA_OR_CLOSE if stack else _DONE
+                else:
+                    raise self._error(pos, "expected ',' or a closing bracket")
+            elif state == _COLON:
+                if char != ":":
+                    raise self._error(pos, "expected ':'")
+                pos += 1
+                state = _VALUE
+            elif state == _KEY or state == _KEY_OR_CLOSE:
+                if char == '"':
+                    pos = self._start_string(buffer, pos, len(stack) == 1)
+                    if not self._in_string:
+                        state = _COLON
+                elif char == "}" and state == _KEY_OR_CLOSE:
+                    pos += 1
+                    stack.pop()
+                    state = _COMMA_OR_CLOSE if stack else _DONE
+                else:
+                    raise self._error(pos, "expected a key")
+            elif state == _DONE:
+                raise self._error(pos, "extra data after value")
+            elif char == "{":
+                pos += 1
+                stack.append("{")
+                state = _KEY_OR_CLOSE
+                # Keys of the top-level object are read one by one
+                run = len(stack) > 1 and _JSON_OBJECT_RUN_RE.match(buffer, pos)
+                if run:
+                    pos = run.end()
+                    state = _KEY
+            elif char == "[":
+                pos += 1
+                stack.append("[")
+                state = _VALUE_OR_CLOSE
+                run = _JSON_ARRAY_RUN_RE.match(buffer, pos)
+                if run:
+                    pos = run.end()
+                    state = _VALUE
+            elif char == "]" and state == _VALUE_OR_CLOSE:
+                pos += 1
+                stack.pop()
+                state = _COMMA_OR_CLOSE if stack else _DONE
+            elif char == '"':
+                pos = self._start_string(buffer, pos, False)
+                if not self._in_string:
+                    state = _COMMA_OR_CLOSE if stack else _DONE
+            else:
+                stop = self._scalar_end(buffer, pos, final)
+                if stop is None:
+                    # The number or literal may continue in the next chunk
+                    break
+                pos = stop
+                state = _COMMA_OR_CLOSE if stack else _DONE
+
+        self._state = state
+        return pos
+
+    def _start_string(self, buffer, pos, is_top_level_key):
+        """Consume the string at pos, or enter it if the buffer ends inside it."""
+        match = _JSON_STRING_RE.match(buffer, pos)
+        if match:
+            if is_top_level_key:
+                self.top_level_keys.add(json.loads(match.group()))
+            return match.end()
+        self._in_string = True
+        self._key_parts = [] if is_top_level_key else None
+        return pos + 1
+
+    def _end_string(self, state, stack):
+        if state == _VALUE or state == _VALUE_OR_CLOSE:
+            return _COMMA_OR_CLOSE if stack else _DONE
+        if self._key_parts is not None:
+            self.top_level_keys.add(json.loads(f'"{"".join(self._key_parts)}"'))
+            self._key_parts = None
+        return _COLON
+
+    def _scalar_end(self, buffer, pos, final):
+        """Get the end of the number or literal at pos, or None if it is cut off."""
+        end = len(buffer)
+        literal = _JSON_LITERALS.get(buffer[pos])
+        if literal:
+            if buffer.startswith(literal, pos):
+                return pos + len(literal)
+            if (
+                not final
+                and end - pos < len(literal)
+                and literal.startswith(buffer[pos:])
+            ):
+                return None
+            raise self._error(pos, "invalid literal")
+
+        stop = _JSON_NUMBER_CHARS_RE.match(buffer, pos).end()
+        if stop == end and not final:
+            if stop - pos > _JSON_MAX_NUMBER_CHARS:
+                raise self._error(pos, "number too long")
+            return None
+        match = _JSON_NUMBER_RE.match(buffer, pos)
+        if not match or match.end() != stop:
+            raise self._error(pos, "unexpected character")
+        return stop
+
+
+_DROPPED_JSON_OBJECT = object()
+
+
+def _reject_json_constant(name):
+    raise ValueError(f"Invalid JSON: {name} is not allowed")
+
+
+def _validate_json_in_memory(text):
+    """Validate JSON text with the C parser, discarding objects as they are built.
+
+    Returns:
+        set: The keys of the top-level object, empty for other values
+    """
+    last_object = [None]
 
+    def drop_object(pairs):
+        last_object[0] = pairs
+        return _DROPPED_JSON_OBJECT
 
-def _validate_msgpack_format(msgpack_data):
-    """Validate that data is in valid msgpack format."""
     try:
-        msgpack.unpackb(msgpack_data, raw=False)
-    except Exception as e:
-        raise ValueError(f"Invalid msgpack data: {str(e)}")
+        value = json.loads(
+            text, object_pairs_hook=drop_object, parse_constant=_reject_json_constant
+        )
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {str(e)}")
+    # Objects are completed innermost first, so the last one is the top-level one
+    if value is _DROPPED_JSON_OBJECT:
+        return {key for key, _ in last_object[0]}
+    return set()
+
+
+def validate_json_stream(stream):
+    """Validate that a seekable stream holds one UTF-8 JSON value, then rewind it.
+
+    Data up to JSON_IN_MEMORY_VALIDATION_MAX_BYTES is checked with the C JSON
+    parser, which is fastest; larger data with JsonSyntaxValidator, whose
+    memory use does not grow with the size of the data.
+
+    Returns:
+        set: The keys of the top-level object, empty for other values
+
+    Raises:
+        ValueError: If the data is not valid JSON
+    """
+    try:
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        if size <= JSON_IN_MEMORY_VALIDATION_MAX_BYTES:
+            try:
+                text = stream.read().decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise ValueError(f"Invalid JSON: not UTF-8 ({str(e)})")
+            return _validate_json_in_memory(text)
+
+        validator = JsonSyntaxValidator()
+        while True:
+            chunk = stream.read(VALIDATION_CHUNK_SIZE)
+            if not chunk:
+                break
+            validator.feed(chunk)
+        validator.finish()
+        return validator.top_level_keys
+    finally:
+        stream.seek(0)
 
 
 def _validate_legacy_mvsx_dict(data):
@@ -124,15 +579,151 @@ def _validate_legacy_mvsx_dict(data):
     return True
 
 
-def _validate_mvsx_zip_content(zip_bytes):
-    """Validate MVSX zip file content."""
-    import io
-    import zipfile
+_ZIP_EOCD_SIGNATURE = b"PK\x05\x06"
+_ZIP_EOCD = struct.Struct("<4s4H2LH")
+_ZIP64_EOCD_LOCATOR_SIGNATURE = b"PK\x06\x07"
+_ZIP64_EOCD_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+_ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+_ZIP_CENTRAL_SIGNATURE = b"PK\x01\x02"
+_ZIP_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_ZIP64_EXTRA_ID = 0x0001
+# Room allowed per central directory entry for its name, extra field and comment
+_ZIP_CENTRAL_VARIABLE_MAX = 4096
+
 
-    with zipfile.ZipFile(io.BytesIO(zip_bytes), "r") as zf:
-        # Check for index.mvsj or at least one file
-        if "index.mvsj" not in zf.namelist() and len(zf.namelist()) == 0:
-            raise ValueError("MVSX zip must contain at least index.mvsj or one file")
+def _read_at(stream, offset, size):
+    stream.seek(offset)
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Invalid zip file: unexpected end of data")
+    return data
+
+
+def _read_zip_directory_location(stream, stream_size):
+    """Locate the central directory from the end of central directory record.
+
+    Returns:
+        tuple: (entry count, central directory size, central directory offset)
+    """
+    # The record is 22 bytes followed by a comment of at most 64 KiB
+    tail_size = min(stream_size, _ZIP_EOCD.size + 0xFFFF)
+    tail = _read_at(stream, stream_size - tail_size, tail_size)
+    position = tail.rfind(_ZIP_EOCD_SIGNATURE)
+    if position < 0 or position + _ZIP_EOCD.size > tail_size:
+        raise ValueError("Invalid zip file: end of central directory not found")
+    eocd_offset = stream_size - tail_size + position
+    _, disk, _, _, count, cd_size, cd_offset, _ = _ZIP_EOCD.unpack_from(tail, position)
+    if disk != 0:
+        raise ValueError("Invalid zip file: multi-disk archives are not supported")
+
+    locator_offset = eocd_offset - _ZIP64_EOCD_LOCATOR.size
+    if locator_offset >= 0:
+        locator = _read_at(stream, locator_offset, _ZIP64_EOCD_LOCATOR.size)
+        if locator.startswith(_ZIP64_EOCD_LOCATOR_SIGNATURE):
+            _, _, zip64_offset, _ = _ZIP64_EOCD_LOCATOR.unpack(locator)
+            if zip64_offset + _ZIP64_EOCD.size > locator_offset:
+                raise ValueError("Invalid zip file: bad zip64 end of central directory")
+            record = _read_at(stream, zip64_offset, _ZIP64_EOCD.size)
+            if not record.startswith(_ZIP64_EOCD_SIGNATURE):
+                raise ValueError("Invalid zip file: bad zip64 end of central directory")
+            _, _, _, _, _, _, _, count, cd_size, cd_offset = _ZIP64_EOCD.unpack(record)
+            eocd_offset = zip64_offset
+
+    if cd_offset + cd_size > eocd_offset:
+        raise ValueError("Invalid zip file: central directory out of bounds")
+    return count, cd_size, cd_offset
+
+
+def _zip64_entry_sizes(extra, sizes):
+    """Replace saturated 32-bit sizes/offset by the values of the zip64 extra field."""
+    position = 0
+    while position + 4 <= len(extra):
+        field_id, field_size = struct.unpack_from("<2H", extra, position)
+        position += 4
+        if position + field_size > len(extra):
+            raise ValueError("Invalid zip file: bad extra field")
+        if field_id == _ZIP64_EXTRA_ID:
+            values = list(sizes)
+            field_position = position
+            for i, value in enumerate(values):
+                if value == 0xFFFFFFFF:
+                    if field_position + 8 > position + field_size:
+                        raise ValueError("Invalid zip file: bad zip64 extra field")
+                    (values[i],) = struct.unpack_from("<Q", extra, field_position)
+                    field_position += 8
+            return values
+        position += field_size
+    return sizes
+
+
+def validate_mvsx_stream(stream):
+    """Validate an MVSX zip archive from its central directory only.
+
+    Only the end of central directory record and the central directory are
+    read from the seekable stream; no entry is inflated. The archive must
+    contain index.mvsj, and its entry count, total uncompressed size and
+    per-entry compression ratios are capped. The stream is rewound.
+
+    Raises:
+        ValueError: If the archive is invalid or exceeds the limits
+    """
+    try:
+        stream.seek(0, io.SEEK_END)
+        stream_size = stream.tell()
+        count, cd_size, cd_offset = _read_zip_directory_location(stream, stream_size)
+
+        max_entries = get_max_mvsx_entries()
+        if count > max_entries:
+            raise ValueError(f"MVSX zip has {count} entries (max: {max_entries})")
+        if cd_size > count * (_ZIP_CENTRAL_HEADER.size + _ZIP_CENTRAL_VARIABLE_MAX):
+            raise ValueError("Invalid zip file: central directory too large")
+
+        max_total = get_max_mvsx_uncompressed_bytes()
+        max_ratio = get_max_mvsx_compression_ratio()
+        directory = _read_at(stream, cd_offset, cd_size)
+        position = 0
+        total_size = 0
+        has_index = False
+        for _ in range(count):
+            if position + _ZIP_CENTRAL_HEADER.size > cd_size or not (
+                directory.startswith(_ZIP_CENTRAL_SIGNATURE, position)
+            ):
+                raise ValueError("Invalid zip file: bad central directory entry")
+            header = _ZIP_CENTRAL_HEADER.unpack_from(directory, position)
+            compress_size, file_size, local_offset = header[8], header[9], header[16]
+            name_size, extra_size, comment_size = header[10], header[11], header[12]
+            position += _ZIP_CENTRAL_HEADER.size
+            name = directory[position : position + name_size]
+            extra = directory[position + name_size : position + name_size + extra_size]
+            position += name_size + extra_size + comment_size
+            if position > cd_size:
+                raise ValueError("Invalid zip file: bad central directory entry")
+
+            file_size, compress_size, local_offset = _zip64_entry_sizes(
+                extra, (file_size, compress_size, local_offset)
+            )
+            if local_offset + compress_size > cd_offset:
+                raise ValueError("Invalid zip file: entry data out of bounds")
+            total_size += file_size
+            if total_size > max_total:
+                raise ValueError(
+                    f"MVSX zip too large: more than {max_total} bytes uncompressed"
+                )
+            if (
+                file_size > MVSX_COMPRESSION_RATIO_MIN_BYTES
+                and file_size > max_ratio * compress_size
+            ):
+                raise ValueError(
+                    f"MVSX zip entry compression ratio exceeds {max_ratio:g}"
+                )
+            if name == b"index.mvsj":
+                has_index = True
+
+        if not has_index:
+            raise ValueError("MVSX zip must contain index.mvsj")
+    finally:
+        stream.seek(0)
 
 
 def get_max_upload_size_mb():
@@ -145,6 +736,31 @@ def get_max_upload_size_bytes():
     return get_max_upload_size_mb() * 1024 * 1024
 
 
+def get_max_session_decompressed_bytes():
+    """Get the maximum decompressed size of session data in bytes."""
+    return int(os.getenv("MAX_SESSION_DECOMPRESSED_MB", "512")) * 1024 * 1024
+
+
+def get_max_session_compression_ratio():
+    """Get the maximum allowed compression ratio of session data."""
+    return float(os.getenv("MAX_SESSION_COMPRESSION_RATIO", "100"))
+
+
+def get_max_mvsx_entries():
+    """Get the maximum number of entries in an MVSX zip."""
+    return int(os.getenv("MAX_MVSX_ENTRIES", "10000"))
+
+
+def get_max_mvsx_uncompressed_bytes():
+    """Get the maximum total uncompressed size of an MVSX zip in bytes."""
+    return int(os.getenv("MAX_MVSX_UNCOMPRESSED_MB", "1024")) * 1024 * 1024
+
+
+def get_max_mvsx_compression_ratio():
+    """Get the maximum allowed compression ratio of an MVSX zip entry."""
+    return float(os.getenv("MAX_MVSX_COMPRESSION_RATIO", "200"))
+
+
 def get_max_base64_size():
     """Get the maximum base64 string size (base64 is ~33% larger than binary)."""
     return get_max_upload_size_bytes() * 4 // 3
@@ -248,9 +864,8 @@ class SessionInput(BaseItemInput):
         _validate_base64_size(v, "Session data")
         byte_data = _decode_and_validate_base64(v, "Session data")
 
-        # Decompress and validate msgpack format
-        msgpack_data = _decompress_msgpack_data(byte_data)
-        _validate_msgpack_format(msgpack_data)
+        # Validate the (optionally compressed) msgpack format
+        validate_session_bytes(byte_data)
 
         # Return original base64 string (validation only)
         return v
@@ -403,9 +1018,8 @@ class SessionUpdate(BaseItemUpdate):
         _validate_base64_size(v, "Session data")
         byte_data = _decode_and_validate_base64(v, "Session data")
 
-        # Decompress and validate msgpack format
-        msgpack_data = _decompress_msgpack_data(byte_data)
-        _validate_msgpack_format(msgpack_data)
+        # Validate the (optionally compressed) msgpack format
+        validate_session_bytes(byte_data)
 
         # Return original base64 string (validation only)
         return v
@@ -452,7 +1066,7 @@ def validate_mvsx_content(data):
                 raise ValueError("MVSX data string cannot be empty")
 
             zip_bytes = _decode_and_validate_base64(data, "MVSX data")
-            _validate_mvsx_zip_content(zip_bytes)
+            validate_mvsx_stream(io.BytesIO(zip_bytes))
             return True
 
         raise ValueError(
@@ -1,6 +1,18 @@
 # Storage module - unified interface for object storage operations
 # This module provides the same API as the original storage.py file
 
+# Import storage backends
+from storage.backends import (
+    LocalFilesystemBackend,
+    ObjectChangedError,
+    ObjectNotFoundError,
+    StorageBackend,
+    StorageError,
+)
+
+# Import public story catalog operations
+from storage.catalog import rebuild_story_catalog
+
 # Import client configuration and basic operations
 from storage.client import (
     MINIO_ACCESS_KEY,
@@ -8,13 +20,24 @@ from storage.client import (
     MINIO_ENDPOINT,
     MINIO_HOST,
     MINIO_SECRET_KEY,
+    STORAGE_BACKEND,
+    MinioBackend,
     ensure_bucket_exists,
+    get_storage_backend,
     handle_minio_error,
     list_minio_buckets,
     list_minio_objects,
     minio_client,
+    open_minio_object,
+    stat_object,
 )
 
+# Import ID index operations
+from storage.index import rebuild_id_index
+
+# Import background job operations
+from storage.jobs import read_job, submit_job
+
 # Import metadata operations
 from storage.metadata import (
     create_metadata,
@@ -30,27 +53,41 @@ from storage.objects import (
     delete_story_by_id,
     find_object_by_id,
     list_objects_by_type,
+    list_objects_page,
+    lookup_object,
     save_object,
     save_story_with_session,
     update_session_by_id,
     update_story_by_id,
 )
 
+# Import listing pagination
+from storage.pagination import parse_pagination_args
+
 # Import quota management
 from storage.quota import (
     check_user_session_limit,
     check_user_story_limit,
+    count_user_objects,
     count_user_sessions,
     count_user_stories,
 )
 
 # Import utility functions
 from storage.utils import (
+    GZIP_VARIANT_SUFFIX,
+    SESSION_ENCODING_DEFLATE,
+    SESSION_ENCODING_LEGACY_WRAPPER,
+    SESSION_ENCODING_MSGPACK,
+    detect_session_encoding,
     extract_unique_object_directories,
     extract_user_ids_from_objects,
     get_content_type,
     get_data_file_extension,
+    get_gzip_variant_etag,
     get_object_path,
+    get_session_encoding,
+    is_wrapped_mvsj,
 )
 
 # Export all functions to maintain the same API as the original storage.py
@@ -66,6 +103,24 @@ __all__ = [
     "ensure_bucket_exists",
     "list_minio_objects",
     "list_minio_buckets",
+    "open_minio_object",
+    "stat_object",
+    # Storage backends
+    "STORAGE_BACKEND",
+    "get_storage_backend",
+    "StorageBackend",
+    "MinioBackend",
+    "LocalFilesystemBackend",
+    "StorageError",
+    "ObjectNotFoundError",
+    "ObjectChangedError",
+    # Public story catalog operations
+    "rebuild_story_catalog",
+    # ID index operations
+    "rebuild_id_index",
+    # Background job operations
+    "submit_job",
+    "read_job",
     # Metadata operations
     "create_metadata",
     "validate_metadata",
@@ -77,7 +132,18 @@ __all__ = [
     "get_content_type",
     "extract_unique_object_directories",
     "extract_user_ids_from_objects",
+    "is_wrapped_mvsj",
+    "get_gzip_variant_etag",
+    "GZIP_VARIANT_SUFFIX",
+    "detect_session_encoding",
+    "get_session_encoding",
+    "SESSION_ENCODING_DEFLATE",
+    "SESSION_ENCODING_MSGPACK",
+    "SESSION_ENCODING_LEGACY_WRAPPER",
+    # Listing pagination
+    "parse_pagination_args",
     # Quota management
+    "count_user_objects",
     "count_user_sessions",
     "count_user_stories",
     "check_user_session_limit",
@@ -87,6 +153,8 @@ __all__ = [
     "save_story_with_session",
     "find_object_by_id",
     "list_objects_by_type",
+    "list_objects_page",
+    "lookup_object",
     "delete_all_user_data",
     "delete_session_by_id",
     "delete_story_by_id",
@@ -0,0 +1,489 @@
+"""Storage backends behind the object storage helpers.
+
+All object storage goes through a backend with a small object-store
+interface: stat, get, ranged reads, put, list, delete and copy. The MinIO
+backend (`storage.client.MinioBackend`) talks to the configured S3 bucket.
+`LocalFilesystemBackend` keeps objects as files under a local directory, so
+small deployments and benchmarks can run without an S3 server, and serves
+reads straight from the page cache with sendfile and mmap.
+
+Stats returned by a backend have the attributes of a MinIO stat result
+(`object_name`, `size`, `etag`, `last_modified`, `content_type` and
+`metadata`), with user metadata under 'x-amz-meta-<name>' keys.
+"""
+
+import fcntl
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Bodies are read and copied in chunks of this many bytes
+BACKEND_CHUNK_SIZE = 64 * 1024
+
+
+class StorageError(Exception):
+    """Base class for errors raised by storage backends."""
+
+
+class ObjectNotFoundError(StorageError):
+    """Raised when the requested object does not exist."""
+
+    def __init__(self, key):
+        super().__init__(f"Object not found: {key}")
+        self.key = key
+
+
+class ObjectChangedError(StorageError):
+    """Raised when a read pinned to an ETag finds a different version."""
+
+    def __init__(self, key, etag):
+        super().__init__(f"Object {key} no longer has ETag {etag}")
+        self.key = key
+        self.etag = etag
+
+
+class StorageBackend:
+    """Interface of an object storage backend.
+
+    Keys are '/'-separated paths. Object metadata is a dict of user metadata
+    names to string values.
+    """
+
+    name = None
+
+    def is_configured(self):
+        """Check whether the backend can serve requests."""
+        raise NotImplementedError
+
+    def ensure_bucket(self):
+        """Create the bucket (or root directory) if it does not exist."""
+        raise NotImplementedError
+
+    def ping(self):
+        """Check that storage is reachable, for health checks.
+
+        Returns:
+            dict: Details to report alongside the healthy status
+
+        Raises:
+            Exception: If storage cannot be reached or written
+        """
+        raise NotImplementedError
+
+    def list_buckets(self):
+        """List the names of the buckets (or root directory) the backend sees."""
+        raise NotImplementedError
+
+    def stat(self, key):
+        """Get an object's stat without reading its body.
+
+        Raises:
+            ObjectNotFoundError: If the object does not exist
+        """
+        raise NotImplementedError
+
+    def get(self, key):
+        """Read a whole object.
+
+        Returns:
+            tuple: The object body as bytes, and its ETag
+
+        Raises:
+            ObjectNotFoundError: If the object does not exist
+        """
+        raise NotImplementedError
+
+    def get_range(self, key, offset=0, length=0, etag=None, chunk_size=None):
+        """Open an object (or a byte range of it, length 0 meaning to the end).
+
+        Returns:
+            An iterable yielding the body in chunks; it releases its resources
+            once exhausted or closed
+
+        Raises:
+            ObjectNotFoundError: If the object does not exist
+            ObjectChangedError: If `etag` is given and no longer matches
+        """
+        raise NotImplementedError
+
+    def put(self, key, data, length, content_type, metadata=None):
+        """Store `length` bytes read from the binary stream `data`.
+
+        Returns:
+            str: The ETag of the new object
+        """
+        raise NotImplementedError
+
+    def put_conditional(self, key, data, content_type, etag):
+        """Store small `data` bytes only if no other writer got in between.
+
+        For read-modify-write cycles: the object is only replaced if it still
+        has the ETag it was read with, or created if `etag` is None and it
+        does not exist yet.
+
+        Returns:
+            str: The ETag of the new object
+
+        Raises:
+            ObjectChangedError: If the object no longer has ETag `etag`
+        """
+        raise NotImplementedError
+
+    def list(self, prefix=""):
+        """Iterate over objects whose keys start with `prefix`, in key order.
+
+        Yields:
+            dict: The 'key', 'size', 'last_modified' and 'etag' of an object
+        """
+        raise NotImplementedError
+
+    def delete(self, keys):
+        """Delete objects; missing objects count as deleted.
+
+        Returns:
+            list: Dicts with 'key' and 'error' for every key not deleted
+        """
+        raise NotImplementedError
+
+    def copy(self, source_key, key):
+        """Copy an object with its metadata to another key.
+
+        Returns:
+            str: The ETag of the new object
+        """
+        raise NotImplementedError
+
+
+class ObjectStat:
+    """Stat of an object in the local filesystem backend."""
+
+    def __init__(self, object_name, size, etag, last_modified, content_type, metadata):
+        self.object_name = object_name
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.metadata = metadata
+
+
+class _FileBody:
+    """Iterable body of a whole stored file.
+
+    It exposes the file's descriptor, so the WSGI server's file wrapper can
+    send it with os.sendfile instead of copying it through Python.
+    """
+
+    def __init__(self, file, chunk_size):
+        self._file = file
+        self._chunk_size = chunk_size
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self._file.read(self._chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+def _iter_mapped_range(file, start, end, chunk_size):
+    """Yield a byte range of a file through a read-only memory map."""
+    try:
+        if end <= start:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for position in range(start, end, chunk_size):
+                yield mapped[position : min(position + chunk_size, end)]
+    finally:
+        file.close()
+
+
+def _copy_file(source, target):
+    """Copy a whole file in the kernel with os.sendfile where supported."""
+    size = os.fstat(source.fileno()).st_size
+    offset = 0
+    try:
+        while offset < size:
+            sent = os.sendfile(target.fileno(), source.fileno(), offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+    except (AttributeError, OSError):
+        # No sendfile between regular files here; copy the rest by hand
+        source.seek(offset)
+        target.seek(offset)
+        shutil.copyfileobj(source, target, BACKEND_CHUNK_SIZE)
+
+
+class LocalFilesystemBackend(StorageBackend):
+    """Storage backend that keeps objects as files under a root directory.
+
+    Object bodies are stored under 'objects/' and their ETag, content type and
+    user metadata in a JSON sidecar under 'metadata/'. Both are written to a
+    temporary file and renamed into place, so readers never see a partial
+    file. The ETag is the MD5 of the body, as for single-part S3 uploads.
+
+    Writers take a lock file while they rename files into place, so they
+    never interleave. Readers take no lock: the data file and its sidecar
+    are replaced one after the other, so a reader racing a writer can
+    briefly see the new body with the old ETag. The backend is meant for
+    single-host deployments and benchmarks.
+    """
+
+    name = "local"
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._objects_root = os.path.join(self.root, "objects")
+        self._metadata_root = os.path.join(self.root, "metadata")
+        self._tmp_root = os.path.join(self.root, "tmp")
+
+    def is_configured(self):
+        return True
+
+    def ensure_bucket(self):
+        for path in (self._objects_root, self._metadata_root, self._tmp_root):
+            os.makedirs(path, exist_ok=True)
+
+    def ping(self):
+        # Creating the storage directories checks that the root is writable
+        self.ensure_bucket()
+        if not os.access(self._tmp_root, os.W_OK):
+            raise StorageError(f"Storage directory {self._tmp_root} is not writable")
+        return {}
+
+    def list_buckets(self):
+        return [os.path.basename(self.root)]
+
+    def _object_path(self, key):
+        parts = key.split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Invalid object key: {key!r}")
+        return os.path.join(self._objects_root, *parts)
+
+    def _metadata_path(self, key):
+        return os.path.join(self._metadata_root, *key.split("/")) + ".json"
+
+    def _read_sidecar(self, key):
+        try:
+            with open(self._metadata_path(key), "rb") as sidecar:
+                return json.load(sidecar)
+        except FileNotFoundError:
+            return {}
+
+    def _open(self, key):
+        try:
+            return open(self._object_path(key), "rb")
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            raise ObjectNotFoundError(key)
+
+    def stat(self, key):
+        try:
+            file_stat = os.stat(self._object_path(key))
+        except (FileNotFoundError, NotADirectoryError):
+            raise ObjectNotFoundError(key)
+        sidecar = self._read_sidecar(key)
+        return ObjectStat(
+            object_name=key,
+            size=file_stat.st_size,
+            etag=sidecar.get("etag"),
+            last_modified=datetime.fromtimestamp(file_stat.st_mtime, timezone.utc),
+            content_type=sidecar.get("content_type"),
+            metadata={
+                f"x-amz-meta-{name}": value
+                for name, value in (sidecar.get("metadata") or {}).items()
+            },
+        )
+
+    def get(self, key):
+        with self._open(key) as file:
+            data = file.read()
+        return data, self._read_sidecar(key).get("etag")
+
+    def get_range(self, key, offset=0, length=0, etag=None, chunk_size=None):
+        chunk_size = chunk_size or BACKEND_CHUNK_SIZE
+        file = self._open(key)
+        try:
+            if etag is not None and self._read_sidecar(key).get("etag") != etag:
+                raise ObjectChangedError(key, etag)
+            size = os.fstat(file.fileno()).st_size
+        except BaseException:
+            file.close()
+            raise
+
+        # Whole objects can go out with sendfile; ranges are sliced from a map
+        if offset == 0 and length == 0:
+            return _FileBody(file, chunk_size)
+        end = min(offset + length, size) if length else size
+        return _iter_mapped_range(file, offset, end, chunk_size)
+
+    @contextmanager
+    def _commit_lock(self):
+        """Serialize renames into place across threads and processes."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "lock"), "ab") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    @contextmanager
+    def _temp_file(self, write):
+        """Write a temporary file to rename into place; removed if it is not."""
+        os.makedirs(self._tmp_root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_root)
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                result = write(tmp_file)
+            yield tmp_path, result
+        finally:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def _replace(self, tmp_path, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+    def _write_sidecar(self, key, etag, content_type, metadata):
+        sidecar_bytes = json.dumps(
+            {"etag": etag, "content_type": content_type, "metadata": metadata or {}}
+        ).encode("utf-8")
+        with self._temp_file(lambda file: file.write(sidecar_bytes)) as (tmp_path, _):
+            self._replace(tmp_path, self._metadata_path(key))
+
+    def _put(self, key, data, length, content_type, metadata, conditional, etag):
+        path = self._object_path(key)
+
+        def write(file):
+            digest = hashlib.md5(usedforsecurity=False)
+            remaining = length
+            while remaining > 0:
+                chunk = data.read(min(BACKEND_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError(
+                        f"Stream ended {remaining} bytes short of length {length}"
+                    )
+                digest.update(chunk)
+                file.write(chunk)
+                remaining -= len(chunk)
+            return digest.hexdigest()
+
+        # The data is written before taking the lock; only the renames hold it
+        with self._temp_file(write) as (tmp_path, new_etag):
+            with self._commit_lock():
+                if conditional:
+                    current = None
+                    if os.path.exists(path):
+                        current = self._read_sidecar(key).get("etag")
+                    if current != etag:
+                        raise ObjectChangedError(key, etag)
+                self._replace(tmp_path, path)
+                self._write_sidecar(key, new_etag, content_type, metadata)
+        return new_etag
+
+    def put(self, key, data, length, content_type, metadata=None):
+        return self._put(key, data, length, content_type, metadata, False, None)
+
+    def put_conditional(self, key, data, content_type, etag):
+        return self._put(
+            key, io.BytesIO(data), len(data), content_type, None, True, etag
+        )
+
+    def list(self, prefix=""):
+        # Only descend into the directory holding the prefix
+        directory, _, _ = prefix.rpartition("/")
+        start = self._objects_root
+        if directory:
+            start = os.path.join(start, *directory.split("/"))
+        yield from self._walk(start, f"{directory}/" if directory else "", prefix)
+
+    def _walk(self, path, key_prefix, prefix):
+        try:
+            with os.scandir(path) as scanned:
+                entries = [(entry, entry.is_dir()) for entry in scanned]
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        # Sorting directories as 'name/' keeps the output in S3 key order
+        entries.sort(key=lambda item: item[0].name + "/" if item[1] else item[0].name)
+        for entry, is_dir in entries:
+            key = key_prefix + entry.name
+            if is_dir:
+                if (key + "/").startswith(prefix) or prefix.startswith(key + "/"):
+                    yield from self._walk(entry.path, key + "/", prefix)
+            elif key.startswith(prefix):
+                file_stat = entry.stat()
+                yield {
+                    "key": key,
+                    "size": file_stat.st_size,
+                    "last_modified": datetime.fromtimestamp(
+                        file_stat.st_mtime, timezone.utc
+                    ).isoformat(),
+                    "etag": self._read_sidecar(key).get("etag"),
+                }
+
+    def _remove_empty_parents(self, path, root):
+        parent = os.path.dirname(path)
+        while parent != root and parent.startswith(root):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+
+    def delete(self, keys):
+        failed = []
+        with self._commit_lock():
+            for key in keys:
+                try:
+                    paths = (
+                        (self._object_path(key), self._objects_root),
+                        (self._metadata_path(key), self._metadata_root),
+                    )
+                    for path, root in paths:
+                        try:
+                            os.unlink(path)
+                        except FileNotFoundError:
+                            continue
+                        self._remove_empty_parents(path, root)
+                except (OSError, ValueError) as e:
+                    failed.append({"key": key, "error": str(e)})
+        return failed
+
+    def copy(self, source_key, key):
+        path = self._object_path(key)
+        with self._open(source_key) as source:
+            sidecar = self._read_sidecar(source_key)
+            copy = self._temp_file(lambda file: _copy_file(source, file))
+            with copy as (tmp_path, _), self._commit_lock():
+                self._replace(tmp_path, path)
+                self._write_sidecar(
+                    key,
+                    sidecar.get("etag"),
+                    sidecar.get("content_type"),
+                    sidecar.get("metadata"),
+                )
+        return sidecar.get("etag")
@@ -0,0 +1,215 @@
+"""In-process cache of parsed metadata objects with ETag revalidation.
+
+Metadata records (metadata.json files, ID index records, user manifests and
+catalog shards) change rarely but are read on almost every request. This
+module keeps their parsed contents in a size-bounded LRU cache together with
+the object's ETag. Entries younger than the TTL are served without any
+storage call; older entries are revalidated with a cheap stat and only
+re-downloaded when the ETag has changed.
+
+Writes and deletes made by this process invalidate entries immediately;
+changes made by other processes become visible after at most the TTL.
+"""
+
+import copy
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from storage.backends import ObjectNotFoundError, StorageError
+from storage.client import get_storage_backend
+
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "5000"))
+METADATA_CACHE_TTL_SECONDS = float(os.getenv("METADATA_CACHE_TTL_SECONDS", "5"))
+
+
+def _normalize_etag(etag):
+    """Strip the quotes S3 puts around ETag header values."""
+    return etag.strip('"') if etag else None
+
+
+class MetadataCache:
+    """Size-bounded LRU cache of parsed JSON objects and their ETags."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Get a cached entry as a (value, etag, is_fresh) tuple, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            value, etag, checked_at = entry
+            is_fresh = time.monotonic() - checked_at < self.ttl_seconds
+            return value, etag, is_fresh
+
+    def put(self, key, value, etag):
+        """Cache a parsed value, evicting the least recently used entries."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, etag, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def touch(self, key):
+        """Mark an entry as just revalidated."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, etag, _ = entry
+                self._entries[key] = (value, etag, time.monotonic())
+
+    def invalidate(self, key):
+        """Drop an entry, e.g. after the object was written or deleted."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.revalidations = self.evictions = 0
+
+    def record_hit(self, revalidated=False):
+        with self._lock:
+            self.hits += 1
+            if revalidated:
+                self.revalidations += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self):
+        """Get the cache counters for sizing and monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+metadata_cache = MetadataCache(METADATA_CACHE_MAX_ENTRIES, METADATA_CACHE_TTL_SECONDS)
+
+
+def read_json_object(key, revalidate=False):
+    """Read and parse a JSON object through the metadata cache.
+
+    Callers get their own copy of the value and may modify it freely.
+
+    Args:
+        key: Storage key of the object
+        revalidate: Check the ETag even if the cached entry is within its TTL,
+            for read-modify-write cycles that must not start from a stale copy
+
+    Returns:
+        The parsed value, or None if the object does not exist
+
+    Raises:
+        S3Error or OSError: On storage errors other than a missing object
+        ValueError: If the object is not valid UTF-8 JSON
+    """
+    return read_json_object_with_etag(key, revalidate=revalidate)[0]
+
+
+def read_json_object_with_etag(key, revalidate=False):
+    """Read a JSON object like `read_json_object`, together with its ETag.
+
+    Returns:
+        tuple: The parsed value and its ETag, or (None, None) if the object
+            does not exist
+    """
+    cached = metadata_cache.get(key)
+    if cached is not None:
+        value, etag, is_fresh = cached
+        if is_fresh and not revalidate:
+            metadata_cache.record_hit()
+            return copy.deepcopy(value), etag
+
+        try:
+            stat = get_storage_backend().stat(key)
+        except ObjectNotFoundError:
+            metadata_cache.invalidate(key)
+            metadata_cache.record_miss()
+            return None, None
+
+        if _normalize_etag(stat.etag) == etag:
+            metadata_cache.touch(key)
+            metadata_cache.record_hit(revalidated=True)
+            return copy.deepcopy(value), etag
+
+    metadata_cache.record_miss()
+    try:
+        data, etag = get_storage_backend().get(key)
+    except ObjectNotFoundError:
+        metadata_cache.invalidate(key)
+        return None, None
+    etag = _normalize_etag(etag)
+
+    value = json.loads(data.decode("utf-8"))
+    metadata_cache.put(key, value, etag)
+    return copy.deepcopy(value), etag
+
+
+def write_json_object(key, value):
+    """Write a JSON object in a single PUT and invalidate its cache entry."""
+    value_bytes = json.dumps(value).encode("utf-8")
+    metadata_cache.invalidate(key)
+    try:
+        with io.BytesIO(value_bytes) as value_stream:
+            get_storage_backend().put(
+                key, value_stream, len(value_bytes), "application/json"
+            )
+    finally:
+        metadata_cache.invalidate(key)
+
+
+def replace_json_object(key, value, etag):
+    """Write a JSON object only if no other writer changed it since it was read.
+
+    Args:
+        key: Storage key of the object
+        value: The new value
+        etag: ETag the object was read with, or None if it did not exist
+
+    Raises:
+        ObjectChangedError: If the object was changed (or created) meanwhile
+    """
+    value_bytes = json.dumps(value).encode("utf-8")
+    metadata_cache.invalidate(key)
+    try:
+        get_storage_backend().put_conditional(
+            key, value_bytes, "application/json", etag
+        )
+    finally:
+        metadata_cache.invalidate(key)
+
+
+def remove_cached_object(key):
+    """Delete an object and invalidate its cache entry."""
+    metadata_cache.invalidate(key)
+    failed = get_storage_backend().delete([key])
+    if failed:
+        raise StorageError(f"Error deleting {key}: {failed[0]['error']}")
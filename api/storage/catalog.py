@@ -0,0 +1,445 @@
+"""Sharded catalog of public story metadata.
+
+Anonymous story listings are served from a fixed set of shard objects holding
+the metadata of every story, instead of listing the whole bucket and reading
+each story's metadata.json. Shards are chosen by the first character of the
+story ID (IDs are hex, giving 16 shards) and are updated incrementally by the
+story write and delete paths, with conditional writes so that concurrent
+updates are never lost. The catalog is rebuilt from a full scan when it is
+missing and, in the background, once it is older than
+CATALOG_MAX_AGE_SECONDS.
+
+Structure:
+root/
+    _index/
+        catalog/
+            stories/
+                catalog.json       (marker written by a full rebuild)
+                shard-{c}.json
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from error_handlers import APIError
+from storage.backends import ObjectChangedError, ObjectNotFoundError
+from storage.cache import (
+    read_json_object,
+    read_json_object_with_etag,
+    remove_cached_object,
+    replace_json_object,
+    write_json_object,
+)
+from storage.client import get_storage_backend, list_minio_objects
+from storage.utils import get_object_path
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PREFIX = "_index/catalog/stories"
+CATALOG_MARKER_KEY = f"{CATALOG_PREFIX}/catalog.json"
+CATALOG_VERSION = 1
+
+# Shard writes are conditional on the ETag they read; a write that loses the
+# race with another writer is re-applied to the winner's shard
+CATALOG_WRITE_ATTEMPTS = 5
+
+# The catalog is rebuilt in the background once its last rebuild is older than
+# this, which repairs updates lost to failed writes
+CATALOG_MAX_AGE_SECONDS = int(os.getenv("CATALOG_MAX_AGE_SECONDS", "86400"))
+
+# While one worker builds a missing catalog, requests elsewhere wait this long
+# for it, checking the marker at this interval, before answering 503
+CATALOG_BUILD_WAIT_SECONDS = 10
+CATALOG_BUILD_POLL_SECONDS = 0.5
+# A build claimed this long ago without completing is taken over
+CATALOG_BUILD_TIMEOUT_SECONDS = 600
+
+# Serializes shard updates within a process, so that conflicting writes are
+# only retried across processes
+_catalog_lock = threading.Lock()
+
+_rebuild_thread = None
+_rebuild_thread_lock = threading.Lock()
+
+
+def get_catalog_shard(story_id):
+    """Get the catalog shard a story belongs to."""
+    return story_id[0].lower()
+
+
+def get_shard_key(shard):
+    """Get the storage key of a catalog shard."""
+    return f"{CATALOG_PREFIX}/shard-{shard}.json"
+
+
+def _get_key_shard(shard_key):
+    """Get the catalog shard stored under a key."""
+    return shard_key[len(f"{CATALOG_PREFIX}/shard-") : -len(".json")]
+
+
+def _read_catalog_shard(shard, revalidate=False):
+    """Read the story records of a catalog shard together with its ETag."""
+    shard_data, etag = read_json_object_with_etag(
+        get_shard_key(shard), revalidate=revalidate
+    )
+    return (shard_data or {}).get("stories", {}), etag
+
+
+def read_catalog_shard(shard, revalidate=False):
+    """Read the story records of a catalog shard.
+
+    Returns:
+        dict: Story metadata keyed by story ID (empty if the shard is missing)
+    """
+    return _read_catalog_shard(shard, revalidate=revalidate)[0]
+
+
+def _write_catalog_shard(shard, records, etag):
+    """Write the story records of a catalog shard if it is unchanged since read.
+
+    Raises:
+        ObjectChangedError: If another writer replaced the shard meanwhile
+    """
+    replace_json_object(
+        get_shard_key(shard),
+        {"version": CATALOG_VERSION, "shard": shard, "stories": records},
+        etag,
+    )
+
+
+def _list_shard_objects():
+    """List the keys and ETags of all existing catalog shards."""
+    return [
+        obj
+        for obj in list_minio_objects(f"{CATALOG_PREFIX}/")
+        if obj["key"] != CATALOG_MARKER_KEY
+    ]
+
+
+def _list_shard_keys():
+    """List the keys of all existing catalog shards."""
+    return [obj["key"] for obj in _list_shard_objects()]
+
+
+def is_catalog_built():
+    """Check whether the catalog has been built by a full rebuild."""
+    marker = read_json_object(CATALOG_MARKER_KEY)
+    return marker is not None and bool(marker.get("built_at"))
+
+
+def _is_catalog_stale(marker):
+    """Check whether the catalog is due for a rebuild."""
+    try:
+        last_rebuild = max(
+            datetime.fromisoformat(marker[field])
+            for field in ("built_at", "rebuild_started_at")
+            if marker.get(field)
+        )
+    except (TypeError, ValueError):
+        return True
+
+    max_age = timedelta(seconds=CATALOG_MAX_AGE_SECONDS)
+    return datetime.now(timezone.utc) - last_rebuild > max_age
+
+
+def _is_build_abandoned(marker):
+    """Check whether a claimed first build has been running for too long."""
+    try:
+        started_at = datetime.fromisoformat(marker["rebuild_started_at"])
+    except (KeyError, TypeError, ValueError):
+        return True
+
+    timeout = timedelta(seconds=CATALOG_BUILD_TIMEOUT_SECONDS)
+    return datetime.now(timezone.utc) - started_at > timeout
+
+
+def _build_missing_catalog(marker, etag):
+    """Build a catalog that was never built, if this worker wins the claim.
+
+    The claim is a marker without 'built_at', created with a conditional write,
+    so exactly one worker scans the bucket while the others wait for it.
+
+    Returns:
+        bool: True if this worker built the catalog
+    """
+    claim = {
+        "version": CATALOG_VERSION,
+        "rebuild_started_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        replace_json_object(CATALOG_MARKER_KEY, claim, etag)
+    except ObjectChangedError:
+        return False
+
+    logger.info("Story catalog not built yet, building it from storage")
+    try:
+        rebuild_story_catalog()
+    except Exception:
+        # Let the next request claim the build again
+        remove_cached_object(CATALOG_MARKER_KEY)
+        raise
+    return True
+
+
+def _ensure_catalog_built():
+    """Build the catalog if it does not exist yet, or refresh it if it is stale.
+
+    A missing catalog is built by the one worker whose claim on the marker
+    succeeds; requests elsewhere wait up to CATALOG_BUILD_WAIT_SECONDS for it
+    instead of all scanning the bucket. A stale catalog is still served while
+    one worker rebuilds it in the background.
+
+    Raises:
+        APIError: 503 if the catalog is still being built after the wait
+    """
+    deadline = time.monotonic() + CATALOG_BUILD_WAIT_SECONDS
+    revalidate = False
+    while True:
+        marker, etag = read_json_object_with_etag(
+            CATALOG_MARKER_KEY, revalidate=revalidate
+        )
+        if marker is not None and marker.get("built_at"):
+            break
+        if marker is None or _is_build_abandoned(marker):
+            if _build_missing_catalog(marker, etag):
+                return
+        if time.monotonic() >= deadline:
+            raise APIError(
+                "The story catalog is being built, please retry shortly",
+                status_code=503,
+            )
+        time.sleep(CATALOG_BUILD_POLL_SECONDS)
+        revalidate = True
+
+    if not _is_catalog_stale(marker):
+        return
+
+    marker["rebuild_started_at"] = datetime.now(timezone.utc).isoformat()
+    try:
+        replace_json_object(CATALOG_MARKER_KEY, marker, etag)
+    except ObjectChangedError:
+        # Another worker claimed the rebuild
+        return
+    except Exception as e:
+        logger.warning(f"Failed to claim story catalog rebuild: {e}")
+        return
+
+    logger.info("Story catalog is stale, rebuilding it in the background")
+    _schedule_catalog_rebuild()
+
+
+def _rebuild_catalog_in_background():
+    """Rebuild the catalog, logging instead of raising failures."""
+    try:
+        rebuild_story_catalog()
+    except Exception as e:
+        logger.error(f"Background story catalog rebuild failed: {e}")
+
+
+def _schedule_catalog_rebuild():
+    """Start a background catalog rebuild unless one is running in this process."""
+    global _rebuild_thread
+
+    with _rebuild_thread_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return
+        _rebuild_thread = threading.Thread(
+            target=_rebuild_catalog_in_background,
+            name="catalog-rebuild",
+            daemon=True,
+        )
+        _rebuild_thread.start()
+
+
+def get_catalog_version():
+    """Get a token that changes whenever any catalog shard changes.
+
+    Costs one listing of the catalog prefix: the token is made of the shard
+    keys and ETags, so no shard has to be read to tell whether it changed.
+    """
+    _ensure_catalog_built()
+    return tuple(sorted((obj["key"], obj["etag"]) for obj in _list_shard_objects()))
+
+
+def list_catalog_stories():
+    """List the metadata of all public stories from the catalog.
+
+    Costs one listing of the catalog prefix plus one read per shard, however
+    many stories there are. Builds the catalog first if it does not exist yet.
+
+    Returns:
+        list: Story metadata dictionaries
+    """
+    _ensure_catalog_built()
+
+    stories = []
+    for shard_key in _list_shard_keys():
+        shard_data = read_json_object(shard_key) or {}
+        stories.extend(shard_data.get("stories", {}).values())
+
+    logger.info(f"Listed {len(stories)} stories from catalog")
+    return stories
+
+
+def _modify_catalog_shard(shard, modify):
+    """Apply a change to a catalog shard and write it back.
+
+    The shard is written conditionally on the ETag it was read with, and the
+    change is re-applied to a fresh copy whenever another writer got there
+    first. If it keeps losing, a background rebuild repairs the shard.
+    """
+    with _catalog_lock:
+        for attempt in range(CATALOG_WRITE_ATTEMPTS):
+            records, etag = _read_catalog_shard(shard, revalidate=True)
+            modify(records)
+            try:
+                _write_catalog_shard(shard, records, etag)
+                return
+            except ObjectChangedError:
+                logger.warning(
+                    f"Catalog shard {shard} changed concurrently, retrying "
+                    f"(attempt {attempt + 1}/{CATALOG_WRITE_ATTEMPTS})"
+                )
+
+    logger.error(f"Giving up updating catalog shard {shard}")
+    _schedule_catalog_rebuild()
+
+
+def update_catalog_record(metadata):
+    """Add or replace a story's record in the catalog.
+
+    Failures are logged and repaired by a background rebuild.
+    """
+
+    def upsert(records):
+        records[metadata["id"]] = metadata
+
+    try:
+        _modify_catalog_shard(get_catalog_shard(metadata["id"]), upsert)
+    except Exception as e:
+        logger.warning(f"Failed to add story {metadata['id']} to catalog: {e}")
+        _schedule_catalog_rebuild()
+
+
+def remove_catalog_records(story_ids):
+    """Remove stories from the catalog, with one update per affected shard.
+
+    Failures are logged and repaired by a background rebuild.
+    """
+    ids_by_shard = {}
+    for story_id in story_ids:
+        ids_by_shard.setdefault(get_catalog_shard(story_id), set()).add(story_id)
+
+    for shard, shard_ids in ids_by_shard.items():
+
+        def remove(records, shard_ids=shard_ids):
+            for story_id in shard_ids:
+                records.pop(story_id, None)
+
+        try:
+            _modify_catalog_shard(shard, remove)
+        except Exception as e:
+            logger.warning(f"Failed to remove stories from catalog shard {shard}: {e}")
+            _schedule_catalog_rebuild()
+
+
+def _story_exists(metadata):
+    """Check whether a story's metadata is still in storage."""
+    try:
+        get_storage_backend().stat(
+            f"{get_object_path(metadata, 'story')}/metadata.json"
+        )
+    except ObjectNotFoundError:
+        return False
+    return True
+
+
+def _merge_shard_records(scanned, current):
+    """Merge a shard rebuilt from a scan with the story writes made during it.
+
+    Stories in both keep the more recently updated record. Stories in only one
+    of them were saved or deleted while the scan ran, which their metadata in
+    storage settles.
+    """
+    merged = {}
+    for story_id in scanned.keys() | current.keys():
+        if story_id in scanned and story_id in current:
+            merged[story_id] = max(
+                scanned[story_id],
+                current[story_id],
+                key=lambda record: record.get("updated_at") or "",
+            )
+        else:
+            record = scanned.get(story_id) or current[story_id]
+            if _story_exists(record):
+                merged[story_id] = record
+    return merged
+
+
+def _store_rebuilt_shard(shard, scanned, etag):
+    """Write a rebuilt shard unless story writes changed it since `etag`.
+
+    A shard changed during the scan is merged with the scanned records instead
+    of being overwritten, so that stories saved meanwhile are not lost.
+
+    Returns:
+        int: Number of stories in the stored shard
+    """
+    records = scanned
+    for _ in range(CATALOG_WRITE_ATTEMPTS):
+        try:
+            _write_catalog_shard(shard, records, etag)
+            return len(records)
+        except ObjectChangedError:
+            current, etag = _read_catalog_shard(shard, revalidate=True)
+            records = _merge_shard_records(scanned, current)
+
+    # Story writes keep the shard current meanwhile; the next rebuild retries
+    logger.warning(f"Gave up rebuilding catalog shard {shard}")
+    return len(read_catalog_shard(shard))
+
+
+def rebuild_story_catalog():
+    """Rebuild the whole catalog from a scan of all users' stories.
+
+    Story writes made while the scan runs are kept: each shard is written
+    conditionally on the ETag it had before the scan, and merged with its
+    current records if it changed.
+
+    Returns:
+        int: Number of stories in the rebuilt catalog
+    """
+    # Import here to avoid circular import
+    from storage.objects import scan_all_users_objects
+
+    etags = {
+        shard: _read_catalog_shard(shard, revalidate=True)[1]
+        for shard in map(_get_key_shard, _list_shard_keys())
+    }
+
+    scanned = {}
+    for story in scan_all_users_objects("story"):
+        scanned.setdefault(get_catalog_shard(story["id"]), {})[story["id"]] = story
+
+    # Shards left without stories are emptied rather than deleted, since a
+    # delete cannot be made conditional on a concurrent save not happening
+    story_count = 0
+    for shard in scanned.keys() | etags.keys():
+        story_count += _store_rebuilt_shard(
+            shard, scanned.get(shard, {}), etags.get(shard)
+        )
+
+    write_json_object(
+        CATALOG_MARKER_KEY,
+        {
+            "version": CATALOG_VERSION,
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            "story_count": story_count,
+        },
+    )
+
+    logger.info(f"Rebuilt story catalog with {story_count} stories")
+    return story_count
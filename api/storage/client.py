@@ -1,14 +1,29 @@
+import io
 import logging
 import os
+import threading
 import traceback
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
+import boto3
 import urllib3
+from botocore.client import Config
+from botocore.exceptions import ClientError
 from minio import Minio
+from minio.commonconfig import CopySource
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 
 from error_handlers import APIError
+from storage.backends import (
+    LocalFilesystemBackend,
+    ObjectChangedError,
+    ObjectNotFoundError,
+    StorageBackend,
+    StorageError,
+)
 
 # Suppress only the single InsecureRequestWarning
 warnings.filterwarnings("ignore", category=urllib3.exceptions.InsecureRequestWarning)
@@ -25,17 +40,33 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "production")
 MINIO_SECURE = os.getenv("MINIO_SECURE", "true").lower() == "true"
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+
+# Storage backend: "minio" for the S3 bucket above, or "local" to keep
+# objects as files under LOCAL_STORAGE_ROOT on this host
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "minio").lower()
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", "./storage-data")
+
+# S3 multi-object delete requests accept at most this many keys
+MAX_DELETE_BATCH_SIZE = 1000
+
+# Object bodies are relayed to clients in chunks of this many bytes
+OBJECT_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Maximum concurrent storage requests per worker process for fan-out reads.
+# Keep it at or below the MinIO client's connection pool size (10).
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", "8"))
 
 # Check if MinIO is configured
 MINIO_ENABLED = bool(MINIO_ENDPOINT and MINIO_ACCESS_KEY and MINIO_SECRET_KEY)
 
-if not MINIO_ENABLED:
+if not MINIO_ENABLED and STORAGE_BACKEND == "minio":
     logger.warning("MinIO not configured - storage functionality will be disabled")
     logger.warning(
         "Set MINIO_ENDPOINT, MINIO_ACCESS_KEY, and MINIO_SECRET_KEY to enable storage"
     )
     minio_client = None
-else:
+elif MINIO_ENABLED:
     # Validate required environment variables
     if not MINIO_ENDPOINT:
         raise ValueError("MINIO_ENDPOINT environment variable is required")
@@ -66,17 +97,221 @@ if MINIO_ENABLED:
         secure=MINIO_SECURE,
         cert_check=False,  # Skip certificate verification for self-signed certs
     )
+
+    # The MinIO SDK cannot send If-Match / If-None-Match on uploads, so
+    # conditional writes go through an S3 client for the same endpoint
+    s3_client = boto3.client(
+        "s3",
+        endpoint_url=f"{'https' if MINIO_SECURE else 'http'}://{MINIO_HOST}",
+        aws_access_key_id=MINIO_ACCESS_KEY,
+        aws_secret_access_key=MINIO_SECRET_KEY,
+        region_name=MINIO_REGION,
+        verify=False,
+        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+    )
 else:
     MINIO_HOST = None
     minio_client = None
+    s3_client = None
+
+# S3 error codes for a missing object, and for a failed conditional write
+_NOT_FOUND_CODES = ("NoSuchKey", "NoSuchObject")
+_CONDITION_FAILED_CODES = ("PreconditionFailed", "ConditionalRequestConflict")
+
+# Object written to check that the server enforces conditional writes
+CONDITIONAL_WRITE_PROBE_KEY = "_health/conditional-writes.json"
+
+_conditional_writes_verified = False
+_conditional_writes_lock = threading.Lock()
+
+
+class MinioBackend(StorageBackend):
+    """Storage backend for the configured MinIO bucket.
+
+    The module-level `minio_client` is looked up on every call.
+    """
+
+    name = "minio"
+
+    def is_configured(self):
+        return MINIO_ENABLED
+
+    def ensure_bucket(self):
+        if not minio_client.bucket_exists(MINIO_BUCKET):
+            logger.info(f"Bucket {MINIO_BUCKET} does not exist, creating it")
+            minio_client.make_bucket(MINIO_BUCKET)
+            logger.info(f"Created bucket: {MINIO_BUCKET}")
+
+    def ping(self):
+        self.check_conditional_writes()
+        return {
+            "buckets_count": len(self.list_buckets()),
+            "configured_bucket": MINIO_BUCKET,
+            "conditional_writes": True,
+        }
+
+    def check_conditional_writes(self):
+        """Check, once per process, that the server enforces conditional writes.
+
+        A server without support for them ignores If-Match and If-None-Match,
+        which would silently turn every conditional write into a blind
+        overwrite, so they are refused instead.
+
+        Raises:
+            StorageError: If the server ignores the write conditions
+        """
+        global _conditional_writes_verified
+
+        if _conditional_writes_verified:
+            return
+        with _conditional_writes_lock:
+            if _conditional_writes_verified:
+                return
+            key = CONDITIONAL_WRITE_PROBE_KEY
+            etag = self.put(key, io.BytesIO(b"{}"), 2, "application/json")
+            # Both writes must be refused: the probe exists, with another ETag
+            for stale_etag in (None, f"{etag}-stale"):
+                try:
+                    self._put_conditional(key, b"{}", "application/json", stale_etag)
+                except ObjectChangedError:
+                    continue
+                raise StorageError(
+                    "The storage server ignores If-Match/If-None-Match on PUT; "
+                    "conditional writes are required"
+                )
+            _conditional_writes_verified = True
+
+    def list_buckets(self):
+        return [bucket.name for bucket in minio_client.list_buckets()]
+
+    def stat(self, key):
+        try:
+            return minio_client.stat_object(MINIO_BUCKET, key)
+        except S3Error as e:
+            if e.code in _NOT_FOUND_CODES:
+                raise ObjectNotFoundError(key) from e
+            raise
+
+    def get(self, key):
+        response = None
+        try:
+            response = minio_client.get_object(MINIO_BUCKET, key)
+            return response.read(), response.headers.get("ETag", "").strip('"')
+        except S3Error as e:
+            if e.code in _NOT_FOUND_CODES:
+                raise ObjectNotFoundError(key) from e
+            raise
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    def get_range(self, key, offset=0, length=0, etag=None, chunk_size=None):
+        request_headers = {"If-Match": f'"{etag}"'} if etag is not None else None
+        try:
+            response = minio_client.get_object(
+                MINIO_BUCKET,
+                key,
+                offset=offset,
+                length=length,
+                request_headers=request_headers,
+            )
+        except S3Error as e:
+            if e.code in _NOT_FOUND_CODES:
+                raise ObjectNotFoundError(key) from e
+            if e.code == "PreconditionFailed":
+                raise ObjectChangedError(key, etag) from e
+            raise
+        return _iter_object_body(response, chunk_size or OBJECT_STREAM_CHUNK_SIZE)
+
+    def put(self, key, data, length, content_type, metadata=None):
+        result = minio_client.put_object(
+            bucket_name=MINIO_BUCKET,
+            object_name=key,
+            data=data,
+            length=length,
+            content_type=content_type,
+            metadata=metadata,
+        )
+        return result.etag
+
+    def put_conditional(self, key, data, content_type, etag):
+        self.check_conditional_writes()
+        return self._put_conditional(key, data, content_type, etag)
+
+    def _put_conditional(self, key, data, content_type, etag):
+        if etag is None:
+            condition = {"IfNoneMatch": "*"}
+        else:
+            condition = {"IfMatch": f'"{etag}"'}
+        try:
+            response = s3_client.put_object(
+                Bucket=MINIO_BUCKET,
+                Key=key,
+                Body=data,
+                ContentType=content_type,
+                **condition,
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in _CONDITION_FAILED_CODES:
+                raise ObjectChangedError(key, etag) from e
+            raise
+        return response["ETag"].strip('"')
+
+    def list(self, prefix=""):
+        for obj in minio_client.list_objects(
+            MINIO_BUCKET, prefix=prefix, recursive=True
+        ):
+            # Skip directory markers
+            if not obj.object_name.endswith("/"):
+                yield _object_info(obj)
+
+    def delete(self, keys):
+        keys = list(keys)
+        failed = []
+        for start in range(0, len(keys), MAX_DELETE_BATCH_SIZE):
+            batch = keys[start : start + MAX_DELETE_BATCH_SIZE]
+            logger.info(f"Deleting batch of {len(batch)} objects from '{MINIO_BUCKET}'")
+            try:
+                # The delete errors are returned lazily and must be consumed
+                for error in minio_client.remove_objects(
+                    MINIO_BUCKET, [DeleteObject(key) for key in batch]
+                ):
+                    failed.append(
+                        {"key": error.name, "error": f"{error.code}: {error.message}"}
+                    )
+            except Exception as e:
+                logger.error(f"Error deleting batch of {len(batch)} objects: {e}")
+                failed.extend({"key": key, "error": str(e)} for key in batch)
+        return failed
+
+    def copy(self, source_key, key):
+        result = minio_client.copy_object(
+            MINIO_BUCKET, key, CopySource(MINIO_BUCKET, source_key)
+        )
+        return result.etag
+
+
+if STORAGE_BACKEND == "local":
+    logger.info(f"Using local filesystem storage in {LOCAL_STORAGE_ROOT}")
+    storage_backend = LocalFilesystemBackend(LOCAL_STORAGE_ROOT)
+elif STORAGE_BACKEND == "minio":
+    storage_backend = MinioBackend()
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+def get_storage_backend():
+    """Get the storage backend that all storage operations go through."""
+    return storage_backend
 
 
 def handle_minio_error(operation):
-    """Decorator to handle MinIO client errors."""
+    """Decorator to handle storage backend errors."""
 
     def decorator(f):
         def wrapper(*args, **kwargs):
-            if not MINIO_ENABLED:
+            if not get_storage_backend().is_configured():
                 raise APIError(
                     f"Storage operation failed: {operation}",
                     status_code=503,
@@ -84,7 +319,11 @@ def handle_minio_error(operation):
                 )
             try:
                 return f(*args, **kwargs)
+            except APIError:
+                raise
             except S3Error as e:
+                if e.code == "NoSuchBucket":
+                    reset_bucket_check()
                 error_msg = f"MinIO error during {operation}: {str(e)}"
                 logger.error(error_msg)
                 logger.error(f"Stack trace: {traceback.format_exc()}")
@@ -108,19 +347,97 @@ def handle_minio_error(operation):
     return decorator
 
 
+_storage_executor = None
+_storage_executor_pid = None
+_storage_executor_lock = threading.Lock()
+
+
+def get_storage_executor():
+    """Get the thread pool shared by all storage fan-out reads.
+
+    The pool is created lazily, and again after a fork, since worker threads
+    do not survive into a forked child process.
+    """
+    global _storage_executor, _storage_executor_pid
+
+    with _storage_executor_lock:
+        if _storage_executor is None or _storage_executor_pid != os.getpid():
+            _storage_executor = ThreadPoolExecutor(
+                max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io"
+            )
+            _storage_executor_pid = os.getpid()
+        return _storage_executor
+
+
+def map_storage_calls(fn, items):
+    """Apply a blocking storage call to each item concurrently.
+
+    Runs on the shared bounded pool, so at most STORAGE_IO_WORKERS calls are
+    in flight at once. `fn` must handle its own per-item errors and must not
+    call this function itself, or it could wait on its own pool.
+
+    Returns:
+        list: The results, in the same order as `items`
+    """
+    items = list(items)
+    if len(items) <= 1 or STORAGE_IO_WORKERS <= 1:
+        return [fn(item) for item in items]
+    return list(get_storage_executor().map(fn, items))
+
+
+# Set once the bucket is known to exist in this process; cleared when a
+# storage call reports that the bucket is gone
+_bucket_verified = False
+_bucket_lock = threading.Lock()
+
+
 def ensure_bucket_exists():
-    """Ensure the MinIO bucket exists."""
-    if not MINIO_ENABLED:
-        logger.warning("MinIO not enabled, skipping bucket creation")
+    """Ensure the storage bucket exists.
+
+    The check runs once per process; later calls return immediately until
+    `reset_bucket_check` re-arms it.
+    """
+    global _bucket_verified
+
+    if not get_storage_backend().is_configured():
+        logger.warning("Storage not enabled, skipping bucket creation")
         return
-    try:
-        if not minio_client.bucket_exists(MINIO_BUCKET):
-            logger.info(f"Bucket {MINIO_BUCKET} does not exist, creating it")
-            minio_client.make_bucket(MINIO_BUCKET)
-            logger.info(f"Created bucket: {MINIO_BUCKET}")
-    except Exception as e:
-        logger.error(f"Error ensuring bucket exists: {str(e)}")
-        raise
+    if _bucket_verified:
+        return
+
+    with _bucket_lock:
+        if _bucket_verified:
+            return
+        try:
+            get_storage_backend().ensure_bucket()
+            _bucket_verified = True
+        except Exception as e:
+            logger.error(f"Error ensuring bucket exists: {str(e)}")
+            raise
+
+
+def reset_bucket_check():
+    """Make the next `ensure_bucket_exists` call check the bucket again."""
+    global _bucket_verified
+
+    if _bucket_verified:
+        logger.warning(f"Bucket {MINIO_BUCKET} reported missing, re-checking it")
+    _bucket_verified = False
+
+
+def _object_info(obj):
+    """Convert a listed MinIO object to a plain dictionary."""
+    # Handle potentially missing or None values
+    last_modified = obj.last_modified.isoformat() if obj.last_modified else None
+    etag = obj.etag if hasattr(obj, "etag") else None
+    size = obj.size if hasattr(obj, "size") else 0
+
+    return {
+        "key": obj.object_name,
+        "size": size,
+        "last_modified": last_modified,
+        "etag": etag,
+    }
 
 
 @handle_minio_error("list_objects")
@@ -135,27 +452,12 @@ def list_minio_objects(prefix=""):
             f"Listing objects in bucket '{MINIO_BUCKET}' with prefix '{prefix}'"
         )
 
-        # Use recursive=True to get all objects, not just top-level
-        for obj in minio_client.list_objects(
-            MINIO_BUCKET, prefix=prefix, recursive=True
-        ):
-            # Handle potentially missing or None values
-            last_modified = obj.last_modified.isoformat() if obj.last_modified else None
-            etag = obj.etag if hasattr(obj, "etag") else None
-            size = obj.size if hasattr(obj, "size") else 0
-
-            # Only add actual files, not directory markers
-            if not obj.object_name.endswith("/"):
-                objects.append(
-                    {
-                        "key": obj.object_name,
-                        "size": size,
-                        "last_modified": last_modified,
-                        "etag": etag,
-                    }
-                )
+        for object_info in get_storage_backend().list(prefix):
+            objects.append(object_info)
 
-                logger.debug(f"Found object: {obj.object_name} (size: {size})")
+            logger.debug(
+                f"Found object: {object_info['key']} (size: {object_info['size']})"
+            )
     except Exception as e:
         logger.error(f"Error listing objects: {e}")
         logger.error(f"Stack trace: {traceback.format_exc()}")
@@ -167,9 +469,84 @@ def list_minio_objects(prefix=""):
     return objects
 
 
+def iter_minio_objects(prefix=""):
+    """Stream objects in the MinIO bucket with optional prefix.
+
+    Unlike `list_minio_objects`, the listing is consumed page by page as the
+    caller iterates, so callers that filter keys never hold the whole listing
+    in memory. Objects are yielded in lexicographic key order.
+    """
+    ensure_bucket_exists()
+
+    logger.info(f"Streaming objects in bucket '{MINIO_BUCKET}' with prefix '{prefix}'")
+
+    yield from get_storage_backend().list(prefix)
+
+
+def _iter_object_body(response, chunk_size):
+    """Yield an object body in chunks, then return the connection to the pool."""
+    try:
+        yield from response.stream(chunk_size)
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def open_minio_object(object_key, chunk_size=OBJECT_STREAM_CHUNK_SIZE):
+    """Open an object for streaming without reading its body.
+
+    The object is stat'ed first, so a missing object raises here and callers
+    can answer conditional requests from the stat alone. Body reads are
+    pinned to the stat'ed ETag, so they always match the returned stat even
+    if the object is replaced in between.
+
+    Returns:
+        tuple: The object stat, and a function `read(offset=0, length=0)`
+            that GETs the object (or the given byte range of it, with
+            length 0 meaning to the end) and returns a generator yielding it
+            in chunks. The connection is released once the generator is
+            exhausted or closed.
+    """
+    backend = get_storage_backend()
+    stat = backend.stat(object_key)
+
+    def read(offset=0, length=0):
+        return backend.get_range(
+            object_key,
+            offset=offset,
+            length=length,
+            etag=stat.etag,
+            chunk_size=chunk_size,
+        )
+
+    return stat, read
+
+
+def remove_minio_objects(keys):
+    """Delete objects with batched S3 multi-object delete requests.
+
+    Costs one request per MAX_DELETE_BATCH_SIZE keys instead of one per key.
+    A failed request marks every key of its batch as failed; the other
+    batches are still attempted.
+
+    Returns:
+        list: Dicts with 'key' and 'error' for every key that was not deleted
+    """
+    return get_storage_backend().delete(keys)
+
+
+def stat_object(object_key):
+    """Get an object's stat from the storage backend.
+
+    Raises:
+        ObjectNotFoundError: If the object does not exist
+    """
+    return get_storage_backend().stat(object_key)
+
+
 @handle_minio_error("list_buckets")
 def list_minio_buckets():
     """List all buckets in MinIO."""
-    buckets = [bucket.name for bucket in minio_client.list_buckets()]
+    buckets = get_storage_backend().list_buckets()
     logger.info(f"Found buckets: {buckets}")
     return buckets
@@ -0,0 +1,186 @@
+"""Object ID index for constant-time lookups by story or session ID.
+
+Every stored object gets a small index record that maps its ID to the owning
+user, the data file extension and a copy of its metadata. Resolving an ID is
+then a single GET instead of a scan over every user's objects.
+
+A full rebuild leaves a marker per type recording that every stored object has
+a record, so a missing record means a missing object. The marker is removed
+whenever a record fails to be written.
+
+Structure:
+root/
+    _index/
+        ids/
+            {type}s.json    (marker written by a full rebuild)
+            {type}s/
+                {object_id}.json
+"""
+
+import json
+import logging
+from datetime import datetime, timezone
+
+from minio.error import S3Error
+
+from storage.cache import read_json_object, remove_cached_object, write_json_object
+from storage.utils import get_plural_type
+
+logger = logging.getLogger(__name__)
+
+INDEX_PREFIX = "_index/ids"
+INDEX_VERSION = 1
+
+
+def get_index_key(object_id, data_type):
+    """Get the storage key of the index record for an object."""
+    return f"{INDEX_PREFIX}/{get_plural_type(data_type)}/{object_id}.json"
+
+
+def get_index_marker_key(data_type):
+    """Get the storage key of the marker of a complete index."""
+    return f"{INDEX_PREFIX}/{get_plural_type(data_type)}.json"
+
+
+def is_index_complete(data_type):
+    """Check whether every stored object of a type has an index record.
+
+    Returns:
+        bool: True if a full rebuild completed and no record write failed since
+    """
+    marker_key = get_index_marker_key(data_type)
+    try:
+        return read_json_object(marker_key) is not None
+    except Exception as e:
+        logger.warning(f"Error reading index marker {marker_key}: {e}")
+        return False
+
+
+def _mark_index_incomplete(data_type):
+    """Remove the marker of a complete index, ignoring failures."""
+    marker_key = get_index_marker_key(data_type)
+    try:
+        remove_cached_object(marker_key)
+    except Exception as e:
+        logger.error(f"Failed to delete index marker {marker_key}: {e}")
+
+
+def build_index_entry(metadata, data_type, data_extension):
+    """Build the index record for an object from its metadata."""
+    return {
+        "id": metadata["id"],
+        "type": data_type,
+        "creator_id": metadata["creator"]["id"],
+        "data_extension": data_extension,
+        "metadata": metadata,
+    }
+
+
+def find_index_entry(object_id, data_type):
+    """Read the index record for an object, telling missing from unreadable.
+
+    Returns:
+        tuple: The index record (or None) and whether the record is missing
+            rather than unreadable or invalid
+    """
+    index_key = get_index_key(object_id, data_type)
+    try:
+        entry = read_json_object(index_key)
+    except (S3Error, OSError) as e:
+        logger.warning(f"Error reading index record {index_key}: {e}")
+        return None, False
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        logger.warning(f"Invalid index record {index_key}: {e}")
+        return None, False
+
+    if entry is None:
+        return None, True
+
+    if (
+        not isinstance(entry, dict)
+        or entry.get("id") != object_id
+        or entry.get("type") != data_type
+    ):
+        logger.warning(f"Index record {index_key} does not match {object_id}")
+        return None, False
+
+    return entry, False
+
+
+def write_index_entry(metadata, data_type, data_extension):
+    """Create or replace the index record for an object.
+
+    Failures are logged and swallowed: the object itself is already stored.
+    The index is marked incomplete instead, so that lookups fall back to a
+    scan, which repairs the record, until the next full rebuild.
+    """
+    entry = build_index_entry(metadata, data_type, data_extension)
+    index_key = get_index_key(entry["id"], data_type)
+
+    try:
+        write_json_object(index_key, entry)
+        logger.debug(f"Updated index record {index_key}")
+    except Exception as e:
+        logger.warning(f"Failed to write index record {index_key}: {e}")
+        _mark_index_incomplete(data_type)
+
+    return entry
+
+
+def delete_index_entry(object_id, data_type):
+    """Delete the index record for an object, ignoring failures."""
+    index_key = get_index_key(object_id, data_type)
+    try:
+        remove_cached_object(index_key)
+        logger.debug(f"Deleted index record {index_key}")
+    except Exception as e:
+        logger.warning(f"Failed to delete index record {index_key}: {e}")
+
+
+def rebuild_id_index(data_types=("session", "story")):
+    """Rewrite the index records of all stored objects from a full scan.
+
+    Once every record of a type is written, the index of that type is marked
+    complete and lookups of unknown IDs stop falling back to a scan.
+
+    Returns:
+        dict: Number of records written per data type
+    """
+    # Import here to avoid circular import
+    from storage.objects import scan_object_locations
+
+    written = {}
+    for data_type in data_types:
+        locations = scan_object_locations(data_type)
+        failed = 0
+        for location in locations:
+            entry = build_index_entry(
+                location["metadata"], data_type, location["data_extension"]
+            )
+            index_key = get_index_key(entry["id"], data_type)
+            try:
+                write_json_object(index_key, entry)
+            except Exception as e:
+                logger.warning(f"Failed to write index record {index_key}: {e}")
+                failed += 1
+        written[data_type] = len(locations) - failed
+        logger.info(f"Rebuilt {written[data_type]} {data_type} index records")
+
+        if failed:
+            logger.warning(
+                f"{failed} {data_type} index records could not be written, "
+                f"leaving the index marked incomplete"
+            )
+            _mark_index_incomplete(data_type)
+            continue
+
+        write_json_object(
+            get_index_marker_key(data_type),
+            {
+                "version": INDEX_VERSION,
+                "built_at": datetime.now(timezone.utc).isoformat(),
+                "record_count": len(locations),
+            },
+        )
+
+    return written
@@ -0,0 +1,252 @@
+"""Background jobs for long-running storage operations.
+
+Operations that may take longer than a request should wait (such as deleting
+a very large account) can run in a background thread of the worker process.
+The job's status and result are stored as a small JSON record in the bucket,
+so any worker can answer status requests for it.
+
+While a job is pending or running, its worker rewrites the record's
+`updated_at` every JOB_HEARTBEAT_SECONDS. A job whose heartbeat stopped (its
+worker was restarted or recycled) is reported as 'interrupted', so that it can
+be submitted again. Records are deleted JOB_RECORD_TTL_SECONDS after their
+last update.
+
+Structure:
+root/
+    _jobs/
+        {job_id}.json
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from storage.cache import read_json_object, remove_cached_object, write_json_object
+from storage.client import handle_minio_error, list_minio_objects
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = "_jobs"
+
+# Background jobs running at once per worker process
+STORAGE_JOB_WORKERS = int(os.getenv("STORAGE_JOB_WORKERS", "2"))
+
+# Pending and running jobs touch their record this often; a job not touched
+# for JOB_STALE_SECONDS has lost its worker
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_STALE_SECONDS = float(
+    os.getenv("JOB_STALE_SECONDS", str(JOB_HEARTBEAT_SECONDS * 5))
+)
+
+# Job records not updated for this long are deleted
+JOB_RECORD_TTL_SECONDS = float(os.getenv("JOB_RECORD_TTL_SECONDS", "604800"))
+
+ACTIVE_JOB_STATUSES = ("pending", "running")
+
+_job_executor = None
+_job_executor_pid = None
+_job_executor_lock = threading.Lock()
+
+# Jobs of this process that are pending or running, keyed by job ID. Record
+# writes for them happen under the lock, so a heartbeat can never overwrite a
+# job's final status.
+_active_jobs = {}
+_active_jobs_lock = threading.Lock()
+_heartbeat_thread = None
+_heartbeat_pid = None
+
+
+def get_job_key(job_id):
+    """Get the storage key of a job record."""
+    return f"{JOB_PREFIX}/{job_id}.json"
+
+
+def _get_job_executor():
+    """Get the thread pool running background jobs, recreated after a fork."""
+    global _job_executor, _job_executor_pid
+
+    with _job_executor_lock:
+        if _job_executor is None or _job_executor_pid != os.getpid():
+            _job_executor = ThreadPoolExecutor(
+                max_workers=STORAGE_JOB_WORKERS, thread_name_prefix="storage-job"
+            )
+            _job_executor_pid = os.getpid()
+        return _job_executor
+
+
+def _now():
+    """Get the current UTC time as an ISO string."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _update_job(job, **changes):
+    """Apply changes to a job record and write it back."""
+    with _active_jobs_lock:
+        job.update(changes, updated_at=_now())
+        write_json_object(get_job_key(job["job_id"]), job)
+        if job["status"] not in ACTIVE_JOB_STATUSES:
+            _active_jobs.pop(job["job_id"], None)
+
+
+def _touch_active_jobs():
+    """Rewrite the `updated_at` of every active job of this process."""
+    with _active_jobs_lock:
+        for job in _active_jobs.values():
+            job["updated_at"] = _now()
+            try:
+                write_json_object(get_job_key(job["job_id"]), job)
+            except Exception as e:
+                logger.warning(
+                    f"Failed to record heartbeat of job {job['job_id']}: {e}"
+                )
+
+
+def _heartbeat_periodically():
+    """Touch the records of active jobs until the process exits."""
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        _touch_active_jobs()
+
+
+def _ensure_heartbeat():
+    """Start the heartbeat thread, again after a fork."""
+    global _heartbeat_thread, _heartbeat_pid
+
+    with _job_executor_lock:
+        if _heartbeat_thread is None or _heartbeat_pid != os.getpid():
+            _heartbeat_thread = threading.Thread(
+                target=_heartbeat_periodically,
+                name="storage-job-heartbeat",
+                daemon=True,
+            )
+            _heartbeat_thread.start()
+            _heartbeat_pid = os.getpid()
+
+
+def _run_job(job, fn, args):
+    """Run a job's function and record its outcome."""
+    try:
+        _update_job(job, status="running")
+        result = fn(*args)
+        _update_job(job, status="completed", result=result)
+        logger.info(f"Job {job['job_id']} ({job['type']}) completed")
+    except Exception as e:
+        logger.error(f"Job {job['job_id']} ({job['type']}) failed: {e}")
+        message = getattr(e, "message", None) or str(e)
+        try:
+            _update_job(job, status="failed", error=message)
+        except Exception as write_error:
+            logger.error(
+                f"Failed to record failure of job {job['job_id']}: {write_error}"
+            )
+    finally:
+        with _active_jobs_lock:
+            _active_jobs.pop(job["job_id"], None)
+
+
+def _age_seconds(timestamp):
+    """Get the number of seconds since an ISO timestamp (None if invalid)."""
+    try:
+        return (datetime.now(timezone.utc) - datetime.fromisoformat(timestamp)) / (
+            timedelta(seconds=1)
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+def expire_job_records():
+    """Delete the job records not updated for JOB_RECORD_TTL_SECONDS.
+
+    Costs one listing of the jobs prefix; record ages are taken from the
+    listing, so no record is read.
+
+    Returns:
+        int: Number of records deleted
+    """
+    expired = [
+        obj["key"]
+        for obj in list_minio_objects(f"{JOB_PREFIX}/")
+        if (_age_seconds(obj.get("last_modified")) or 0) > JOB_RECORD_TTL_SECONDS
+    ]
+    for key in expired:
+        remove_cached_object(key)
+    if expired:
+        logger.info(f"Deleted {len(expired)} expired job records")
+    return len(expired)
+
+
+@handle_minio_error("submit_job")
+def submit_job(job_type, user_id, fn, *args):
+    """Run a function in the background and track it as a job.
+
+    Args:
+        job_type: Name of the operation, e.g. 'delete_all_user_data'
+        user_id: User who started the job and may read its status
+        fn: Function to run; its return value is stored as the job result
+        *args: Arguments for the function
+
+    Returns:
+        dict: The job record, with status 'pending'
+    """
+    now = _now()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "type": job_type,
+        "user_id": user_id,
+        "status": "pending",
+        "created_at": now,
+        "updated_at": now,
+        "result": None,
+        "error": None,
+    }
+    running_job = dict(job)
+    with _active_jobs_lock:
+        write_json_object(get_job_key(job["job_id"]), job)
+        _active_jobs[job["job_id"]] = running_job
+    _ensure_heartbeat()
+
+    _get_job_executor().submit(_run_job, running_job, fn, args)
+    logger.info(f"Submitted job {job['job_id']} ({job_type}) for user {user_id}")
+
+    # Jobs are rare, so old records are cleaned up as new ones are submitted
+    try:
+        expire_job_records()
+    except Exception as e:
+        logger.warning(f"Failed to delete expired job records: {e}")
+    return job
+
+
+@handle_minio_error("read_job")
+def read_job(job_id):
+    """Read a job record.
+
+    A pending or running job whose heartbeat stopped is reported with status
+    'interrupted': the worker running it is gone and it will not finish.
+
+    Returns:
+        dict or None: The job record, or None if there is no such job
+    """
+    # Job IDs are hex UUIDs; anything else cannot name a job record
+    if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+        return None
+    # Always revalidate: the job may be updated by another worker process
+    job = read_json_object(get_job_key(job_id), revalidate=True)
+    if job is None:
+        return None
+
+    age = _age_seconds(job.get("updated_at"))
+    if age is not None and age > JOB_RECORD_TTL_SECONDS:
+        return None
+    if job.get("status") in ACTIVE_JOB_STATUSES and (
+        age is None or age > JOB_STALE_SECONDS
+    ):
+        job["status"] = "interrupted"
+        job["error"] = (
+            "The job stopped reporting progress, most likely because its worker "
+            "was restarted; submit it again"
+        )
+    return job
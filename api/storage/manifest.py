@@ -0,0 +1,256 @@
+"""Per-user manifest of session and story metadata.
+
+Each user has a single manifest object holding the metadata records of all
+their sessions and stories, so listing them (and counting them for quotas) is
+one GET instead of one GET per object. The manifest is rewritten on every
+write path, conditionally on the ETag it was read with so that concurrent
+writers never drop each other's records, and rebuilt from a prefix listing
+when it is missing or stale.
+
+Structure:
+root/
+    {user_id}/
+        manifest.json
+"""
+
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from minio.error import S3Error
+
+from storage.backends import ObjectChangedError
+from storage.cache import (
+    read_json_object_with_etag,
+    remove_cached_object,
+    replace_json_object,
+)
+from storage.client import get_storage_backend
+from storage.utils import get_plural_type
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Manifests older than this are rebuilt from a listing on the next read, which
+# picks up objects written or deleted without going through this module
+USER_MANIFEST_MAX_AGE_SECONDS = int(os.getenv("USER_MANIFEST_MAX_AGE_SECONDS", "86400"))
+
+# Manifest writes are conditional on the ETag they read; a write that loses
+# the race is re-applied to the winner's manifest up to this many times
+MANIFEST_WRITE_ATTEMPTS = 5
+
+# Striped locks serialize read-modify-write cycles for a user within a process,
+# so that conflicting writes are only retried across processes
+_manifest_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_manifest_key(user_id):
+    """Get the storage key of a user's manifest."""
+    return f"{user_id}/manifest.json"
+
+
+def _get_manifest_lock(user_id):
+    """Get the lock guarding updates to a user's manifest."""
+    return _manifest_locks[zlib.crc32(user_id.encode("utf-8")) % len(_manifest_locks)]
+
+
+def _now():
+    """Get the current UTC time."""
+    return datetime.now(timezone.utc)
+
+
+def _is_manifest_stale(manifest):
+    """Check whether a manifest must be rebuilt before it can be trusted."""
+    if manifest.get("version") != MANIFEST_VERSION:
+        return True
+
+    try:
+        reconciled_at = datetime.fromisoformat(manifest["reconciled_at"])
+    except (KeyError, TypeError, ValueError):
+        return True
+
+    max_age = timedelta(seconds=USER_MANIFEST_MAX_AGE_SECONDS)
+    return _now() - reconciled_at > max_age
+
+
+def _read_user_manifest(user_id, revalidate=False):
+    """Read a user's manifest together with the ETag of the stored object.
+
+    Returns:
+        tuple: The manifest, or None if it is missing, unreadable or stale, and
+            the ETag to write its replacement against (None if it is missing)
+    """
+    manifest_key = get_manifest_key(user_id)
+    try:
+        manifest, etag = read_json_object_with_etag(manifest_key, revalidate=revalidate)
+    except (S3Error, OSError) as e:
+        logger.warning(f"Error reading manifest {manifest_key}: {e}")
+        return None, None
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        logger.warning(f"Invalid manifest {manifest_key}: {e}")
+        return None, _get_stored_etag(manifest_key)
+
+    if not isinstance(manifest, dict):
+        return None, etag
+
+    if _is_manifest_stale(manifest):
+        logger.info(f"Manifest {manifest_key} is stale")
+        return None, etag
+
+    return manifest, etag
+
+
+def _get_stored_etag(manifest_key):
+    """Get the ETag of a stored manifest that could not be parsed."""
+    try:
+        return get_storage_backend().stat(manifest_key).etag
+    except Exception:
+        return None
+
+
+def read_user_manifest(user_id, revalidate=False):
+    """Read a user's manifest.
+
+    Returns:
+        dict or None: The manifest, or None if it is missing, unreadable or stale
+    """
+    return _read_user_manifest(user_id, revalidate=revalidate)[0]
+
+
+def write_user_manifest(user_id, manifest, etag):
+    """Write a user's manifest if it is unchanged since it was read.
+
+    Args:
+        user_id: Owner of the manifest
+        manifest: The new manifest
+        etag: ETag the manifest was read with, or None if it was missing
+
+    Raises:
+        ObjectChangedError: If another writer replaced the manifest meanwhile
+    """
+    manifest_key = get_manifest_key(user_id)
+    manifest["updated_at"] = _now().isoformat()
+    replace_json_object(manifest_key, manifest, etag)
+    logger.debug(f"Updated manifest {manifest_key}")
+
+
+def invalidate_user_manifest(user_id):
+    """Delete a user's manifest so that the next read rebuilds it."""
+    manifest_key = get_manifest_key(user_id)
+    try:
+        remove_cached_object(manifest_key)
+    except Exception as e:
+        logger.warning(f"Failed to delete manifest {manifest_key}: {e}")
+
+
+def _build_user_manifest(user_id):
+    """Build a user's manifest from a listing of their objects."""
+    # Import here to avoid circular import
+    from storage.objects import scan_user_objects
+
+    logger.info(f"Rebuilding manifest for user {user_id} from storage listing")
+    objects_by_type = scan_user_objects(user_id)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "user_id": user_id,
+        "reconciled_at": _now().isoformat(),
+    }
+    for data_type, records in objects_by_type.items():
+        manifest[get_plural_type(data_type)] = {
+            record["id"]: record for record in records
+        }
+    return manifest
+
+
+def reconcile_user_manifest(user_id, etag=None):
+    """Rebuild a user's manifest from a listing of their objects.
+
+    The rebuilt manifest is only stored if no other writer replaced the one it
+    supersedes; if one did, the other writer's manifest is kept, since it was
+    written after this listing started.
+
+    Args:
+        user_id: Owner of the manifest
+        etag: ETag of the stale or unreadable manifest being replaced, or None
+            if there is none
+    """
+    manifest = _build_user_manifest(user_id)
+    try:
+        write_user_manifest(user_id, manifest, etag)
+    except ObjectChangedError:
+        logger.debug(f"Manifest for user {user_id} changed while rebuilding it")
+    except Exception as e:
+        logger.warning(f"Failed to write manifest for user {user_id}: {e}")
+        invalidate_user_manifest(user_id)
+    return manifest
+
+
+def _load_user_manifest(user_id, revalidate=False):
+    """Read a user's manifest, rebuilding it if necessary."""
+    manifest, etag = _read_user_manifest(user_id, revalidate=revalidate)
+    if manifest is None:
+        manifest = reconcile_user_manifest(user_id, etag)
+    return manifest
+
+
+def get_manifest_records(user_id, data_type):
+    """Get the metadata records of a user's objects of one type.
+
+    Returns:
+        list: Metadata dictionaries
+    """
+    manifest = _load_user_manifest(user_id)
+    return list(manifest.get(get_plural_type(data_type), {}).values())
+
+
+def _modify_manifest_records(user_id, data_type, modify):
+    """Apply a change to a user's manifest records and write it back.
+
+    The manifest is written conditionally on the ETag it was read with, and the
+    change is re-applied to a fresh copy whenever another writer (in this or any
+    other worker process) got there first. Failures are logged and the manifest
+    is invalidated, so that a failed update never fails the write that
+    triggered it.
+    """
+    with _get_manifest_lock(user_id):
+        try:
+            for _ in range(MANIFEST_WRITE_ATTEMPTS):
+                manifest, etag = _read_user_manifest(user_id, revalidate=True)
+                if manifest is None:
+                    manifest = _build_user_manifest(user_id)
+                modify(manifest.setdefault(get_plural_type(data_type), {}))
+                try:
+                    write_user_manifest(user_id, manifest, etag)
+                    return
+                except ObjectChangedError:
+                    logger.debug(f"Manifest for user {user_id} changed, retrying")
+            logger.warning(
+                f"Gave up updating manifest for user {user_id} after "
+                f"{MANIFEST_WRITE_ATTEMPTS} conflicting writes"
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update manifest for user {user_id}: {e}")
+        invalidate_user_manifest(user_id)
+
+
+def update_manifest_record(user_id, data_type, metadata):
+    """Add or replace an object's record in its owner's manifest."""
+
+    def upsert(records):
+        records[metadata["id"]] = metadata
+
+    _modify_manifest_records(user_id, data_type, upsert)
+
+
+def remove_manifest_record(user_id, data_type, object_id):
+    """Remove an object's record from its owner's manifest."""
+
+    def remove(records):
+        records.pop(object_id, None)
+
+    _modify_manifest_records(user_id, data_type, remove)
@@ -1,28 +1,64 @@
 import base64
+import gzip
 import io
 import json
 import logging
 import os
+import shutil
+import tempfile
+import time
 import traceback
 
 import msgpack
 
 from error_handlers import APIError
+from schemas import SessionDataValidator, validate_session_stream
+from storage.cache import metadata_cache, read_json_object
+from storage.catalog import (
+    get_catalog_version,
+    list_catalog_stories,
+    remove_catalog_records,
+    update_catalog_record,
+)
 from storage.client import (
-    MINIO_BUCKET,
+    OBJECT_STREAM_CHUNK_SIZE,
     ensure_bucket_exists,
+    get_storage_backend,
     handle_minio_error,
+    iter_minio_objects,
     list_minio_objects,
-    minio_client,
+    map_storage_calls,
+    remove_minio_objects,
+)
+from storage.index import (
+    delete_index_entry,
+    find_index_entry,
+    is_index_complete,
+    write_index_entry,
+)
+from storage.manifest import (
+    get_manifest_records,
+    remove_manifest_record,
+    update_manifest_record,
 )
 from storage.metadata import (
     update_metadata_timestamp,
     validate_data_filename,
     validate_metadata,
 )
+from storage.pagination import (
+    DEFAULT_SORT,
+    OrderedView,
+    encode_cursor,
+    get_ordered_view,
+)
 from storage.utils import (
+    GZIP_VARIANT_ETAG_METADATA,
+    GZIP_VARIANT_SUFFIX,
+    SESSION_ENCODING_METADATA,
+    detect_session_encoding,
+    encode_mvsj,
     extract_unique_object_directories,
-    extract_user_ids_from_objects,
     get_content_type,
     get_data_file_extension,
     get_object_path,
@@ -31,6 +67,19 @@ from storage.utils import (
 
 logger = logging.getLogger(__name__)
 
+# Stored .mvsj data of at least this size gets a precompressed gzip variant,
+# compressed once per write rather than once per download
+GZIP_VARIANT_MIN_BYTES = 1024
+GZIP_COMPRESS_LEVEL = 6
+# Gzip variants larger than this are compressed into a temporary file
+GZIP_SPOOL_MAX_MEMORY = 1024 * 1024
+
+# IDs recently confirmed missing, so that repeated requests for an unknown ID
+# do not each fall back to a bucket scan
+MISSING_ID_TTL_SECONDS = float(os.getenv("MISSING_ID_TTL_SECONDS", "30"))
+MISSING_ID_CACHE_SIZE = 10000
+_missing_ids = {}
+
 
 @handle_minio_error("save_object")
 def save_object(data_type, data, metadata):
@@ -43,9 +92,11 @@ def save_object(data_type, data, metadata):
         logger.info(f"Starting save_object operation for {data_type}")
         logger.info(f"Object path: {object_path}")
 
+        # Data goes first, so an upload rejected by validation leaves no object
         ensure_bucket_exists()
-        _save_metadata(object_path, metadata)
         _save_data(object_path, data, data_type)
+        _save_metadata(object_path, metadata)
+        _index_saved_object(metadata, data_type, data.get("filename"))
 
         return metadata
     except Exception as e:
@@ -65,10 +116,14 @@ def save_story_with_session(data_type, story_data, session_data, metadata):
         logger.info(f"Starting save_story_with_session operation for {data_type}")
         logger.info(f"Object path: {object_path}")
 
+        # Both uploads are validated before anything is written, so a rejected
+        # session leaves neither a new story nor a half-applied update behind
+        _validate_session_upload(session_data)
         ensure_bucket_exists()
-        _save_metadata(object_path, metadata)
         _save_data(object_path, story_data, data_type)
-        _save_session_data(object_path, session_data)
+        _save_session_data(object_path, session_data, validated=True)
+        _save_metadata(object_path, metadata)
+        _index_saved_object(metadata, data_type, story_data.get("filename"))
 
         return metadata
     except Exception as e:
@@ -77,6 +132,16 @@ def save_story_with_session(data_type, story_data, session_data, metadata):
         raise
 
 
+def _index_saved_object(metadata, data_type, filename):
+    """Record a freshly saved object in the ID index and its owner's manifest."""
+    _missing_ids.pop((data_type, metadata["id"]), None)
+    extension = get_data_file_extension(data_type, filename)
+    write_index_entry(metadata, data_type, extension)
+    update_manifest_record(metadata["creator"]["id"], data_type, metadata)
+    if data_type == "story":
+        update_catalog_record(metadata)
+
+
 def _validate_save_inputs(data_type, data, metadata):
     """Validate inputs for save_object."""
     if data_type not in ["session", "story"]:
@@ -109,12 +174,17 @@ def _delete_old_story_data_files(object_path, new_extension):
         # List all data files for this story
         data_files = _find_story_data_files(object_path)
 
-        # Keep only data.* files with MVS extensions that are not the target
+        # Keep only data.* files with MVS extensions (or gzip variants of
+        # them) that are not the target. The target's gzip variant is
+        # rewritten along with it, if at all.
+        mvs_extensions = (".mvsj", ".mvsx")
+        stale_suffixes = mvs_extensions + tuple(
+            f"{ext}{GZIP_VARIANT_SUFFIX}" for ext in mvs_extensions
+        )
         files_to_delete = [
             key
             for key in data_files
-            if key != target_data_key
-            and (key.endswith(".mvsj") or key.endswith(".mvsx"))
+            if key != target_data_key and key.endswith(stale_suffixes)
         ]
 
         if not files_to_delete:
@@ -133,14 +203,11 @@ def _save_metadata(object_path, metadata):
 
     with io.BytesIO(metadata_bytes) as metadata_stream:
         logger.info(f"Saving metadata to {metadata_key}")
-        minio_client.put_object(
-            bucket_name=MINIO_BUCKET,
-            object_name=metadata_key,
-            data=metadata_stream,
-            length=len(metadata_bytes),
-            content_type="application/json",
+        get_storage_backend().put(
+            metadata_key, metadata_stream, len(metadata_bytes), "application/json"
         )
         logger.info("Successfully saved metadata")
+    metadata_cache.invalidate(metadata_key)
 
 
 def _save_data(object_path, data, data_type):
@@ -150,18 +217,15 @@ def _save_data(object_path, data, data_type):
     data_key = f"{object_path}/data{extension}"
     content_type = get_content_type(data_type)
 
-    if data_type == "story":
-        _delete_old_story_data_files(object_path, extension)
+    object_metadata = None
 
     if data_type == "story":
         # For .mvsx, handle binary data (from FormData) or base64 string (from JSON)
         if filename and filename.endswith(".mvsx"):
             story_data = data.get("data", "")
-            if isinstance(story_data, bytes):
+            if isinstance(story_data, bytes) or _is_binary_stream(story_data):
                 # New FormData approach - data is already binary
-                logger.info(
-                    f"Saving .mvsx story with binary data: {len(story_data)} bytes"
-                )
+                logger.info("Saving .mvsx story with binary data")
                 data_bytes = story_data
             elif isinstance(story_data, str):
                 # Legacy JSON approach - decode base64 to binary
@@ -184,17 +248,24 @@ def _save_data(object_path, data, data_type):
                 )
                 data_bytes = b""
         else:
-            # For .mvsj and other story types, keep existing behavior
+            # For .mvsj, store uploaded bytes as they are (parsed data as
+            # compact JSON) and record whether the story is wrapped
             story_data = data.get("data", {})
             logger.info(f"Saving .mvsj story: type(data)={type(story_data)}")
-            data_bytes = json.dumps(story_data, indent=2).encode("utf-8")
+            try:
+                data_bytes, object_metadata = encode_mvsj(story_data)
+            except ValueError as e:
+                raise APIError(f"Invalid .mvsj file format: {str(e)}", status_code=400)
     elif data_type == "session":
         # Session creation only supports new FormData format (binary data)
         session_data = data.get("data", "")
-        if isinstance(session_data, bytes):
+        if isinstance(session_data, bytes) or _is_binary_stream(session_data):
             # New FormData approach - data is already binary (msgpack + deflate)
-            logger.info(f"Saving session with binary data: {len(session_data)} bytes")
+            logger.info("Saving session with binary data")
             data_bytes = session_data
+            object_metadata = {
+                SESSION_ENCODING_METADATA: detect_session_encoding(session_data)
+            }
         else:
             # This should not happen with new session creation API
             raise ValueError(
@@ -205,38 +276,182 @@ def _save_data(object_path, data, data_type):
         # Other data types (if any)
         data_bytes = msgpack.packb(data, use_bin_type=True)
 
-    with io.BytesIO(data_bytes) as data_stream:
-        logger.info(f"Saving data to {data_key}")
-        minio_client.put_object(
-            bucket_name=MINIO_BUCKET,
-            object_name=data_key,
-            data=data_stream,
-            length=len(data_bytes),
-            content_type=content_type,
+    # Nothing is written before the data has been validated
+    if data_type == "story":
+        _delete_old_story_data_files(object_path, extension)
+        if extension == ".mvsj":
+            _put_gzip_variant(data_key, data_bytes, object_metadata)
+
+    logger.info(f"Saving data to {data_key}")
+    if data_type == "session":
+        _put_session_object(data_key, data_bytes, object_metadata)
+    else:
+        _put_data_object(data_key, data_bytes, content_type, object_metadata)
+    logger.info("Successfully saved data")
+
+
+def _is_binary_stream(data):
+    """Check whether data is a readable binary stream, e.g. a spooled upload."""
+    return hasattr(data, "read") and hasattr(data, "seek")
+
+
+def _put_data_object(object_key, data, content_type, object_metadata=None):
+    """Upload bytes or a seekable binary stream to the storage backend.
+
+    Streams are uploaded straight from their current storage (memory or a
+    spooled temporary file) with a known length, which MinIO sends as a
+    multipart upload for large objects, so no copy of the data is made.
+
+    Args:
+        object_key: Key of the object
+        data: Bytes or a seekable binary stream
+        content_type: Content type of the object
+        object_metadata: Optional S3 user metadata to store with the object
+
+    Returns:
+        str: The ETag of the new object
+    """
+    if _is_binary_stream(data):
+        data.seek(0, os.SEEK_END)
+        length = data.tell()
+        data.seek(0)
+        return get_storage_backend().put(
+            object_key, data, length, content_type, object_metadata
         )
-        logger.info("Successfully saved data")
 
+    with io.BytesIO(data) as data_stream:
+        return get_storage_backend().put(
+            object_key, data_stream, len(data), content_type, object_metadata
+        )
+
+
+class _ValidatingReader:
+    """Binary stream wrapper that feeds every chunk read to a validator.
+
+    The validator's finish() runs as soon as the last of the expected bytes
+    is read, before they are handed over, so an upload reading from this
+    stream fails before its last part is stored and the upload is aborted.
+    """
+
+    def __init__(self, stream, length, validator, error_message):
+        self._stream = stream
+        self._remaining = length
+        self._validator = validator
+        self._error_message = error_message
+        self._finished = False
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        try:
+            self._validator.feed(data)
+            self._remaining -= len(data)
+            if self._remaining <= 0 and not self._finished:
+                self._finished = True
+                self._validator.finish()
+        except ValueError as e:
+            raise APIError(f"{self._error_message}: {str(e)}", status_code=400)
+        return data
+
+
+def _put_session_object(object_key, session_data, object_metadata=None):
+    """Upload session data, validating spooled uploads in the same pass.
 
-def _save_session_data(object_path, session_data):
-    """Save session data for a story."""
+    A stream is validated while MinIO reads it, instead of being read once
+    for validation and once more for the upload. Bytes come from legacy
+    JSON requests whose data was validated with the request.
+
+    Raises:
+        APIError: If the session data is invalid; nothing is stored then
+    """
+    if not _is_binary_stream(session_data):
+        return _put_data_object(
+            object_key, session_data, "application/x-deflate", object_metadata
+        )
+
+    session_data.seek(0, os.SEEK_END)
+    length = session_data.tell()
+    session_data.seek(0)
+    reader = _ValidatingReader(
+        session_data, length, SessionDataValidator(), "Invalid session file format"
+    )
+    try:
+        return get_storage_backend().put(
+            object_key, reader, length, "application/x-deflate", object_metadata
+        )
+    finally:
+        session_data.seek(0)
+
+
+def _put_gzip_variant(object_key, data, object_metadata):
+    """Store a gzip-compressed copy of an object's data beside it.
+
+    The data may be bytes or a seekable stream, which is compressed in chunks
+    into a spooled temporary file. The copy is skipped for small objects and
+    when compression does not pay off. Otherwise its ETag is added to the
+    object's metadata, which must be stored after the copy so readers never
+    see a marker for a missing copy.
+    """
+    source = io.BytesIO(data) if isinstance(data, bytes) else data
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(0)
+    if size < GZIP_VARIANT_MIN_BYTES:
+        return
+
+    with tempfile.SpooledTemporaryFile(max_size=GZIP_SPOOL_MAX_MEMORY) as compressed:
+        with gzip.GzipFile(
+            filename="",
+            mode="wb",
+            compresslevel=GZIP_COMPRESS_LEVEL,
+            fileobj=compressed,
+            mtime=0,
+        ) as gzip_file:
+            shutil.copyfileobj(source, gzip_file, OBJECT_STREAM_CHUNK_SIZE)
+        source.seek(0)
+        if compressed.tell() >= size:
+            return
+
+        etag = _put_data_object(
+            f"{object_key}{GZIP_VARIANT_SUFFIX}", compressed, "application/gzip"
+        )
+    object_metadata[GZIP_VARIANT_ETAG_METADATA] = etag
+
+
+def _validate_session_upload(session_data):
+    """Validate a spooled session upload before other objects are written.
+
+    Raises:
+        APIError: If the session data is invalid
+    """
+    if not _is_binary_stream(session_data):
+        return
+    try:
+        validate_session_stream(session_data)
+    except ValueError as e:
+        raise APIError(f"Invalid session file format: {str(e)}", status_code=400)
+
+
+def _save_session_data(object_path, session_data, validated=False):
+    """Save session data for a story.
+
+    Args:
+        validated: Whether a spooled upload was already validated, so it is
+            not validated again while it is uploaded
+    """
     session_key = f"{object_path}/session.mvstory"
 
     # Session data should be raw binary (deflated msgpack)
-    if not isinstance(session_data, bytes):
+    if not (isinstance(session_data, bytes) or _is_binary_stream(session_data)):
         raise ValueError(
             f"Invalid session data type: {type(session_data)}. Expected bytes."
         )
 
-    with io.BytesIO(session_data) as session_stream:
-        logger.info(f"Saving session data to {session_key}")
-        minio_client.put_object(
-            bucket_name=MINIO_BUCKET,
-            object_name=session_key,
-            data=session_stream,
-            length=len(session_data),
-            content_type="application/x-deflate",
-        )
-        logger.info("Successfully saved session data")
+    logger.info(f"Saving session data to {session_key}")
+    if validated:
+        _put_data_object(session_key, session_data, "application/x-deflate")
+    else:
+        _put_session_object(session_key, session_data)
+    logger.info("Successfully saved session data")
 
 
 @handle_minio_error("list_objects")
@@ -246,51 +461,131 @@ def list_objects_by_type(data_type, user_id=None):
 
     if user_id:
         return _list_objects_for_user(data_type, path_type, user_id)
+    elif data_type == "story":
+        # Stories are all public, so the catalog holds every story
+        return list_catalog_stories()
     else:
         return _list_objects_for_all_users(data_type, path_type)
 
 
+@handle_minio_error("list_objects")
+def list_objects_page(
+    data_type, user_id=None, sort=DEFAULT_SORT, after=None, limit=None
+):
+    """List one page of objects of a type in a stable sort order.
+
+    Args:
+        data_type: 'session' or 'story'
+        user_id: Optional user to restrict the listing to
+        sort: Sort field, one of pagination.SORT_FIELDS
+        after: Sort key of the last record of the previous page, or None
+        limit: Maximum number of records, or None for all of them
+
+    Returns:
+        tuple: The metadata records, and the cursor of the next page (or None)
+    """
+    if user_id:
+        # Per-user listings are bounded by the quota, so sort them directly
+        view = OrderedView(get_manifest_records(user_id, data_type), sort)
+    elif data_type == "story":
+        view = get_ordered_view(
+            ("catalog", data_type), sort, get_catalog_version(), list_catalog_stories
+        )
+    else:
+        path_type = get_plural_type(data_type)
+        view = OrderedView(_list_objects_for_all_users(data_type, path_type), sort)
+
+    records, next_after = view.page(after, limit)
+    next_cursor = encode_cursor(sort, next_after) if next_after else None
+    return records, next_cursor
+
+
 def _list_objects_for_user(data_type, path_type, user_id):
-    """List objects for a specific user."""
-    prefix = f"{user_id}/{path_type}/"
+    """List objects for a specific user from the user's manifest."""
+    logger.info(f"Listing {path_type} for user {user_id} from manifest")
+    return get_manifest_records(user_id, data_type)
+
+
+def scan_user_objects(user_id):
+    """Load the metadata of all of a user's objects from a prefix listing.
 
-    logger.info(f"Listing objects for user {user_id} with prefix: {prefix}")
+    This is the slow path behind the user manifest: one listing of the user's
+    prefix and one metadata read per object directory.
 
-    objects = list_minio_objects(prefix)
-    if objects is None:
-        logger.info(f"No objects found for prefix: {prefix}")
-        return []
+    Returns:
+        dict: Lists of metadata keyed by data type ('session' and 'story')
+    """
+    prefix = f"{user_id}/"
+    logger.info(f"Scanning objects for user {user_id} with prefix: {prefix}")
+
+    objects = list_minio_objects(prefix) or []
+
+    result = {}
+    for data_type in ("session", "story"):
+        path_type = get_plural_type(data_type)
+        type_objects = [
+            obj for obj in objects if obj["key"].split("/")[1:2] == [path_type]
+        ]
+        result[data_type] = _process_objects_for_user(type_objects, data_type, user_id)
+
+    return result
 
-    return _process_objects_for_user(objects, data_type, user_id)
+
+def scan_all_users_objects(data_type):
+    """Load the metadata of all objects of a type from a full bucket scan."""
+    return _list_objects_for_all_users(data_type, get_plural_type(data_type))
 
 
 def _list_objects_for_all_users(data_type, path_type):
     """List objects across all users."""
     logger.info(f"Listing all {data_type} objects across all users")
 
-    all_objects = list_minio_objects("")
-    if all_objects is None:
-        return []
-
-    user_ids = extract_user_ids_from_objects(all_objects, path_type)
-    logger.info(f"Found {len(user_ids)} users to scan for {data_type} objects")
-
-    result = []
-    for uid in user_ids:
-        user_prefix = f"{uid}/{path_type}/"
+    object_dirs = [dir_path for dir_path, _ in iter_object_directories(path_type)]
+    logger.info(f"Found {len(object_dirs)} potential {data_type} directories")
 
-        user_objects = list_minio_objects(user_prefix)
-        if user_objects:
-            user_result = _process_objects_for_user(user_objects, data_type, uid)
-            result.extend(user_result)
+    result = _load_metadata_from_directories(object_dirs, data_type)
 
     logger.info(f"Found {len(result)} {data_type} objects")
     return result
 
 
+def iter_object_directories(path_type=None):
+    """Group a single streamed listing of the bucket into object directories.
+
+    Keys of one directory are contiguous in the lexicographic listing, so
+    each directory is yielded as soon as the listing moves past it. Keys of
+    other types are skipped as they stream by without being collected.
+
+    Args:
+        path_type: Optional 'sessions' or 'stories' to restrict the listing to
+
+    Yields:
+        tuple: The directory path ('{user_id}/{type}s/{object_id}/') and the
+            keys of the files in it
+    """
+    path_types = (path_type,) if path_type else ("sessions", "stories")
+
+    current_dir = None
+    current_keys = []
+    for obj in iter_minio_objects(""):
+        parts = obj["key"].split("/")
+        # {user_id}/{type}s/{object_id}/{file}
+        if len(parts) < 4 or parts[1] not in path_types:
+            continue
+
+        dir_path = "/".join(parts[:3]) + "/"
+        if dir_path != current_dir:
+            if current_dir is not None:
+                yield current_dir, current_keys
+            current_dir, current_keys = dir_path, []
+        current_keys.append(obj["key"])
+
+    if current_dir is not None:
+        yield current_dir, current_keys
+
+
 def _process_objects_for_user(objects, data_type, user_id):
     """Process objects for a specific user and return metadata list."""
-    result = []
     path_type = get_plural_type(data_type)
 
     logger.debug(f"Processing {len(objects)} objects for user {user_id}")
@@ -300,12 +595,19 @@ def _process_objects_for_user(objects, data_type, user_id):
         f"Found {len(object_dirs)} potential {data_type} directories for user {user_id}"
     )
 
-    for dir_path in object_dirs:
-        metadata = _load_metadata_from_directory(dir_path, data_type)
-        if metadata:
-            result.append(metadata)
+    return _load_metadata_from_directories(object_dirs, data_type)
 
-    return result
+
+def _load_metadata_from_directories(object_dirs, data_type):
+    """Load metadata from many directories concurrently, skipping failures.
+
+    Results follow the sorted directory order, i.e. storage listing order.
+    """
+    metadata_list = map_storage_calls(
+        lambda dir_path: _load_metadata_from_directory(dir_path, data_type),
+        sorted(object_dirs),
+    )
+    return [metadata for metadata in metadata_list if metadata]
 
 
 def _load_metadata_from_directory(dir_path, data_type):
@@ -313,9 +615,10 @@ def _load_metadata_from_directory(dir_path, data_type):
     metadata_path = f"{dir_path}metadata.json"
     try:
         logger.debug(f"Looking for metadata at: {metadata_path}")
-        response = minio_client.get_object(MINIO_BUCKET, metadata_path)
-        data = response.read()
-        metadata = json.loads(data.decode("utf-8"))
+        metadata = read_json_object(metadata_path)
+        if metadata is None:
+            logger.debug(f"No metadata at: {metadata_path}")
+            return None
 
         # Validate that this is the correct type of object
         actual_type = metadata.get("type")
@@ -331,9 +634,6 @@ def _load_metadata_from_directory(dir_path, data_type):
         logger.error(f"Invalid JSON in metadata file {metadata_path}: {e}")
     except Exception as e:
         logger.error(f"Error reading metadata for {metadata_path}: {e}")
-    finally:
-        if "response" in locals():
-            response.close()
 
     return None
 
@@ -355,11 +655,24 @@ def delete_all_user_data(user_id):
 
     logger.info(f"Found {len(user_objects)} objects to delete for user {user_id}")
 
-    deleted_objects = _delete_objects(user_objects)
+    deleted_objects, failed_objects = _delete_objects(user_objects)
     sessions_deleted, stories_deleted = _count_deleted_objects(deleted_objects)
+    _unindex_deleted_objects(deleted_objects)
+
+    if failed_objects:
+        logger.error(
+            f"Failed to delete {len(failed_objects)} of {len(user_objects)} objects "
+            f"for user {user_id}"
+        )
+        message = (
+            f"Deleted data for user {user_id} with "
+            f"{len(failed_objects)} objects that could not be deleted"
+        )
+    else:
+        message = f"Successfully deleted all data for user {user_id}"
 
     logger.info(
-        f"Successfully deleted all data for user {user_id}: "
+        f"Deleted data for user {user_id}: "
         f"{sessions_deleted} sessions, {stories_deleted} stories, "
         f"{len(deleted_objects)} total files"
     )
@@ -369,69 +682,200 @@ def delete_all_user_data(user_id):
         sessions_deleted,
         stories_deleted,
         len(deleted_objects),
-        f"Successfully deleted all data for user {user_id}",
+        message,
+        failed_objects,
     )
 
 
 def _delete_objects(objects):
-    """Delete a list of objects and return successfully deleted objects."""
-    deleted_objects = []
+    """Delete a list of objects in batches.
 
-    for obj in objects:
-        try:
-            object_key = obj["key"]
-            logger.debug(f"Deleting object: {object_key}")
+    Returns:
+        tuple: The keys of the deleted objects, and dicts with 'key' and
+        'error' for the objects that could not be deleted
+    """
+    object_keys = [obj["key"] for obj in objects]
+    failed_objects = remove_minio_objects(object_keys)
 
-            minio_client.remove_object(MINIO_BUCKET, object_key)
+    for failure in failed_objects:
+        logger.error(f"Failed to delete object {failure['key']}: {failure['error']}")
+
+    failed_keys = {failure["key"] for failure in failed_objects}
+    deleted_objects = []
+    for object_key in object_keys:
+        metadata_cache.invalidate(object_key)
+        if object_key not in failed_keys:
             deleted_objects.append(object_key)
 
-        except Exception as e:
-            logger.error(f"Failed to delete object {obj['key']}: {str(e)}")
+    return deleted_objects, failed_objects
+
+
+def _unindex_deleted_objects(deleted_objects):
+    """Remove objects whose metadata was deleted from the index and catalog."""
+    deleted_story_ids = []
+    for obj_key in deleted_objects:
+        parts = obj_key.split("/")
+        # {user_id}/{type}s/{object_id}/metadata.json
+        if len(parts) != 4 or parts[3] != "metadata.json":
             continue
+        for data_type in ("session", "story"):
+            if parts[1] == get_plural_type(data_type):
+                delete_index_entry(parts[2], data_type)
+                if data_type == "story":
+                    deleted_story_ids.append(parts[2])
 
-    return deleted_objects
+    if deleted_story_ids:
+        remove_catalog_records(deleted_story_ids)
 
 
 def _count_deleted_objects(deleted_objects):
-    """Count sessions and stories from deleted object paths."""
+    """Count sessions and stories from deleted object paths.
+
+    An object is counted when its metadata.json was deleted, however many
+    data files (such as a story's gzip variant) it had.
+    """
     sessions_deleted = 0
     stories_deleted = 0
 
     for obj_key in deleted_objects:
-        if "/sessions/" in obj_key:
+        parts = obj_key.split("/")
+        # {user_id}/{type}s/{object_id}/metadata.json
+        if len(parts) != 4 or parts[3] != "metadata.json":
+            continue
+        if parts[1] == get_plural_type("session"):
             sessions_deleted += 1
-        elif "/stories/" in obj_key:
+        elif parts[1] == get_plural_type("story"):
             stories_deleted += 1
 
-    # Since each session/story has 2 files (metadata.json and data.*),
-    # divide by 2 to get actual object count
-    return sessions_deleted // 2, stories_deleted // 2
+    return sessions_deleted, stories_deleted
 
 
 def _create_deletion_summary(
-    user_id, sessions_deleted, stories_deleted, total_objects_deleted, message
+    user_id,
+    sessions_deleted,
+    stories_deleted,
+    total_objects_deleted,
+    message,
+    failed_objects=None,
 ):
     """Create a deletion summary dictionary."""
+    failed_objects = failed_objects or []
     return {
         "user_id": user_id,
         "sessions_deleted": sessions_deleted,
         "stories_deleted": stories_deleted,
         "total_objects_deleted": total_objects_deleted,
+        "total_objects_failed": len(failed_objects),
+        "failed_objects": failed_objects,
         "message": message,
     }
 
 
-def find_object_by_id(object_id, data_type):
-    """Find an object by ID across all users and visibilities."""
-    all_objects = list_objects_by_type(data_type)
+@handle_minio_error("lookup_object")
+def lookup_object(object_id, data_type):
+    """Resolve an object ID to its metadata and storage location.
+
+    Reads the ID index record and falls back to a bucket scan when the record
+    is missing, writing the record back so the next lookup is a single GET.
+    Once a full rebuild has marked the index complete, a missing record means
+    the object does not exist and no scan is made.
+
+    Returns:
+        dict or None: Index record with 'metadata', 'creator_id' and
+        'data_extension' keys, or None if no such object exists
+    """
+    entry, missing = find_index_entry(object_id, data_type)
+    if entry:
+        return entry
+
+    if missing and is_index_complete(data_type):
+        logger.debug(f"No index record for {data_type} {object_id}")
+        return None
+
+    return _repair_index_entry(object_id, data_type)
+
+
+def _repair_index_entry(object_id, data_type):
+    """Locate an unindexed object by scanning storage and index it."""
+    missing_key = (data_type, object_id)
+    expires_at = _missing_ids.get(missing_key)
+    if expires_at is not None and expires_at > time.monotonic():
+        logger.debug(f"{data_type} {object_id} recently confirmed missing")
+        return None
+
+    logger.info(f"Index miss for {data_type} {object_id}, scanning storage")
+    locations = scan_object_locations(data_type, object_id=object_id)
+    if not locations:
+        if len(_missing_ids) >= MISSING_ID_CACHE_SIZE:
+            _missing_ids.clear()
+        _missing_ids[missing_key] = time.monotonic() + MISSING_ID_TTL_SECONDS
+        return None
+
+    location = locations[0]
+    logger.info(f"Repairing index record for {data_type} {object_id}")
+    return write_index_entry(
+        location["metadata"], data_type, location["data_extension"]
+    )
+
+
+def scan_object_locations(data_type, object_id=None):
+    """Locate objects of a type by scanning the bucket listing.
+
+    This is the slow path behind the ID index: one listing of the whole bucket
+    and one metadata read per matching object directory.
+
+    Args:
+        data_type: 'session' or 'story'
+        object_id: Optional ID to restrict the scan to
+
+    Returns:
+        list: Dicts with 'metadata', 'object_path' and 'data_extension' keys
+    """
+    path_type = get_plural_type(data_type)
+
+    directories = {}
+    for dir_path, keys in iter_object_directories(path_type):
+        if object_id is None or dir_path.split("/")[2] == object_id:
+            directories[dir_path] = keys
+
+    dir_paths = list(directories)
+    metadata_list = map_storage_calls(
+        lambda dir_path: _load_metadata_from_directory(dir_path, data_type),
+        dir_paths,
+    )
+
+    locations = []
+    for dir_path, metadata in zip(dir_paths, metadata_list):
+        keys = directories[dir_path]
+        if metadata:
+            locations.append(
+                {
+                    "metadata": metadata,
+                    "object_path": dir_path.rstrip("/"),
+                    "data_extension": _detect_data_extension(keys, data_type),
+                }
+            )
+
+    return locations
 
-    for obj in all_objects:
-        if obj.get("id") == object_id:
-            return obj
 
+def _detect_data_extension(keys, data_type):
+    """Detect the data file extension from the keys of an object directory."""
+    allowed_extensions = [".mvstory"] if data_type == "session" else [".mvsj", ".mvsx"]
+    for key in keys:
+        filename = key.rsplit("/", 1)[-1]
+        name, ext = os.path.splitext(filename)
+        if name == "data" and ext in allowed_extensions:
+            return ext
     return None
 
 
+def find_object_by_id(object_id, data_type):
+    """Find an object by ID across all users and visibilities."""
+    entry = lookup_object(object_id, data_type)
+    return entry["metadata"] if entry else None
+
+
 def _find_object_by_id(object_id, data_type):
     """Deprecated: Use find_object_by_id instead."""
     return find_object_by_id(object_id, data_type)
@@ -485,6 +929,10 @@ def _delete_object_by_id(object_id, requesting_user_id, object_type):
     _check_object_ownership(matching_object, requesting_user_id, object_id, object_type)
 
     deleted_files = _delete_object_files(matching_object, object_id, object_type)
+    delete_index_entry(object_id, object_type)
+    remove_manifest_record(requesting_user_id, object_type, object_id)
+    if object_type == "story":
+        remove_catalog_records([object_id])
 
     logger.info(
         f"Successfully deleted {object_type} {object_id} for user {requesting_user_id}"
@@ -504,26 +952,26 @@ def _delete_object_files(obj, object_id, object_type):
     path_type = get_plural_type(object_type)
     object_path = f"{creator_id}/{path_type}/{object_id}"
 
-    # Delete metadata.json
     metadata_key = f"{object_path}/metadata.json"
-    logger.debug(f"Deleting metadata: {metadata_key}")
-    minio_client.remove_object(MINIO_BUCKET, metadata_key)
-
     deleted_files = [metadata_key]
 
     if object_type == "session":
-        # Delete data.mvstory
-        data_key = f"{object_path}/data.mvstory"
-        logger.debug(f"Deleting data: {data_key}")
-        minio_client.remove_object(MINIO_BUCKET, data_key)
-        deleted_files.append(data_key)
+        deleted_files.append(f"{object_path}/data.mvstory")
     else:
-        # For stories, find and delete the data file (could be .mvsj or .mvsx)
-        data_files = _find_story_data_files(object_path)
-        for data_file in data_files:
-            logger.debug(f"Deleting data file: {data_file}")
-            minio_client.remove_object(MINIO_BUCKET, data_file)
-            deleted_files.append(data_file)
+        # For stories, find the data files (could be .mvsj or .mvsx)
+        deleted_files.extend(_find_story_data_files(object_path))
+
+    # Delete metadata and data files in a single request
+    logger.debug(f"Deleting files: {deleted_files}")
+    failed_files = remove_minio_objects(deleted_files)
+    metadata_cache.invalidate(metadata_key)
+
+    if failed_files:
+        raise APIError(
+            f"Failed to delete {object_type} files",
+            status_code=500,
+            details={"failed_objects": failed_files},
+        )
 
     return deleted_files
 
@@ -574,20 +1022,28 @@ def _update_object_by_id(object_id, requesting_user_id, update_data, object_type
         f"Update {object_type} {object_id} requested by user: {requesting_user_id}"
     )
 
-    matching_object = _find_object_by_id(object_id, object_type)
-    if not matching_object:
+    entry = lookup_object(object_id, object_type)
+    if not entry:
         raise APIError(f"{object_type.title()} not found", status_code=404)
 
+    matching_object = entry["metadata"]
     _check_object_ownership(matching_object, requesting_user_id, object_id, object_type)
 
     updated_metadata = _update_object_metadata(
         matching_object, update_data, object_type
     )
-    _save_updated_metadata(updated_metadata, object_id, object_type)
 
+    # Data goes first, so an upload rejected by validation changes nothing
     if "data" in update_data and update_data["data"] is not None:
         _save_updated_data(updated_metadata, update_data, object_id, object_type)
 
+    _save_updated_metadata(updated_metadata, object_id, object_type)
+
+    write_index_entry(updated_metadata, object_type, entry["data_extension"])
+    update_manifest_record(requesting_user_id, object_type, updated_metadata)
+    if object_type == "story":
+        update_catalog_record(updated_metadata)
+
     logger.info(
         f"Successfully updated {object_type} {object_id} for user {requesting_user_id}"
     )
@@ -637,9 +1093,9 @@ def _save_updated_session_data(object_path, metadata, update_data, session_id):
 
     # Handle session updates - supports both FormData (bytes) and legacy JSON (base64 string)
     session_data = update_data["data"]
-    if isinstance(session_data, bytes):
+    if isinstance(session_data, bytes) or _is_binary_stream(session_data):
         # New FormData update - data is already binary (msgpack + deflate)
-        logger.info(f"Updating session with binary data: {len(session_data)} bytes")
+        logger.info("Updating session with binary data")
         data_bytes = session_data
     elif isinstance(session_data, str):
         # Legacy JSON update - decode the base64 string (for backward compatibility)
@@ -660,14 +1116,8 @@ def _save_updated_session_data(object_path, metadata, update_data, session_id):
         }
         data_bytes = msgpack.packb(storage_data, use_bin_type=True)
 
-    with io.BytesIO(data_bytes) as data_stream:
-        minio_client.put_object(
-            bucket_name=MINIO_BUCKET,
-            object_name=data_key,
-            data=data_stream,
-            length=len(data_bytes),
-            content_type="application/x-deflate",
-        )
+    object_metadata = {SESSION_ENCODING_METADATA: detect_session_encoding(data_bytes)}
+    _put_session_object(data_key, data_bytes, object_metadata)
 
 
 def _save_updated_story_data(object_path, metadata, update_data, story_id):
@@ -693,13 +1143,8 @@ def _save_updated_story_data(object_path, metadata, update_data, story_id):
 
     # Save only the actual story data, not the metadata wrapper
     story_data = update_data["data"]
-    data_bytes = json.dumps(story_data, indent=2).encode("utf-8")
-
-    with io.BytesIO(data_bytes) as data_stream:
-        minio_client.put_object(
-            bucket_name=MINIO_BUCKET,
-            object_name=data_key,
-            data=data_stream,
-            length=len(data_bytes),
-            content_type="application/json",
-        )
+    data_bytes, object_metadata = encode_mvsj(story_data)
+    # Only .mvsj data gets a gzip variant, as on creation
+    if data_file_extension == ".mvsj":
+        _put_gzip_variant(data_key, data_bytes, object_metadata)
+    _put_data_object(data_key, data_bytes, "application/json", object_metadata)
@@ -0,0 +1,173 @@
+"""Sorted, cursor-paginated views over metadata listings.
+
+A listing is turned into an ordered view once per version of its source (for
+example the set of catalog shard ETags) and reused by every request until
+the source changes. Pages are found by binary search on the sort key instead
+of sorting the full list per request.
+
+Cursors are keyset cursors: they encode the sort key of the last record
+returned, not an offset, so records inserted or deleted concurrently never
+shift later pages or cause records to be returned twice.
+"""
+
+import base64
+import binascii
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from error_handlers import APIError
+
+# Sort fields and whether they are listed in descending order
+SORT_FIELDS = {"updated_at": True, "created_at": True, "title": False}
+DEFAULT_SORT = "updated_at"
+MAX_PAGE_LIMIT = 1000
+
+# Ordered views kept per (scope, sort) pair
+ORDERED_VIEW_CACHE_SIZE = 64
+
+_views = OrderedDict()
+_views_lock = threading.Lock()
+
+
+def _sort_key(record, sort):
+    """Get the position of a record in a view: its sort value, then its ID."""
+    value = record.get(sort)
+    if not isinstance(value, str):
+        value = ""
+    if sort == "title":
+        value = value.casefold()
+    return (value, str(record.get("id", "")))
+
+
+class OrderedView:
+    """An immutable list of records ordered by one sort field."""
+
+    def __init__(self, records, sort):
+        self.sort = sort
+        self.descending = SORT_FIELDS[sort]
+        ordered = sorted(records, key=lambda record: _sort_key(record, sort))
+        self._keys = [_sort_key(record, sort) for record in ordered]
+        self._records = ordered
+
+    def __len__(self):
+        return len(self._records)
+
+    def page(self, after=None, limit=None):
+        """Get the records following a position, in sort order.
+
+        Args:
+            after: Sort key of the last record of the previous page, or None
+            limit: Maximum number of records, or None for all of them
+
+        Returns:
+            tuple: The records, and the sort key to continue after (or None
+                if this is the last page)
+        """
+        if self.descending:
+            end = len(self._keys) if after is None else bisect_left(self._keys, after)
+            start = 0 if limit is None else max(0, end - limit)
+            records = self._records[start:end][::-1]
+            has_more = start > 0
+        else:
+            start = 0 if after is None else bisect_right(self._keys, after)
+            end = len(self._keys) if limit is None else start + limit
+            records = self._records[start:end]
+            has_more = end < len(self._keys)
+
+        next_after = _sort_key(records[-1], self.sort) if records and has_more else None
+        return records, next_after
+
+
+def get_ordered_view(scope, sort, version, load_records):
+    """Get the ordered view of a listing, rebuilding it if its source changed.
+
+    Args:
+        scope: Hashable name of the listing, e.g. ('catalog', 'story')
+        sort: Sort field
+        version: Hashable token that changes whenever the listing changes
+        load_records: Function returning the full list of records
+
+    Returns:
+        OrderedView: The view of the current records
+    """
+    cache_key = (scope, sort)
+    with _views_lock:
+        cached = _views.get(cache_key)
+        if cached is not None and cached[0] == version:
+            _views.move_to_end(cache_key)
+            return cached[1]
+
+    view = OrderedView(load_records(), sort)
+
+    with _views_lock:
+        _views[cache_key] = (version, view)
+        _views.move_to_end(cache_key)
+        while len(_views) > ORDERED_VIEW_CACHE_SIZE:
+            _views.popitem(last=False)
+
+    return view
+
+
+def encode_cursor(sort, after):
+    """Encode a position in a sorted listing as an opaque cursor string."""
+    payload = json.dumps([sort, *after], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """Decode a cursor created by `encode_cursor` for the same sort field.
+
+    Raises:
+        APIError: If the cursor is malformed or belongs to another sort order
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        cursor_sort, value, object_id = payload
+    except (ValueError, TypeError, binascii.Error, UnicodeEncodeError):
+        raise APIError("Invalid cursor", status_code=400)
+
+    if cursor_sort != sort or not isinstance(value, str):
+        raise APIError(
+            "Cursor does not match the requested sort order",
+            status_code=400,
+            details={"sort": sort},
+        )
+    return (value, str(object_id))
+
+
+def parse_pagination_args(args):
+    """Parse and validate the sort, limit and cursor query parameters.
+
+    Returns:
+        tuple: (sort, limit or None, position to continue after or None)
+
+    Raises:
+        APIError: If any of the parameters is invalid
+    """
+    sort = args.get("sort", DEFAULT_SORT)
+    if sort not in SORT_FIELDS:
+        raise APIError(
+            "Invalid sort field",
+            status_code=400,
+            details={"sort": sort, "allowed": list(SORT_FIELDS)},
+        )
+
+    limit = args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_PAGE_LIMIT:
+            raise APIError(
+                f"limit must be an integer between 1 and {MAX_PAGE_LIMIT}",
+                status_code=400,
+            )
+
+    cursor = args.get("cursor")
+    after = decode_cursor(cursor, sort) if cursor else None
+
+    return sort, limit, after
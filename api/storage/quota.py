@@ -2,39 +2,64 @@ import logging
 import traceback
 
 from error_handlers import APIError
-from storage.client import handle_minio_error
+from storage.client import handle_minio_error, iter_minio_objects
+from storage.utils import get_plural_type
 
 logger = logging.getLogger(__name__)
 
 
 @handle_minio_error("count_user_objects")
-def count_user_sessions(user_id):
-    """Count the number of sessions owned by a specific user.
+def count_user_objects(user_id):
+    """Count a user's sessions and stories from one key-only listing.
+
+    No metadata is downloaded: an object is counted when its directory holds
+    a metadata.json, which is how listings decide that an object exists.
 
     Args:
-        user_id (str): The user ID to count sessions for
+        user_id (str): The user ID to count objects for
 
     Returns:
-        int: Number of sessions owned by the user
+        dict: Number of objects keyed by data type ('session' and 'story')
     """
-    try:
-        # Import here to avoid circular import
-        from storage.objects import list_objects_by_type
+    counts = {"session": 0, "story": 0}
+    data_types = {get_plural_type(data_type): data_type for data_type in counts}
 
-        # Count all sessions for this user (they're all private now)
-        sessions = list_objects_by_type("session", user_id=user_id)
+    for obj in iter_minio_objects(f"{user_id}/"):
+        parts = obj["key"].split("/")
+        # {user_id}/{type}s/{object_id}/metadata.json
+        if len(parts) == 4 and parts[3] == "metadata.json" and parts[1] in data_types:
+            counts[data_types[parts[1]]] += 1
 
-        total_count = len(sessions)
-        logger.info(f"User {user_id} has {total_count} sessions")
-        return total_count
+    logger.info(
+        f"User {user_id} has {counts['session']} sessions and {counts['story']} stories"
+    )
+    return counts
 
+
+def _count_user_objects_of_type(user_id, data_type):
+    """Count a user's objects of one type, or 0 if they cannot be counted."""
+    try:
+        return count_user_objects(user_id)[data_type]
     except Exception as e:
-        logger.error(f"Error counting sessions for user {user_id}: {str(e)}")
+        logger.error(f"Error counting {data_type} objects for user {user_id}: {str(e)}")
         logger.error(f"Stack trace: {traceback.format_exc()}")
         # Return 0 on error to allow operations to continue, but log the issue
         return 0
 
 
+@handle_minio_error("count_user_objects")
+def count_user_sessions(user_id):
+    """Count the number of sessions owned by a specific user.
+
+    Args:
+        user_id (str): The user ID to count sessions for
+
+    Returns:
+        int: Number of sessions owned by the user
+    """
+    return _count_user_objects_of_type(user_id, "session")
+
+
 @handle_minio_error("count_user_objects")
 def count_user_stories(user_id):
     """Count the number of stories owned by a specific user.
@@ -45,22 +70,7 @@ def count_user_stories(user_id):
     Returns:
         int: Number of stories owned by the user
     """
-    try:
-        # Import here to avoid circular import
-        from storage.objects import list_objects_by_type
-
-        # Count all stories for this user (they're all public now)
-        stories = list_objects_by_type("story", user_id=user_id)
-
-        total_count = len(stories)
-        logger.info(f"User {user_id} has {total_count} stories")
-        return total_count
-
-    except Exception as e:
-        logger.error(f"Error counting stories for user {user_id}: {str(e)}")
-        logger.error(f"Stack trace: {traceback.format_exc()}")
-        # Return 0 on error to allow operations to continue, but log the issue
-        return 0
+    return _count_user_objects_of_type(user_id, "story")
 
 
 def check_user_session_limit(user_id, max_sessions):
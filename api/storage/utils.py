@@ -1,5 +1,24 @@
+import io
+import json
 import os
 
+import msgpack
+
+from schemas import _is_zlib_header, validate_json_stream
+
+# S3 user metadata recording whether a stored .mvsj wraps the story in a
+# top-level "data" key, so reads can serve the bytes without parsing them
+MVSJ_WRAPPED_METADATA = "mvsj-wrapped"
+
+# Store uploaded .mvsj files as compact JSON instead of the uploaded bytes
+MVSJ_COMPACT_UPLOADS = os.getenv("MVSJ_COMPACT_UPLOADS", "false").lower() == "true"
+
+# A precompressed copy of a stored .mvsj is kept under the same key with this
+# suffix. The S3 user metadata of the .mvsj records the copy's ETag, so a copy
+# that is missing or belongs to another version of the story is never served.
+GZIP_VARIANT_SUFFIX = ".gz"
+GZIP_VARIANT_ETAG_METADATA = "gzip-variant-etag"
+
 
 def get_plural_type(data_type):
     """Convert data type to proper plural form."""
@@ -55,6 +74,118 @@ def get_content_type(data_type):
         return "application/x-deflate"
 
 
+def encode_mvsj(story_data):
+    """Encode story data as .mvsj bytes.
+
+    Parsed story data is encoded as compact JSON. Uploaded bytes or a
+    seekable stream are only validated and kept as they are, unless
+    MVSJ_COMPACT_UPLOADS is set, in which case they are parsed and compacted.
+
+    Returns:
+        tuple: The bytes or stream to store, and the S3 user metadata to
+        store with them
+
+    Raises:
+        ValueError: If uploaded data is not valid JSON
+    """
+    if isinstance(story_data, bytes) or hasattr(story_data, "read"):
+        stream = io.BytesIO(story_data) if isinstance(story_data, bytes) else story_data
+        top_level_keys = validate_json_stream(stream)
+        if not MVSJ_COMPACT_UPLOADS:
+            wrapped = "data" in top_level_keys
+            return story_data, {MVSJ_WRAPPED_METADATA: "true" if wrapped else "false"}
+        story_data = json.load(stream)
+        stream.seek(0)
+
+    data_bytes = json.dumps(story_data, separators=(",", ":")).encode("utf-8")
+    wrapped = isinstance(story_data, dict) and "data" in story_data
+    return data_bytes, {MVSJ_WRAPPED_METADATA: "true" if wrapped else "false"}
+
+
+def is_wrapped_mvsj(stat):
+    """Check from its stat whether a stored .mvsj needs its "data" key unwrapped.
+
+    Returns:
+        bool or None: None if the object was stored without the marker
+    """
+    value = (stat.metadata or {}).get(f"x-amz-meta-{MVSJ_WRAPPED_METADATA}")
+    if value is None:
+        return None
+    return value == "true"
+
+
+# S3 user metadata recording how a stored session blob is encoded, so reads
+# can dispatch on it instead of trying to unpack the blob in every format
+SESSION_ENCODING_METADATA = "session-encoding"
+SESSION_ENCODING_DEFLATE = "deflate"  # compressed msgpack, sent to clients as is
+SESSION_ENCODING_MSGPACK = "msgpack"  # raw msgpack
+SESSION_ENCODING_LEGACY_WRAPPER = "legacy-wrapper"  # msgpack map with a "data" key
+SESSION_ENCODINGS = (
+    SESSION_ENCODING_DEFLATE,
+    SESSION_ENCODING_MSGPACK,
+    SESSION_ENCODING_LEGACY_WRAPPER,
+)
+
+
+def detect_session_encoding(data):
+    """Detect the encoding of a session blob.
+
+    zlib streams are recognized from their two header bytes. Anything else
+    is scanned once with a streaming msgpack unpacker that skips over values
+    instead of building them: a blob that is exactly one msgpack value is
+    raw msgpack (or the legacy wrapper, if it is a map with a "data" key),
+    anything else is treated as compressed.
+
+    Args:
+        data: Bytes or a seekable binary stream, which is rewound afterwards
+
+    Returns:
+        str: One of SESSION_ENCODINGS
+    """
+    stream = io.BytesIO(data) if isinstance(data, bytes) else data
+    try:
+        head = stream.read(2)
+        stream.seek(0)
+        if _is_zlib_header(head):
+            return SESSION_ENCODING_DEFLATE
+
+        unpacker = msgpack.Unpacker(stream, raw=False)
+        has_data_key = False
+        if head and (0x80 <= head[0] <= 0x8F or head[0] in (0xDE, 0xDF)):
+            for _ in range(unpacker.read_map_header()):
+                if unpacker.unpack() == "data":
+                    has_data_key = True
+                unpacker.skip()
+        else:
+            unpacker.skip()
+
+        # Exactly one value: anything after it means this is not msgpack
+        try:
+            unpacker.skip()
+            return SESSION_ENCODING_DEFLATE
+        except msgpack.OutOfData:
+            pass
+    except (msgpack.UnpackException, ValueError, TypeError):
+        return SESSION_ENCODING_DEFLATE
+    finally:
+        stream.seek(0)
+
+    if has_data_key:
+        return SESSION_ENCODING_LEGACY_WRAPPER
+    return SESSION_ENCODING_MSGPACK
+
+
+def get_session_encoding(stat):
+    """Get the encoding recorded for a stored session blob, or None if unknown."""
+    encoding = (stat.metadata or {}).get(f"x-amz-meta-{SESSION_ENCODING_METADATA}")
+    return encoding if encoding in SESSION_ENCODINGS else None
+
+
+def get_gzip_variant_etag(stat):
+    """Get the ETag of a stored object's gzip variant from its stat, if it has one."""
+    return (stat.metadata or {}).get(f"x-amz-meta-{GZIP_VARIANT_ETAG_METADATA}")
+
+
 def extract_unique_object_directories(objects, path_type):
     """Extract unique object directories from a list of objects."""
     object_dirs = set()
@@ -98,16 +229,13 @@ def is_object_public(object_id, object_type):
             return False, None
         elif object_type == "story":
             # Import here to avoid circular imports since we're in the storage module
-            from .objects import list_objects_by_type
-
-            # Get all story objects (they're all public now)
-            public_objects = list_objects_by_type(object_type)
+            from .objects import find_object_by_id
 
-            # Find the object with matching ID
-            for obj in public_objects:
-                if obj.get("id") == object_id:
-                    logger.debug(f"Found public {object_type}: {object_id}")
-                    return True, obj
+            # Stories are all public, so any story found by ID is public
+            obj = find_object_by_id(object_id, object_type)
+            if obj:
+                logger.debug(f"Found public {object_type}: {object_id}")
+                return True, obj
 
             return False, None
         else:
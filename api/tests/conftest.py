@@ -122,3 +122,30 @@ def sample_session_data():
         "state": {"camera": {"position": [0, 0, 10]}, "structures": []},
         "metadata": {"version": "1.0", "created_at": "2024-01-01T00:00:00Z"},
     }
+
+
+@pytest.fixture(autouse=True)
+def clear_storage_caches():
+    """Start every test with empty in-process storage caches."""
+    from storage import client, pagination
+    from storage.cache import metadata_cache
+
+    metadata_cache.clear()
+    pagination._views.clear()
+    client.reset_bucket_check()
+    yield
+    metadata_cache.clear()
+    pagination._views.clear()
+    client.reset_bucket_check()
+
+
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    """Start every test with empty userinfo and signing key caches."""
+    from auth import jwks_cache, userinfo_cache
+
+    userinfo_cache.clear()
+    jwks_cache.clear()
+    yield
+    userinfo_cache.clear()
+    jwks_cache.clear()
@@ -5,8 +5,11 @@ them fast, deterministic and CI-friendly (no external MinIO or OIDC calls).
 """
 
 import base64
+import gzip
 import io
 import json
+import zipfile
+from datetime import datetime, timezone
 from unittest.mock import Mock, patch
 
 import msgpack
@@ -74,6 +77,21 @@ def test_get_session_authenticated_owner(mock_auth, mock_find, client):
     assert resp.get_json()["id"] == "sess-1"
 
 
+@patch("routes.admin_routes.authenticate_token")
+def test_verify_uses_configured_token_validation(
+    mock_authenticate, client, mock_userinfo
+):
+    mock_authenticate.return_value = mock_userinfo
+
+    resp = client.get("/verify", headers={"Authorization": "Bearer a.b.c"})
+    assert resp.status_code == 200
+    assert resp.get_json() == {"authenticated": True, "user": mock_userinfo}
+
+    resp = client.get("/api/userinfo", headers={"Authorization": "Bearer a.b.c"})
+    assert resp.get_json() == mock_userinfo
+    assert mock_authenticate.call_count == 2
+
+
 def test_create_story_legacy_return_data_no_longer_supported(client):
     """Test that the ?return_data parameter with JSON is no longer supported"""
     payload = {
@@ -89,22 +107,126 @@ def test_create_story_legacy_return_data_no_longer_supported(client):
     assert "Legacy JSON format is no longer supported" in body["message"]
 
 
-@patch("routes.story_routes.minio_client")
-@patch("routes.story_routes.list_objects_by_type")
-def test_get_story_data_mvsj(mock_list, mock_minio, client):
+@patch("storage.client.minio_client")
+@patch("routes.story_routes.lookup_object")
+def test_get_story_data_mvsj(mock_lookup, mock_minio, client):
     # Story exists and belongs to user-123
-    mock_list.return_value = [
-        {"id": "story-1", "creator": {"id": "user-123"}, "filename": "s.mvsj"}
-    ]
+    mock_lookup.return_value = {
+        "id": "story-1",
+        "type": "story",
+        "creator_id": "user-123",
+        "data_extension": ".mvsj",
+        "metadata": {
+            "id": "story-1",
+            "creator": {"id": "user-123"},
+            "filename": "s.mvsj",
+        },
+    }
 
     # Mock MinIO get_object to return MVSJ JSON with a top-level "data" key
+    # Stored without the wrapper marker, so the data must be parsed to unwrap it
+    mock_minio.stat_object.return_value = Mock(
+        size=28,
+        etag="abc",
+        last_modified=datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        metadata={},
+    )
     mock_resp = Mock()
-    mock_resp.read.return_value = b'{"data": {"hello": "world"}}'
+    mock_resp.stream.return_value = iter([b'{"data": {"hel', b'lo": "world"}}'])
     mock_minio.get_object.return_value = mock_resp
 
     resp = client.get("/api/story/story-1/data?format=mvsj")
     assert resp.status_code == 200
     assert resp.get_json() == {"hello": "world"}
+    assert resp.headers["ETag"] == '"abc"'
+
+
+@patch("storage.client.minio_client")
+@patch("routes.story_routes.lookup_object")
+def test_get_story_data_mvsj_served_verbatim(mock_lookup, mock_minio, client):
+    mock_lookup.return_value = {
+        "id": "story-1",
+        "type": "story",
+        "creator_id": "user-123",
+        "data_extension": ".mvsj",
+        "metadata": {"id": "story-1", "creator": {"id": "user-123"}},
+    }
+    stored = b'{"kind":"multiple","snapshots":[]}'
+    mock_minio.stat_object.return_value = Mock(
+        size=len(stored),
+        etag="abc",
+        last_modified=datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        metadata={"x-amz-meta-mvsj-wrapped": "false"},
+    )
+    mock_resp = Mock()
+    mock_resp.stream.return_value = iter([stored])
+    mock_minio.get_object.return_value = mock_resp
+
+    with patch("routes.story_routes.json.loads") as mock_loads:
+        resp = client.get("/api/story/story-1/data")
+        assert resp.status_code == 200
+        assert resp.data == stored
+        assert resp.mimetype == "application/json"
+        mock_loads.assert_not_called()
+
+
+@patch("storage.client.minio_client")
+@patch("routes.story_routes.lookup_object")
+def test_get_story_data_mvsj_gzip_variant(mock_lookup, mock_minio, client):
+    mock_lookup.return_value = {
+        "id": "story-1",
+        "type": "story",
+        "creator_id": "user-123",
+        "data_extension": ".mvsj",
+        "metadata": {"id": "story-1", "creator": {"id": "user-123"}},
+    }
+    modified = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    plain = b'{"kind":"single"}'
+    compressed = gzip.compress(plain)
+    stats = {
+        "user-123/stories/story-1/data.mvsj": Mock(
+            size=len(plain),
+            etag="plain",
+            last_modified=modified,
+            metadata={
+                "x-amz-meta-mvsj-wrapped": "false",
+                "x-amz-meta-gzip-variant-etag": "gz",
+            },
+        ),
+        "user-123/stories/story-1/data.mvsj.gz": Mock(
+            size=len(compressed), etag="gz", last_modified=modified, metadata={}
+        ),
+    }
+    bodies = {
+        "user-123/stories/story-1/data.mvsj": plain,
+        "user-123/stories/story-1/data.mvsj.gz": compressed,
+    }
+    mock_minio.stat_object.side_effect = lambda bucket, key: stats[key]
+
+    def get_object(bucket, key, **kwargs):
+        response = Mock()
+        response.stream.return_value = iter([bodies[key]])
+        return response
+
+    mock_minio.get_object.side_effect = get_object
+
+    resp = client.get("/api/story/story-1/data", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert resp.headers["ETag"] == '"gz"'
+    assert gzip.decompress(resp.data) == plain
+
+    resp = client.get("/api/story/story-1/data", headers={"Accept-Encoding": "br"})
+    assert resp.status_code == 200
+    assert "Content-Encoding" not in resp.headers
+    assert resp.data == plain
+
+    # A variant left over from another version of the story is not served
+    stats["user-123/stories/story-1/data.mvsj.gz"].etag = "stale"
+    resp = client.get("/api/story/story-1/data", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+    assert resp.data == plain
 
 
 @patch("routes.story_routes.save_story_with_session")
@@ -179,9 +301,11 @@ def test_create_story_formdata_mvsx_with_session(
     }
     mock_save.return_value = mock_md.return_value
 
-    # Create test binary data (.mvsx - simulated ZIP)
-    binary_data = b"PK\x03\x04fake_zip_data"
-    story_blob = io.BytesIO(binary_data)
+    # Create test binary data (.mvsx - ZIP with index.mvsj)
+    story_blob = io.BytesIO()
+    with zipfile.ZipFile(story_blob, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("index.mvsj", '{"kind": "single"}')
+    story_blob.seek(0)
 
     # Create test session data
     session_data = msgpack.packb({"version": 1, "story": {"scenes": []}})
@@ -203,6 +327,32 @@ def test_create_story_formdata_mvsx_with_session(
     assert "public_uri" in body
 
 
+@patch("routes.story_routes.save_story_with_session")
+@patch("routes.story_routes.check_user_story_limit")
+@patch("routes.story_routes.get_user_from_request")
+def test_create_story_formdata_mvsx_without_index_rejected(
+    mock_auth, mock_limit, mock_save, client
+):
+    mock_auth.return_value = ({"sub": "user-123"}, "user-123")
+    mock_limit.return_value = True
+
+    story_blob = io.BytesIO()
+    with zipfile.ZipFile(story_blob, "w") as zf:
+        zf.writestr("other.mvsj", "{}")
+    story_blob.seek(0)
+
+    form_data = {
+        "title": "No index",
+        "mvsx": (story_blob, "story.mvsx"),
+        "session": (io.BytesIO(msgpack.packb({})), "session.mvstory"),
+    }
+
+    resp = client.post("/api/story", data=form_data)
+    assert resp.status_code == 400
+    assert "index.mvsj" in resp.get_json()["message"]
+    mock_save.assert_not_called()
+
+
 def test_create_story_json_no_longer_supported(client):
     """Test that legacy JSON story creation is no longer supported"""
     payload = {
@@ -266,22 +416,163 @@ def test_get_story_session_data_endpoint_exists(mock_get_story, client):
     assert "not found" in body["message"].lower()
 
 
-@patch("routes.session_routes.count_user_sessions")
-@patch("routes.session_routes.count_user_stories")
+def _mock_stored_mvsx(mock_lookup, mock_minio, body):
+    """Set up a public .mvsx story whose data object holds the given bytes."""
+    mock_lookup.return_value = {
+        "id": "story-1",
+        "type": "story",
+        "creator_id": "user-123",
+        "data_extension": ".mvsx",
+        "metadata": {
+            "id": "story-1",
+            "creator": {"id": "user-123"},
+            "filename": "s.mvsx",
+        },
+    }
+    mock_minio.stat_object.return_value = Mock(
+        size=len(body),
+        etag="abc",
+        last_modified=datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    )
+
+    def get_object(bucket, key, offset=0, length=0, request_headers=None):
+        end = offset + length if length else len(body)
+        response = Mock()
+        response.stream.return_value = iter([body[offset:end]])
+        return response
+
+    mock_minio.get_object.side_effect = get_object
+
+
+@patch("storage.client.minio_client")
+@patch("routes.story_routes.lookup_object")
+def test_get_story_data_mvsx_is_streamed(mock_lookup, mock_minio, client):
+    _mock_stored_mvsx(mock_lookup, mock_minio, b"PK\x03\x04zz")
+    mock_resp = Mock()
+    mock_resp.stream.return_value = iter([b"PK", b"\x03\x04", b"zz"])
+    mock_minio.get_object.side_effect = None
+    mock_minio.get_object.return_value = mock_resp
+
+    resp = client.get("/api/story/story-1/data")
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.headers["Content-Length"] == "6"
+    assert resp.headers["Content-Type"] == "application/zip"
+    assert resp.headers["ETag"] == '"abc"'
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert "s.mvsx" in resp.headers["Content-Disposition"]
+    assert resp.data == b"PK\x03\x04zz"
+    resp.close()
+
+    mock_minio.get_object.assert_called_once_with(
+        "root",
+        "user-123/stories/story-1/data.mvsx",
+        offset=0,
+        length=0,
+        request_headers={"If-Match": '"abc"'},
+    )
+    mock_resp.release_conn.assert_called_once()
+
+
+@patch("storage.client.minio_client")
+@patch("routes.story_routes.lookup_object")
+def test_get_story_data_conditional_request(mock_lookup, mock_minio, client):
+    _mock_stored_mvsx(mock_lookup, mock_minio, b"PK\x03\x04zz")
+
+    resp = client.get("/api/story/story-1/data", headers={"If-None-Match": '"abc"'})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == '"abc"'
+    mock_minio.get_object.assert_not_called()
+
+    resp = client.get(
+        "/api/story/story-1/data",
+        headers={"If-Modified-Since": "Thu, 02 Jan 2025 03:04:05 GMT"},
+    )
+    assert resp.status_code == 304
+
+    resp = client.get("/api/story/story-1/data", headers={"If-None-Match": '"old"'})
+    assert resp.status_code == 200
+    assert resp.data == b"PK\x03\x04zz"
+
+
+@patch("storage.client.minio_client")
+@patch("routes.story_routes.lookup_object")
+def test_get_story_data_range_request(mock_lookup, mock_minio, client):
+    _mock_stored_mvsx(mock_lookup, mock_minio, b"0123456789")
+
+    resp = client.get("/api/story/story-1/data", headers={"Range": "bytes=2-5"})
+    assert resp.status_code == 206
+    assert resp.data == b"2345"
+    assert resp.headers["Content-Length"] == "4"
+    assert resp.headers["Content-Range"] == "bytes 2-5/10"
+    assert mock_minio.get_object.call_args.kwargs["offset"] == 2
+    assert mock_minio.get_object.call_args.kwargs["length"] == 4
+
+    # A stale If-Range gets the full object instead of a range of another version
+    resp = client.get(
+        "/api/story/story-1/data",
+        headers={"Range": "bytes=2-5", "If-Range": '"old"'},
+    )
+    assert resp.status_code == 200
+    assert resp.data == b"0123456789"
+
+    resp = client.get("/api/story/story-1/data", headers={"Range": "bytes=20-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == "bytes */10"
+
+
+@patch("storage.client.minio_client")
+@patch("routes.story_routes.lookup_object")
+def test_get_story_data_replaced_while_read(mock_lookup, mock_minio, client):
+    from minio.error import S3Error
+
+    _mock_stored_mvsx(mock_lookup, mock_minio, b"PK\x03\x04zz")
+    read_new_version = mock_minio.get_object.side_effect
+    changed = S3Error(
+        code="PreconditionFailed",
+        message="changed",
+        resource="r",
+        request_id="i",
+        host_id="h",
+        response=None,
+    )
+
+    attempts = []
+
+    def get_object(*args, **kwargs):
+        attempts.append(args)
+        if len(attempts) == 1:
+            raise changed
+        return read_new_version(*args, **kwargs)
+
+    # The object is replaced between stat and GET: it is read again once
+    mock_minio.get_object.side_effect = get_object
+    resp = client.get("/api/story/story-1/data")
+    assert resp.status_code == 200
+    assert resp.data == b"PK\x03\x04zz"
+    assert mock_minio.stat_object.call_count == 2
+
+    # An object that keeps changing is reported as such, not as missing
+    mock_minio.get_object.side_effect = changed
+    resp = client.get("/api/story/story-1/data")
+    assert resp.status_code == 503
+
+
+@patch("routes.session_routes.count_user_objects")
 @patch("routes.session_routes.get_user_from_request")
-def test_get_user_quota(mock_auth, mock_count_stories, mock_count_sessions, client):
+def test_get_user_quota(mock_auth, mock_count_objects, client):
     mock_auth.return_value = (
         {"sub": "user-123", "name": "T", "email": "e"},
         "user-123",
     )
-    mock_count_sessions.return_value = 2
-    mock_count_stories.return_value = 3
+    mock_count_objects.return_value = {"session": 2, "story": 3}
 
     resp = client.get("/api/user/quota")
     assert resp.status_code == 200
     data = resp.get_json()
     assert data["sessions"]["current"] == 2
     assert data["stories"]["current"] == 3
+    mock_count_objects.assert_called_once_with("user-123")
 
 
 # =============================================================================
@@ -313,7 +604,14 @@ def test_create_session_formdata_success(
         "created_at": "2024-01-01T00:00:00Z",
         "updated_at": "2024-01-01T00:00:00Z",
     }
-    mock_save.return_value = mock_md.return_value
+    saved_bytes = []
+
+    def save(data_type, storage_data, metadata):
+        # The upload is only readable while the request is open
+        saved_bytes.append(storage_data["data"].read())
+        return mock_md.return_value
+
+    mock_save.side_effect = save
 
     # Create test binary data (msgpack + deflate simulation)
     test_data = msgpack.packb({"version": 1, "story": {"scenes": []}})
@@ -336,13 +634,11 @@ def test_create_session_formdata_success(
     assert body["creator"]["id"] == "user-123"
     assert body["title"] == "Test Session FormData"
 
-    # Verify save_object was called with binary data (not base64)
+    # Verify save_object was called with the spooled binary upload (not base64)
     mock_save.assert_called_once()
     args, kwargs = mock_save.call_args
     assert args[0] == "session"
-    storage_data = args[1]
-    assert isinstance(storage_data["data"], bytes)
-    assert storage_data["data"] == test_data
+    assert saved_bytes == [test_data]
 
 
 @patch("routes.session_routes.get_user_from_request")
@@ -425,7 +721,7 @@ def test_update_session_formdata_success(mock_auth, mock_update, client):
         {"sub": "user-123", "name": "Test User", "email": "test@example.com"},
         "user-123",
     )
-    mock_update.return_value = {
+    updated = {
         "id": "sess-1",
         "type": "session",
         "creator": {"id": "user-123"},
@@ -433,6 +729,14 @@ def test_update_session_formdata_success(mock_auth, mock_update, client):
         "description": "Updated via FormData",
         "updated_at": "2024-01-01T01:00:00Z",
     }
+    updated_bytes = []
+
+    def update(session_id, user_id, update_data):
+        # The upload is only readable while the request is open
+        updated_bytes.append(update_data["data"].read())
+        return updated
+
+    mock_update.side_effect = update
 
     test_data = msgpack.packb({"version": 1, "story": {"scenes": [{"id": 1}]}})
 
@@ -450,17 +754,17 @@ def test_update_session_formdata_success(mock_auth, mock_update, client):
     body = resp.get_json()
     assert body["title"] == "Updated Session"
 
-    # Verify update_session_by_id was called with binary data
+    # Verify update_session_by_id was called with the spooled binary upload
     mock_update.assert_called_once()
     args, kwargs = mock_update.call_args
     assert args[0] == "sess-1"  # session_id
     assert args[1] == "user-123"  # user_id
     update_data = args[2]
-    assert isinstance(update_data["data"], bytes)
+    assert updated_bytes == [test_data]
     assert update_data["title"] == "Updated Session"
 
 
-@patch("routes.session_routes.minio_client")
+@patch("storage.client.minio_client")
 @patch("routes.session_routes.find_object_by_id")
 @patch("routes.session_routes.get_user_from_request")
 def test_get_session_data_new_format(mock_auth, mock_find, mock_minio, client):
@@ -483,8 +787,10 @@ def test_get_session_data_new_format(mock_auth, mock_find, mock_minio, client):
         test_session_data, level=3
     )  # This will cause ExtraData when trying to unpack as msgpack
 
+    # Stored before encodings were recorded, so the format is sniffed
+    mock_minio.stat_object.return_value = Mock(etag="abc", metadata={})
     mock_response = Mock()
-    mock_response.read.return_value = deflated_data
+    mock_response.stream.return_value = iter([deflated_data])
     mock_minio.get_object.return_value = mock_response
 
     resp = client.get("/api/session/sess-1/data")
@@ -495,7 +801,7 @@ def test_get_session_data_new_format(mock_auth, mock_find, mock_minio, client):
     assert resp.get_json() == expected_base64
 
 
-@patch("routes.session_routes.minio_client")
+@patch("storage.client.minio_client")
 @patch("routes.session_routes.find_object_by_id")
 @patch("routes.session_routes.get_user_from_request")
 def test_get_session_data_legacy_format(mock_auth, mock_find, mock_minio, client):
@@ -520,8 +826,10 @@ def test_get_session_data_legacy_format(mock_auth, mock_find, mock_minio, client
     }
     legacy_binary = msgpack.packb(legacy_wrapper)
 
+    # Stored before encodings were recorded, so the format is sniffed
+    mock_minio.stat_object.return_value = Mock(etag="abc", metadata={})
     mock_response = Mock()
-    mock_response.read.return_value = legacy_binary
+    mock_response.stream.return_value = iter([legacy_binary])
     mock_minio.get_object.return_value = mock_response
 
     resp = client.get("/api/session/sess-1/data")
@@ -532,6 +840,30 @@ def test_get_session_data_legacy_format(mock_auth, mock_find, mock_minio, client
     assert resp.get_json() == expected_base64
 
 
+@patch("routes.session_routes.detect_session_encoding")
+@patch("storage.client.minio_client")
+@patch("routes.session_routes.find_object_by_id")
+@patch("routes.session_routes.get_user_from_request")
+def test_get_session_data_uses_stored_encoding(
+    mock_auth, mock_find, mock_minio, mock_detect, client
+):
+    mock_auth.return_value = ({"sub": "user-123"}, "user-123")
+    mock_find.return_value = {"id": "sess-1", "creator": {"id": "user-123"}}
+
+    stored = msgpack.packb({"version": 1, "blob": b"\x01"})
+    mock_minio.stat_object.return_value = Mock(
+        etag="abc", metadata={"x-amz-meta-session-encoding": "msgpack"}
+    )
+    mock_response = Mock()
+    mock_response.stream.return_value = iter([stored])
+    mock_minio.get_object.return_value = mock_response
+
+    resp = client.get("/api/session/sess-1/data")
+    assert resp.status_code == 200
+    assert resp.get_json() == {"version": 1, "blob": "AQ=="}
+    mock_detect.assert_not_called()
+
+
 @patch("routes.session_routes.update_session_by_id")
 @patch("routes.session_routes.get_user_from_request")
 def test_update_session_formdata_partial_update(mock_auth, mock_update, client):
@@ -567,3 +899,62 @@ def test_update_session_formdata_partial_update(mock_auth, mock_update, client):
     update_data = args[2]
     assert "data" not in update_data  # No file upload means no data update
     assert update_data["title"] == "Updated Title Only"
+
+
+@patch("storage.objects.list_catalog_stories")
+@patch("storage.objects.get_catalog_version")
+@patch("storage.client.MINIO_ENABLED", True)
+def test_list_stories_paginates_with_cursor(mock_version, mock_list, client):
+    mock_version.return_value = ("v1",)
+    mock_list.return_value = [
+        {"id": f"s{i}", "title": f"Story {i}", "updated_at": f"2024-01-0{i}"}
+        for i in range(1, 6)
+    ]
+
+    resp = client.get("/api/story?limit=2")
+    assert resp.status_code == 200
+    assert [s["id"] for s in resp.get_json()] == ["s5", "s4"]
+    assert resp.get_json()[0]["public_uri"].endswith("/api/story/s5")
+    cursor = resp.headers["X-Next-Cursor"]
+
+    resp = client.get(f"/api/story?limit=2&cursor={cursor}")
+    assert [s["id"] for s in resp.get_json()] == ["s3", "s2"]
+
+    resp = client.get("/api/story?sort=title&limit=10")
+    assert [s["id"] for s in resp.get_json()] == ["s1", "s2", "s3", "s4", "s5"]
+    assert "X-Next-Cursor" not in resp.headers
+    # The ordered view is built once per catalog version
+    assert mock_list.call_count == 2
+
+
+def test_list_stories_rejects_invalid_pagination(client):
+    assert client.get("/api/story?sort=size").status_code == 400
+    assert client.get("/api/story?limit=0").status_code == 400
+    assert client.get("/api/story?cursor=not-a-cursor").status_code == 400
+
+
+@patch("routes.session_routes.read_job")
+@patch("routes.session_routes.submit_job")
+@patch("routes.session_routes.get_user_from_request")
+def test_delete_all_user_data_async_job(mock_auth, mock_submit, mock_read, client):
+    mock_auth.return_value = ({"sub": "user-123"}, "user-123")
+    mock_submit.return_value = {"job_id": "abc123", "status": "pending"}
+
+    resp = client.delete("/api/user/delete-all?async=true")
+    assert resp.status_code == 202
+    assert resp.get_json()["status_uri"] == "/api/user/delete-all/abc123"
+    assert mock_submit.call_args.args[0] == "delete_all_user_data"
+    assert mock_submit.call_args.args[1] == "user-123"
+
+    mock_read.return_value = {
+        "job_id": "abc123",
+        "type": "delete_all_user_data",
+        "user_id": "user-123",
+        "status": "completed",
+    }
+    resp = client.get("/api/user/delete-all/abc123")
+    assert resp.status_code == 200
+    assert resp.get_json()["status"] == "completed"
+
+    mock_read.return_value = dict(mock_read.return_value, user_id="someone-else")
+    assert client.get("/api/user/delete-all/abc123").status_code == 404
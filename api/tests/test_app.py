@@ -10,8 +10,48 @@ def test_health_check(client):
     assert response.get_json()["status"] == "healthy"
 
 
+def test_health_check_pings_storage_backend(client):
+    from unittest.mock import Mock, patch
+
+    backend = Mock()
+    backend.name = "minio"
+    backend.ping.return_value = {"buckets_count": 1, "configured_bucket": "root"}
+    with patch("storage.client.storage_backend", backend):
+        response = client.get("/health")
+    assert response.get_json()["checks"]["minio"] == {
+        "status": "healthy",
+        "backend": "minio",
+        "buckets_count": 1,
+        "configured_bucket": "root",
+    }
+
+    backend.ping.side_effect = ConnectionError("unreachable")
+    with patch("storage.client.storage_backend", backend):
+        response = client.get("/health")
+    assert response.status_code == 503
+    assert response.get_json()["checks"]["minio"]["status"] == "unhealthy"
+
+
 def test_blueprints_registered(app):
     blueprint_names: List[str] = [bp.name for bp in app.blueprints.values()]
     assert "sessions" in blueprint_names
     assert "stories" in blueprint_names
     assert "admin" in blueprint_names
+
+
+def test_stats_requires_allowed_user(client):
+    from unittest.mock import patch
+
+    # Disabled unless some users are allowed to read it
+    assert client.get("/stats").status_code == 404
+
+    with patch("app.STATS_USER_IDS", {"ops-1"}):
+        assert client.get("/stats").status_code == 401
+        with patch("app.get_user_from_request") as mock_auth:
+            mock_auth.return_value = ({"sub": "user-123"}, "user-123")
+            assert client.get("/stats").status_code == 403
+
+            mock_auth.return_value = ({"sub": "ops-1"}, "ops-1")
+            response = client.get("/stats")
+    assert response.status_code == 200
+    assert "metadata_cache" in response.get_json()
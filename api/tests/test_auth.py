@@ -0,0 +1,188 @@
+"""Auth tests for token validation against the OIDC userinfo endpoint."""
+
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from auth import (
+    OIDC_HTTP_POOL_SIZE,
+    OIDC_ISSUER,
+    authenticate_token,
+    get_http_session,
+    http_pool_stats,
+    jwks_cache,
+    make_userinfo_request,
+    userinfo_cache,
+)
+from error_handlers import APIError
+
+
+def _userinfo_response(status_code=200, userinfo=None):
+    response = Mock(status_code=status_code)
+    response.json.return_value = userinfo
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            f"{status_code} Error", response=response
+        )
+    return response
+
+
+@patch("auth.get_http_session")
+def test_userinfo_is_cached_per_token(mock_get_session, mock_userinfo):
+    session = mock_get_session.return_value
+    session.get.return_value = _userinfo_response(userinfo=mock_userinfo)
+
+    assert make_userinfo_request("token-a") == mock_userinfo
+    assert make_userinfo_request("token-a") == mock_userinfo
+    assert session.get.call_count == 1
+
+    make_userinfo_request("token-b")
+    assert session.get.call_count == 2
+
+    stats = userinfo_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+@patch("auth.get_http_session")
+def test_rejected_token_is_cached_but_outage_is_not(mock_get_session):
+    session = mock_get_session.return_value
+
+    session.get.return_value = _userinfo_response(status_code=401)
+    for _ in range(2):
+        with pytest.raises(APIError) as exc_info:
+            make_userinfo_request("bad-token")
+        assert exc_info.value.status_code == 401
+    assert session.get.call_count == 1
+    assert userinfo_cache.stats()["rejected_hits"] == 1
+
+    session.get.return_value = _userinfo_response(status_code=503)
+    for _ in range(2):
+        with pytest.raises(APIError):
+            make_userinfo_request("other-token")
+    assert session.get.call_count == 3
+
+
+def test_http_session_is_pooled_and_recreated_after_fork():
+    session = get_http_session()
+    assert get_http_session() is session
+
+    adapter = session.get_adapter("https://login.example.org/userinfo")
+    assert adapter._pool_maxsize == OIDC_HTTP_POOL_SIZE
+    assert adapter.max_retries.total >= 0
+    assert http_pool_stats() == {"pool_size": OIDC_HTTP_POOL_SIZE, "hosts": {}}
+
+    with patch("auth.os.getpid", return_value=-1):
+        assert get_http_session() is not session
+
+
+def _signing_key(kid):
+    """Create an RSA private key (PEM) and its public JWK."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update(kid=kid, use="sig")
+    return private_pem, public_jwk
+
+
+def _jwks_response(*keys):
+    response = Mock(status_code=200)
+    response.json.return_value = {"keys": list(keys)}
+    return response
+
+
+@patch("auth.AUTH_MODE", "jwt")
+@patch("auth.OIDC_AUDIENCE", "stories-api")
+@patch("auth.JwksCache._ensure_refresher")
+@patch("auth.get_http_session")
+def test_jwt_access_token_is_verified_locally(mock_get_session, mock_refresher):
+    private_pem, public_jwk = _signing_key("key-1")
+    session = mock_get_session.return_value
+    session.get.return_value = _jwks_response(public_jwk)
+
+    claims = {
+        "sub": "user-123",
+        "name": "Test User",
+        "email": "test@example.com",
+        "iss": OIDC_ISSUER,
+        "aud": "stories-api",
+        "exp": int(time.time()) + 300,
+    }
+    token = jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": "key-1"})
+
+    user_info = authenticate_token(token)
+    assert user_info["sub"] == "user-123"
+    assert user_info["name"] == "Test User"
+    assert user_info["email"] == "test@example.com"
+
+    # Keys are fetched once; no userinfo request is made
+    authenticate_token(token)
+    assert session.get.call_count == 1
+
+    expired = jwt.encode(
+        dict(claims, exp=int(time.time()) - 300),
+        private_pem,
+        algorithm="RS256",
+        headers={"kid": "key-1"},
+    )
+    with pytest.raises(APIError) as exc_info:
+        authenticate_token(expired)
+    assert exc_info.value.status_code == 401
+
+    other_pem, _ = _signing_key("key-1")
+    forged = jwt.encode(claims, other_pem, algorithm="RS256", headers={"kid": "key-1"})
+    with pytest.raises(APIError):
+        authenticate_token(forged)
+
+    # Tokens issued to other clients of the provider are rejected
+    no_audience = {name: value for name, value in claims.items() if name != "aud"}
+    for other_claims in (dict(claims, aud="other-client"), no_audience):
+        other = jwt.encode(
+            other_claims, private_pem, algorithm="RS256", headers={"kid": "key-1"}
+        )
+        with pytest.raises(APIError):
+            authenticate_token(other)
+
+
+def test_jwt_mode_requires_an_audience():
+    import os
+    import subprocess
+    import sys
+
+    import auth
+
+    env = {key: value for key, value in os.environ.items() if key != "OIDC_AUDIENCE"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import auth"],
+        cwd=os.path.dirname(auth.__file__),
+        env=dict(env, AUTH_MODE="jwt"),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode != 0
+    assert "OIDC_AUDIENCE" in result.stderr
+
+
+@patch("auth.AUTH_MODE", "jwt")
+@patch("auth.JwksCache._ensure_refresher")
+@patch("auth.get_http_session")
+def test_opaque_token_falls_back_to_userinfo(
+    mock_get_session, mock_refresher, mock_userinfo
+):
+    session = mock_get_session.return_value
+    session.get.return_value = _userinfo_response(userinfo=mock_userinfo)
+
+    assert authenticate_token("opaque-token") == mock_userinfo
+    assert session.get.call_args.args[0].endswith("/userinfo")
@@ -1,12 +1,24 @@
 """Minimal schema tests that exercise core validation paths."""
 
 import base64
+import io
+import struct
+import zipfile
+import zlib
 
 import msgpack
 import pytest
 from pydantic import ValidationError
 
-from schemas import BaseItemUpdate, SessionInput, StoryInput
+from schemas import (
+    BaseItemUpdate,
+    JsonSyntaxValidator,
+    SessionInput,
+    StoryInput,
+    validate_mvsx_stream,
+    validate_session_bytes,
+    validate_session_stream,
+)
 
 
 def _base64_msgpack(obj):
@@ -36,3 +48,74 @@ def test_story_input_valid_minimal():
 def test_base_item_update_partial():
     upd = BaseItemUpdate(description="x")
     assert upd.description == "x"
+
+
+def test_validate_session_stream_deflated_rewinds():
+    stream = io.BytesIO(zlib.compress(msgpack.packb({"k": list(range(10000))})))
+    stream.read(3)
+    stream.seek(0)
+    validate_session_stream(stream)
+    assert stream.tell() == 0
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        zlib.compress(msgpack.packb({"k": "v" * 1000}))[:-6],
+        msgpack.packb({"k": 1}) + msgpack.packb({"k": 2}),
+        msgpack.packb({"k": "v" * 1000})[:-1],
+        b"",
+    ],
+    ids=["truncated-deflate", "extra-data", "truncated-msgpack", "empty"],
+)
+def test_validate_session_bytes_rejects_invalid(data):
+    with pytest.raises(ValueError):
+        validate_session_bytes(data)
+
+
+def test_validate_session_bytes_rejects_compression_bomb():
+    bomb = zlib.compress(msgpack.packb(b"\0" * (20 * 1024 * 1024)))
+    with pytest.raises(ValueError, match="compression ratio"):
+        validate_session_bytes(bomb)
+
+
+def test_validate_mvsx_stream_rejects_compression_bomb():
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("index.mvsj", "{}")
+        zf.writestr("bomb.bin", b"\0" * (20 * 1024 * 1024))
+    with pytest.raises(ValueError, match="compression ratio"):
+        validate_mvsx_stream(stream)
+    assert stream.tell() == 0
+
+
+def test_validate_mvsx_stream_rejects_truncated_central_directory():
+    # A central directory signature with no room for the rest of the header
+    eocd = struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, 1, 1, 4, 0, 0)
+    with pytest.raises(ValueError, match="bad central directory entry"):
+        validate_mvsx_stream(io.BytesIO(b"PK\x01\x02" + eocd))
+
+
+def _validate_json_in_chunks(data, chunk_size):
+    validator = JsonSyntaxValidator()
+    for start in range(0, len(data), chunk_size):
+        validator.feed(data[start : start + chunk_size])
+    validator.finish()
+    return validator
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_json_syntax_validator_collects_top_level_keys(chunk_size):
+    data = '{"kind": "single", "d\\u0061ta": {"data": [1.5e3, -0, "\\"\u00e9"]}}'
+    validator = _validate_json_in_chunks(data.encode("utf-8"), chunk_size)
+    assert validator.top_level_keys == {"kind", "data"}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b'{"a": 1,}', b"[1 2]", b"01", b"1.", b'"\\x"', b"{}{}", b"NaN", b"\xff"],
+)
+def test_json_syntax_validator_rejects_invalid(data):
+    for chunk_size in (1, 1024):
+        with pytest.raises(ValueError):
+            _validate_json_in_chunks(data, chunk_size)
@@ -1,6 +1,6 @@
 """Minimal storage tests for client, utils, metadata, and quota paths."""
 
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
 
@@ -67,10 +67,1006 @@ def test_metadata_validation_and_filename():
         validate_data_filename("x.txt", "session")
 
 
-@patch("storage.objects.list_objects_by_type")
-def test_quota_counts(mock_list):
-    mock_list.return_value = [{"id": "1"}, {"id": "2"}]
+@patch("storage.quota.iter_minio_objects")
+@patch("storage.client.MINIO_ENABLED", True)
+def test_quota_counts(mock_iter):
+    mock_iter.return_value = iter(
+        {"key": key}
+        for key in [
+            "u/manifest.json",
+            "u/sessions/1/data.mvstory",
+            "u/sessions/1/metadata.json",
+            "u/sessions/2/metadata.json",
+            "u/stories/3/data.mvsj",
+            "u/stories/3/data.mvsj.gz",
+            "u/stories/3/metadata.json",
+            "u/stories/4/data.mvsj",
+        ]
+    )
+
+    from storage.quota import count_user_objects
+
+    # Only directories with metadata are objects; no metadata is downloaded
+    assert count_user_objects("u") == {"session": 2, "story": 1}
+    mock_iter.assert_called_once_with("u/")
+
+
+def _story_metadata(story_id="abc12345", user_id="u"):
+    return {
+        "id": story_id,
+        "type": "story",
+        "creator": {"id": user_id, "name": "n", "email": "e"},
+    }
+
+
+@patch("storage.client.MINIO_ENABLED", True)
+@patch("storage.objects.list_minio_objects")
+@patch("storage.client.minio_client")
+def test_lookup_object_reads_index_record(mock_minio, mock_list):
+    import json
+
+    from storage.objects import lookup_object
+
+    record = {
+        "id": "abc12345",
+        "type": "story",
+        "creator_id": "u",
+        "data_extension": ".mvsx",
+        "metadata": _story_metadata(),
+    }
+    response = Mock()
+    response.read.return_value = json.dumps(record).encode("utf-8")
+    mock_minio.get_object.return_value = response
+
+    assert lookup_object("abc12345", "story") == record
+    mock_minio.get_object.assert_called_once_with(
+        "root", "_index/ids/stories/abc12345.json"
+    )
+    mock_list.assert_not_called()
+
+
+@patch("storage.client.MINIO_ENABLED", True)
+@patch("storage.objects._load_metadata_from_directory")
+@patch("storage.objects.iter_minio_objects")
+@patch("storage.client.minio_client")
+def test_lookup_object_repairs_missing_index_record(mock_minio, mock_list, mock_load):
+    from minio.error import S3Error
+
+    from storage.objects import lookup_object
+
+    mock_minio.get_object.side_effect = S3Error(
+        code="NoSuchKey",
+        message="missing",
+        resource="r",
+        request_id="i",
+        host_id="h",
+        response=None,
+    )
+    mock_list.return_value = iter(
+        [
+            {"key": "u/sessions/abc12345/metadata.json"},
+            {"key": "u/stories/abc12345/data.mvsx"},
+            {"key": "u/stories/abc12345/metadata.json"},
+            {"key": "u/stories/other123/metadata.json"},
+        ]
+    )
+    mock_load.return_value = _story_metadata()
+
+    entry = lookup_object("abc12345", "story")
+
+    assert entry["creator_id"] == "u"
+    assert entry["data_extension"] == ".mvsx"
+    mock_load.assert_called_once_with("u/stories/abc12345/", "story")
+    assert (
+        mock_minio.put_object.call_args.kwargs["object_name"]
+        == "_index/ids/stories/abc12345.json"
+    )
+
+
+def test_complete_index_answers_unknown_ids_without_scanning(tmp_path):
+    import io
+    import json
+
+    from storage.backends import LocalFilesystemBackend
+    from storage.index import is_index_complete, rebuild_id_index, write_index_entry
+    from storage.objects import lookup_object
+
+    backend = LocalFilesystemBackend(tmp_path)
+    metadata = json.dumps(_story_metadata()).encode("utf-8")
+
+    with patch("storage.client.storage_backend", backend):
+        for name, data in (("metadata.json", metadata), ("data.mvsj", b"{}")):
+            key = f"u/stories/abc12345/{name}"
+            backend.put(key, io.BytesIO(data), len(data), "application/json")
+
+        assert rebuild_id_index(("story",)) == {"story": 1}
+        assert is_index_complete("story")
+        with patch("storage.objects.scan_object_locations") as mock_scan:
+            assert lookup_object("ffff0000", "story") is None
+            assert lookup_object("abc12345", "story")["creator_id"] == "u"
+        mock_scan.assert_not_called()
+
+        # A record that cannot be written makes lookups scan again
+        with patch("storage.index.write_json_object", side_effect=OSError("full")):
+            write_index_entry(_story_metadata("abc00000"), "story", ".mvsj")
+        assert not is_index_complete("story")
+
+
+def _no_such_key():
+    return _s3_error("NoSuchKey")
+
+
+def _s3_error(code):
+    from minio.error import S3Error
+
+    return S3Error(
+        code=code,
+        message="missing",
+        resource="r",
+        request_id="i",
+        host_id="h",
+        response=None,
+    )
+
+
+@patch("storage.client.MINIO_ENABLED", True)
+@patch("storage.objects.list_minio_objects")
+@patch("storage.client.minio_client")
+def test_list_user_objects_reads_manifest(mock_minio, mock_list):
+    import json
+    from datetime import datetime, timezone
+
+    from storage.objects import list_objects_by_type
+
+    manifest = {
+        "version": 1,
+        "user_id": "u",
+        "reconciled_at": datetime.now(timezone.utc).isoformat(),
+        "sessions": {"s1": {"id": "s1", "type": "session"}},
+        "stories": {"abc12345": _story_metadata()},
+    }
+    response = Mock()
+    response.read.return_value = json.dumps(manifest).encode("utf-8")
+    mock_minio.get_object.return_value = response
+
+    assert list_objects_by_type("session", user_id="u") == [
+        {"id": "s1", "type": "session"}
+    ]
+    mock_minio.get_object.assert_called_once_with("root", "u/manifest.json")
+    mock_list.assert_not_called()
+
+
+@patch("storage.client.MINIO_ENABLED", True)
+@patch("storage.client._conditional_writes_verified", True)
+@patch("storage.objects._load_metadata_from_directory")
+@patch("storage.objects.list_minio_objects")
+@patch("storage.client.s3_client")
+@patch("storage.client.minio_client")
+def test_missing_manifest_is_rebuilt_from_listing(
+    mock_minio, mock_s3, mock_list, mock_load
+):
+    import json
+
+    from storage.objects import list_objects_by_type
+
+    written = {}
+
+    def capture_put(Bucket, Key, Body, ContentType, IfNoneMatch):
+        written[Key] = json.loads(Body)
+        assert IfNoneMatch == "*"
+        return {"ETag": '"new"'}
+
+    mock_minio.get_object.side_effect = _no_such_key()
+    mock_s3.put_object.side_effect = capture_put
+    mock_list.return_value = [
+        {"key": "u/manifest.json"},
+        {"key": "u/stories/abc12345/metadata.json"},
+        {"key": "u/stories/abc12345/data.mvsj"},
+    ]
+    mock_load.return_value = _story_metadata()
+
+    assert list_objects_by_type("story", user_id="u") == [_story_metadata()]
+    mock_list.assert_called_once_with("u/")
+
+    assert list(written["u/manifest.json"]["stories"]) == ["abc12345"]
+    assert written["u/manifest.json"]["sessions"] == {}
+
+
+def _json_response(value):
+    import json
+
+    response = Mock()
+    response.read.return_value = json.dumps(value).encode("utf-8")
+    return response
+
+
+@patch("storage.client.MINIO_ENABLED", True)
+@patch("storage.objects._list_objects_for_all_users")
+@patch("storage.catalog.list_minio_objects")
+@patch("storage.client.s3_client")
+@patch("storage.client.minio_client")
+def test_anonymous_story_listing_reads_catalog_shards(
+    mock_minio, mock_s3, mock_list, mock_scan
+):
+    from datetime import datetime, timezone
+
+    from storage.objects import list_objects_by_type
+
+    built_at = datetime.now(timezone.utc).isoformat()
+    shards = {
+        "_index/catalog/stories/catalog.json": {"version": 1, "built_at": built_at},
+        "_index/catalog/stories/shard-a.json": {
+            "stories": {"abc12345": _story_metadata("abc12345")}
+        },
+        "_index/catalog/stories/shard-f.json": {
+            "stories": {"f0000000": _story_metadata("f0000000", "v")}
+        },
+    }
+    mock_minio.get_object.side_effect = lambda bucket, key: _json_response(shards[key])
+    mock_list.return_value = [{"key": key} for key in shards]
+
+    stories = list_objects_by_type("story")
+
+    assert sorted(story["id"] for story in stories) == ["abc12345", "f0000000"]
+    mock_list.assert_called_once_with("_index/catalog/stories/")
+    mock_scan.assert_not_called()
+    mock_s3.put_object.assert_not_called()
+
+
+@patch("storage.client._conditional_writes_verified", True)
+@patch("storage.client.s3_client")
+@patch("storage.client.minio_client")
+def test_update_catalog_record_writes_story_shard(mock_minio, mock_s3):
+    import json
+
+    from storage.catalog import update_catalog_record
+
+    stored = {
+        "_index/catalog/stories/shard-a.json": {
+            "stories": {"a1111111": _story_metadata("a1111111")}
+        }
+    }
+
+    def get_object(bucket, key):
+        if key not in stored:
+            raise _no_such_key()
+        response = _json_response(stored[key])
+        response.headers = {"ETag": '"abc"'}
+        return response
+
+    def put_object(Bucket, Key, Body, ContentType, IfMatch):
+        stored[Key] = json.loads(Body)
+        assert IfMatch == '"abc"'
+        return {"ETag": '"new"'}
+
+    mock_minio.get_object.side_effect = get_object
+    mock_s3.put_object.side_effect = put_object
+
+    update_catalog_record(_story_metadata("abc12345"))
+
+    shard = stored["_index/catalog/stories/shard-a.json"]["stories"]
+    assert sorted(shard) == ["a1111111", "abc12345"]
+    assert mock_s3.put_object.call_count == 1
+
+
+def test_installed_s3_client_supports_conditional_puts():
+    import botocore.session
+
+    model = botocore.session.get_session().get_service_model("s3")
+    members = model.operation_model("PutObject").input_shape.members
+    assert {"IfMatch", "IfNoneMatch"} <= set(members)
+
+
+@patch("storage.client.s3_client")
+@patch("storage.client.minio_client")
+def test_conditional_writes_are_refused_if_server_ignores_them(
+    mock_minio, mock_s3, monkeypatch
+):
+    from storage.backends import ObjectChangedError, StorageError
+    from storage.client import CONDITIONAL_WRITE_PROBE_KEY, MinioBackend
+
+    monkeypatch.setattr("storage.client._conditional_writes_verified", False)
+
+    mock_minio.put_object.return_value = Mock(etag="abc")
+    mock_minio.list_buckets.return_value = []
+    mock_s3.put_object.return_value = {"ETag": '"def"'}
+    with pytest.raises(StorageError, match="conditional writes are required"):
+        MinioBackend().put_conditional("k", b"{}", "application/json", None)
+    with pytest.raises(StorageError):
+        MinioBackend().ping()
+
+    # A server enforcing the conditions refuses both probe writes
+    mock_s3.put_object.side_effect = _client_error("PreconditionFailed")
+    assert MinioBackend().ping()["conditional_writes"] is True
+    with pytest.raises(ObjectChangedError):
+        MinioBackend().put_conditional("k", b"{}", "application/json", "abc")
+    assert mock_s3.put_object.call_args.kwargs["Key"] == "k"
+    assert (
+        mock_minio.put_object.call_args.kwargs["object_name"]
+        == CONDITIONAL_WRITE_PROBE_KEY
+    )
+
+
+def _client_error(code):
+    from botocore.exceptions import ClientError
+
+    return ClientError({"Error": {"Code": code, "Message": "m"}}, "PutObject")
+
+
+def test_catalog_rebuild_keeps_story_writes_made_during_scan(tmp_path):
+    import io
+
+    from storage.backends import LocalFilesystemBackend
+    from storage.catalog import (
+        read_catalog_shard,
+        rebuild_story_catalog,
+        remove_catalog_records,
+        update_catalog_record,
+    )
+
+    backend = LocalFilesystemBackend(tmp_path)
+
+    def store_metadata(story_id):
+        key = f"u/stories/{story_id}/metadata.json"
+        backend.put(key, io.BytesIO(b"{}"), 2, "application/json")
+
+    def scan(data_type):
+        # a2 is saved and a3 deleted while the scan is running
+        store_metadata("a2")
+        update_catalog_record(_story_metadata("a2"))
+        backend.delete(["u/stories/a3/metadata.json"])
+        remove_catalog_records(["a3"])
+        return [_story_metadata("a1"), _story_metadata("a3")]
+
+    with (
+        patch("storage.client.storage_backend", backend),
+        patch("storage.objects.scan_all_users_objects", side_effect=scan),
+    ):
+        for story_id in ("a1", "a3"):
+            store_metadata(story_id)
+            update_catalog_record(_story_metadata(story_id))
+
+        assert rebuild_story_catalog() == 2
+        assert sorted(read_catalog_shard("a")) == ["a1", "a2"]
+
+
+def test_missing_catalog_is_built_by_one_worker(tmp_path):
+    from datetime import datetime, timezone
+
+    from storage.backends import LocalFilesystemBackend
+    from storage.cache import write_json_object
+    from storage.catalog import CATALOG_MARKER_KEY, list_catalog_stories
+
+    with (
+        patch("storage.client.storage_backend", LocalFilesystemBackend(tmp_path)),
+        patch("storage.catalog.CATALOG_BUILD_WAIT_SECONDS", 0),
+        patch("storage.catalog.rebuild_story_catalog") as mock_rebuild,
+    ):
+        # Another worker claimed the build: wait for it instead of scanning
+        started_at = datetime.now(timezone.utc).isoformat()
+        claim = {"version": 1, "rebuild_started_at": started_at}
+        write_json_object(CATALOG_MARKER_KEY, claim)
+        with pytest.raises(APIError) as exc_info:
+            list_catalog_stories()
+        assert exc_info.value.status_code == 503
+        mock_rebuild.assert_not_called()
+
+        # A claim that never completed is taken over
+        claim["rebuild_started_at"] = "2024-01-01T00:00:00+00:00"
+        write_json_object(CATALOG_MARKER_KEY, claim)
+        assert list_catalog_stories() == []
+        mock_rebuild.assert_called_once_with()
+
+
+def test_stale_catalog_is_rebuilt_once_in_background(tmp_path):
+    from storage.backends import LocalFilesystemBackend
+    from storage.cache import write_json_object
+    from storage.catalog import CATALOG_MARKER_KEY, get_catalog_version
+
+    with (
+        patch("storage.client.storage_backend", LocalFilesystemBackend(tmp_path)),
+        patch("storage.catalog._schedule_catalog_rebuild") as mock_schedule,
+    ):
+        marker = {"version": 1, "built_at": "2024-01-01T00:00:00+00:00"}
+        write_json_object(CATALOG_MARKER_KEY, marker)
+
+        get_catalog_version()
+        get_catalog_version()
+
+    mock_schedule.assert_called_once_with()
+
+
+@patch("storage.client.minio_client")
+def test_metadata_cache_revalidates_by_etag(mock_minio, monkeypatch):
+    from storage.cache import metadata_cache, read_json_object
+
+    response = _json_response({"id": "abc12345"})
+    response.headers = {"ETag": '"etag-1"'}
+    mock_minio.get_object.return_value = response
+
+    first = read_json_object("u/stories/abc12345/metadata.json")
+    first["title"] = "modified by caller"
+    assert read_json_object("u/stories/abc12345/metadata.json") == {"id": "abc12345"}
+    assert mock_minio.get_object.call_count == 1
+    mock_minio.stat_object.assert_not_called()
+
+    # Once the TTL has passed, an unchanged ETag costs only a stat
+    monkeypatch.setattr(metadata_cache, "ttl_seconds", 0)
+    mock_minio.stat_object.return_value = Mock(etag="etag-1")
+    assert read_json_object("u/stories/abc12345/metadata.json") == {"id": "abc12345"}
+    assert mock_minio.get_object.call_count == 1
+
+    # A changed ETag re-downloads the object
+    mock_minio.stat_object.return_value = Mock(etag="etag-2")
+    read_json_object("u/stories/abc12345/metadata.json")
+    assert mock_minio.get_object.call_count == 2
+
+    stats = metadata_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["revalidations"]) == (2, 2, 1)
+
+
+def test_metadata_cache_evicts_least_recently_used():
+    from storage.cache import MetadataCache
+
+    cache = MetadataCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", {}, "1")
+    cache.put("b", {}, "2")
+    cache.get("a")
+    cache.put("c", {}, "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+@patch("storage.objects._load_metadata_from_directory")
+def test_process_objects_for_user_loads_concurrently_in_order(mock_load):
+    import threading
+    import time
+
+    from storage.objects import _process_objects_for_user
+
+    thread_names = set()
+
+    def load(dir_path, data_type):
+        thread_names.add(threading.current_thread().name)
+        story_id = dir_path.split("/")[2]
+        # Later directories finish first; failures must not affect the others
+        time.sleep(0.01 * (5 - int(story_id[-1])))
+        if story_id.endswith("3"):
+            return None
+        return {"id": story_id}
+
+    mock_load.side_effect = load
+    objects = [{"key": f"u/stories/s{i}/metadata.json"} for i in range(5)]
+
+    result = _process_objects_for_user(objects, "story", "u")
+
+    assert [metadata["id"] for metadata in result] == ["s0", "s1", "s2", "s4"]
+    assert all(name.startswith("storage-io") for name in thread_names)
+
+
+@patch("storage.objects.iter_minio_objects")
+def test_iter_object_directories_groups_single_listing(mock_iter):
+    from storage.objects import iter_object_directories
+
+    mock_iter.return_value = iter(
+        [
+            {"key": "_index/catalog/stories/shard-a.json"},
+            {"key": "a/manifest.json"},
+            {"key": "a/sessions/s1/data.mvstory"},
+            {"key": "a/sessions/s1/metadata.json"},
+            {"key": "a/stories/t1/data.mvsj"},
+            {"key": "a/stories/t1/metadata.json"},
+            {"key": "b/stories/t2/metadata.json"},
+        ]
+    )
+
+    directories = list(iter_object_directories("stories"))
+
+    assert directories == [
+        ("a/stories/t1/", ["a/stories/t1/data.mvsj", "a/stories/t1/metadata.json"]),
+        ("b/stories/t2/", ["b/stories/t2/metadata.json"]),
+    ]
+    mock_iter.assert_called_once_with("")
+
+
+def test_ordered_view_cursor_is_stable_across_inserts():
+    from storage.pagination import OrderedView
+
+    records = [{"id": f"s{i}", "updated_at": f"2024-01-0{i}"} for i in range(1, 6)]
+
+    page, after = OrderedView(records, "updated_at").page(limit=2)
+    assert [r["id"] for r in page] == ["s5", "s4"]
+
+    # A newer record inserted after the first page does not shift the next one
+    records.append({"id": "s6", "updated_at": "2024-01-06"})
+    page, after = OrderedView(records, "updated_at").page(after, limit=2)
+    assert [r["id"] for r in page] == ["s3", "s2"]
+
+    page, after = OrderedView(records, "updated_at").page(after, limit=2)
+    assert [r["id"] for r in page] == ["s1"]
+    assert after is None
+
+
+@patch("storage.client.MINIO_ENABLED", True)
+@patch("storage.objects._unindex_deleted_objects")
+@patch("storage.objects.list_minio_objects")
+@patch("storage.client.minio_client")
+def test_delete_all_user_data_deletes_in_batches(mock_minio, mock_list, mock_unindex):
+    from minio.deleteobjects import DeleteError
+
+    from storage.objects import delete_all_user_data
+
+    keys = [
+        f"u/sessions/s{i:04d}/{name}"
+        for i in range(600)
+        for name in ("data.mvstory", "metadata.json")
+    ]
+    mock_list.return_value = [{"key": key} for key in keys]
+    mock_minio.remove_objects.side_effect = [
+        iter([DeleteError("AccessDenied", "denied", keys[0], None)]),
+        iter([]),
+    ]
+
+    summary = delete_all_user_data("u")
+
+    assert mock_minio.remove_objects.call_count == 2
+    assert [len(c.args[1]) for c in mock_minio.remove_objects.call_args_list] == [
+        1000,
+        200,
+    ]
+    mock_minio.remove_object.assert_not_called()
+    assert summary["total_objects_deleted"] == 1199
+    # Only a data file failed to delete; every session's metadata is gone
+    assert summary["sessions_deleted"] == 600
+    assert summary["failed_objects"] == [
+        {"key": keys[0], "error": "AccessDenied: denied"}
+    ]
+    assert keys[0] not in mock_unindex.call_args.args[0]
+
+
+def test_count_deleted_objects_counts_metadata_files():
+    from storage.objects import _count_deleted_objects
+
+    deleted = [
+        "u/manifest.json",
+        "u/sessions/s1/data.mvstory",
+        "u/sessions/s1/metadata.json",
+        "u/stories/t1/data.mvsj",
+        "u/stories/t1/data.mvsj.gz",
+        "u/stories/t1/metadata.json",
+        "u/stories/t2/data.mvsj",
+        "u/stories/t2/data.mvsj.gz",
+        "u/stories/t2/metadata.json",
+        "u/stories/t3/data.mvsj",
+    ]
+
+    assert _count_deleted_objects(deleted) == (1, 2)
+
+
+@patch("storage.client.MINIO_ENABLED", True)
+@patch("storage.client.minio_client")
+def test_bucket_check_is_memoized_until_bucket_goes_missing(mock_minio):
+    from storage.client import handle_minio_error, list_minio_objects
+
+    mock_minio.bucket_exists.return_value = True
+    mock_minio.list_objects.return_value = []
+
+    list_minio_objects("a/")
+    list_minio_objects("b/")
+    assert mock_minio.bucket_exists.call_count == 1
+
+    @handle_minio_error("op")
+    def fails_with_missing_bucket():
+        raise _s3_error("NoSuchBucket")
+
+    with pytest.raises(APIError):
+        fails_with_missing_bucket()
+
+    list_minio_objects("c/")
+    assert mock_minio.bucket_exists.call_count == 2
+
+
+@patch("storage.client.minio_client")
+def test_save_data_streams_spooled_upload_without_copying(mock_minio):
+    import tempfile
+    import zlib
+
+    import msgpack
+
+    from storage.objects import _save_data
+
+    payload = zlib.compress(msgpack.packb({"story": "x" * 100}))
+    upload = tempfile.SpooledTemporaryFile(max_size=16)
+    upload.write(payload)
+
+    stored = []
+
+    def put_object(**kwargs):
+        stored.append(kwargs["data"].read(kwargs["length"]))
+        return Mock(etag="etag")
+
+    mock_minio.put_object.side_effect = put_object
+    _save_data("u/sessions/s1", {"filename": "s.mvstory", "data": upload}, "session")
+
+    kwargs = mock_minio.put_object.call_args.kwargs
+    assert kwargs["object_name"] == "u/sessions/s1/data.mvstory"
+    assert kwargs["length"] == len(payload)
+    assert stored == [payload]
+
+
+@patch("storage.client.minio_client")
+def test_save_data_rejects_invalid_session_during_upload(mock_minio):
+    import io
+
+    from storage.objects import _save_data
+
+    sent = []
+
+    def put_object(**kwargs):
+        # Like MinIO, send the data only once all of it has been read
+        data = kwargs["data"].read(kwargs["length"])
+        sent.append(data)
+
+    mock_minio.put_object.side_effect = put_object
+    upload = io.BytesIO(b"\x92\x01")  # msgpack array missing an item
+
+    with pytest.raises(APIError) as exc_info:
+        _save_data(
+            "u/sessions/s1", {"filename": "s.mvstory", "data": upload}, "session"
+        )
+    assert exc_info.value.status_code == 400
+    assert "Invalid session file format" in exc_info.value.message
+    assert sent == []
+
+
+@patch("storage.objects._delete_old_story_data_files")
+@patch("storage.client.minio_client")
+def test_save_data_writes_compact_mvsj_with_wrapper_marker(mock_minio, mock_delete):
+    from storage.objects import _save_data
+
+    stored = []
+
+    def put_object(**kwargs):
+        stored.append(kwargs["data"].read())
+        return Mock(etag="etag")
+
+    mock_minio.put_object.side_effect = put_object
+
+    _save_data("u/stories/t1", {"filename": "s.mvsj", "data": {"a": [1, 2]}}, "story")
+    assert stored == [b'{"a":[1,2]}']
+    assert mock_minio.put_object.call_args.kwargs["metadata"] == {
+        "mvsj-wrapped": "false"
+    }
+
+    wrapped = {"data": {"a": 1}}
+    _save_data("u/stories/t1", {"filename": "s.mvsj", "data": wrapped}, "story")
+    assert mock_minio.put_object.call_args.kwargs["metadata"] == {
+        "mvsj-wrapped": "true"
+    }
+
+
+@patch("storage.objects._delete_old_story_data_files")
+@patch("storage.client.minio_client")
+def test_save_data_stores_gzip_variant_before_mvsj(mock_minio, mock_delete):
+    import gzip
+
+    from storage.objects import _save_data
+
+    stored = {}
+
+    def put_object(**kwargs):
+        stored[kwargs["object_name"]] = kwargs["data"].read()
+        return Mock(etag=f"etag-{len(stored)}")
+
+    mock_minio.put_object.side_effect = put_object
+    story = {"kind": "single", "text": "x" * 5000}
+
+    _save_data("u/stories/t1", {"filename": "s.mvsj", "data": story}, "story")
+
+    keys = [call.kwargs["object_name"] for call in mock_minio.put_object.call_args_list]
+    assert keys == ["u/stories/t1/data.mvsj.gz", "u/stories/t1/data.mvsj"]
+    assert gzip.decompress(stored["u/stories/t1/data.mvsj.gz"]) == (
+        stored["u/stories/t1/data.mvsj"]
+    )
+    assert mock_minio.put_object.call_args.kwargs["metadata"] == {
+        "mvsj-wrapped": "false",
+        "gzip-variant-etag": "etag-1",
+    }
+
+
+@patch("storage.objects._delete_old_story_data_files")
+@patch("storage.client.minio_client")
+def test_save_data_keeps_uploaded_mvsj_bytes(mock_minio, mock_delete):
+    import gzip
+    import io
+
+    from storage.objects import _save_data
+
+    stored = {}
+
+    def put_object(**kwargs):
+        stored[kwargs["object_name"]] = kwargs["data"].read()
+        return Mock(etag="gz-etag")
+
+    mock_minio.put_object.side_effect = put_object
+    upload = b'{\n  "data": {"text": "%s"},\n  "kind": "single"\n}' % (b"x" * 5000)
+
+    story = {"filename": "s.mvsj", "data": io.BytesIO(upload)}
+    _save_data("u/stories/t1", story, "story")
+
+    assert stored["u/stories/t1/data.mvsj"] == upload
+    assert gzip.decompress(stored["u/stories/t1/data.mvsj.gz"]) == upload
+    assert mock_minio.put_object.call_args.kwargs["metadata"] == {
+        "mvsj-wrapped": "true",
+        "gzip-variant-etag": "gz-etag",
+    }
+
+
+@patch("storage.objects._delete_old_story_data_files")
+@patch("storage.client.minio_client")
+def test_save_data_rejects_invalid_mvsj_before_writing(mock_minio, mock_delete):
+    import io
+
+    from storage.objects import _save_data
+
+    story = {"filename": "s.mvsj", "data": io.BytesIO(b'{"kind": "single",}')}
+    with pytest.raises(APIError) as exc_info:
+        _save_data("u/stories/t1", story, "story")
+
+    assert exc_info.value.status_code == 400
+    assert "Invalid .mvsj file format" in exc_info.value.message
+    mock_delete.assert_not_called()
+    mock_minio.put_object.assert_not_called()
+
+
+def test_updating_mvsx_story_writes_no_gzip_variant(tmp_path):
+    import io
+
+    from storage.backends import LocalFilesystemBackend
+    from storage.objects import _save_updated_story_data
+
+    backend = LocalFilesystemBackend(tmp_path)
+    prefix = "u/stories/abc12345"
+    with patch("storage.client.storage_backend", backend):
+        for name in ("metadata.json", "data.mvsx", "data.mvsx.gz", "data.mvsj.gz"):
+            backend.put(f"{prefix}/{name}", io.BytesIO(b"{}"), 2, "application/json")
+
+        story = {"kind": "single", "padding": "x" * 4096}
+        _save_updated_story_data(prefix, _story_metadata(), {"data": story}, "abc12345")
+
+        assert sorted(obj["key"] for obj in backend.list(prefix)) == [
+            f"{prefix}/data.mvsx",
+            f"{prefix}/metadata.json",
+        ]
+
+
+def test_detect_session_encoding():
+    import io
+    import zlib
+
+    import msgpack
+
+    from storage.utils import detect_session_encoding
+
+    payload = msgpack.packb({"version": 1, "data": b"x"})
+    assert detect_session_encoding(zlib.compress(payload)) == "deflate"
+    assert detect_session_encoding(payload) == "legacy-wrapper"
+    assert detect_session_encoding(msgpack.packb({"version": 1})) == "msgpack"
+    assert detect_session_encoding(msgpack.packb(1) + b"trailing") == "deflate"
+    assert detect_session_encoding(b"") == "deflate"
+
+    stream = io.BytesIO(payload)
+    assert detect_session_encoding(stream) == "legacy-wrapper"
+    assert stream.tell() == 0
+
+
+@patch("storage.client.minio_client")
+def test_save_data_records_session_encoding(mock_minio):
+    import zlib
+
+    import msgpack
+
+    from storage.objects import _save_data
+
+    blob = zlib.compress(msgpack.packb({"version": 1}))
+    _save_data("u/sessions/s1", {"filename": "s.mvstory", "data": blob}, "session")
+    assert mock_minio.put_object.call_args.kwargs["metadata"] == {
+        "session-encoding": "deflate"
+    }
+
+
+def test_local_backend_stores_and_reads_objects(tmp_path):
+    import hashlib
+    import io
+
+    from storage.backends import (
+        LocalFilesystemBackend,
+        ObjectChangedError,
+        ObjectNotFoundError,
+    )
+
+    backend = LocalFilesystemBackend(tmp_path)
+    assert backend.ping() == {}
+    assert backend.list_buckets() == [tmp_path.name]
+    body = b"0123456789"
+    etag = backend.put(
+        "u/stories/a/data.mvsj",
+        io.BytesIO(body),
+        len(body),
+        "application/json",
+        {"mvsj-wrapped": "false"},
+    )
+    backend.put("u/stories/a-b/x", io.BytesIO(b"x"), 1, "text/plain")
+
+    stat = backend.stat("u/stories/a/data.mvsj")
+    assert etag == stat.etag == hashlib.md5(body).hexdigest()
+    assert stat.size == len(body)
+    assert stat.metadata == {"x-amz-meta-mvsj-wrapped": "false"}
+    assert backend.get("u/stories/a/data.mvsj") == (body, etag)
+
+    whole = backend.get_range("u/stories/a/data.mvsj", etag=etag)
+    assert whole.fileno() >= 0
+    assert b"".join(whole) == body
+    assert b"".join(backend.get_range("u/stories/a/data.mvsj", 2, 3)) == b"234"
+    with pytest.raises(ObjectChangedError):
+        backend.get_range("u/stories/a/data.mvsj", etag="stale")
+    with pytest.raises(ObjectNotFoundError):
+        backend.stat("u/stories/missing")
+
+    with pytest.raises(ObjectChangedError):
+        backend.put_conditional("u/stories/a/data.mvsj", b"new", "text/plain", None)
+    with pytest.raises(ObjectChangedError):
+        backend.put_conditional("u/stories/a/data.mvsj", b"new", "text/plain", "stale")
+    assert backend.get("u/stories/a/data.mvsj") == (body, etag)
+    new_etag = backend.put_conditional("u/new", b"new", "text/plain", None)
+    assert backend.put_conditional("u/new", b"newer", "text/plain", new_etag)
+    backend.delete(["u/new"])
+
+    assert backend.copy("u/stories/a/data.mvsj", "u/stories/c/data.mvsj") == etag
+    assert [obj["key"] for obj in backend.list("u/stories/a")] == [
+        "u/stories/a-b/x",
+        "u/stories/a/data.mvsj",
+    ]
+
+    assert backend.delete(["u/stories/a/data.mvsj", "u/stories/gone"]) == []
+    assert not (tmp_path / "objects" / "u" / "stories" / "a").exists()
+    assert [obj["key"] for obj in backend.list("u/")] == [
+        "u/stories/a-b/x",
+        "u/stories/c/data.mvsj",
+    ]
+
+
+def test_metadata_cache_reads_through_local_backend(tmp_path):
+    from storage.backends import LocalFilesystemBackend
+    from storage.cache import read_json_object, remove_cached_object, write_json_object
+
+    with patch("storage.client.storage_backend", LocalFilesystemBackend(tmp_path)):
+        write_json_object("u/manifest.json", {"stories": {}})
+        assert read_json_object("u/manifest.json", revalidate=True) == {"stories": {}}
+        remove_cached_object("u/manifest.json")
+        assert read_json_object("u/manifest.json") is None
+
+
+def test_concurrent_manifest_updates_keep_both_records(tmp_path):
+    import io
+    import json
+    from datetime import datetime, timezone
+
+    from storage.backends import LocalFilesystemBackend
+    from storage.manifest import (
+        MANIFEST_VERSION,
+        _modify_manifest_records,
+        get_manifest_records,
+    )
+
+    backend = LocalFilesystemBackend(tmp_path)
+
+    def write_manifest(stories):
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "reconciled_at": datetime.now(timezone.utc).isoformat(),
+            "stories": stories,
+        }
+        data = json.dumps(manifest).encode("utf-8")
+        backend.put("u/manifest.json", io.BytesIO(data), len(data), "application/json")
+
+    def upsert(records):
+        # Another worker process adds its record between our read and write
+        if "other" not in records:
+            write_manifest({"other": {"id": "other"}})
+        records["mine"] = {"id": "mine"}
+
+    with patch("storage.client.storage_backend", backend):
+        write_manifest({})
+        _modify_manifest_records("u", "story", upsert)
+
+        records = get_manifest_records("u", "story")
+    assert sorted(record["id"] for record in records) == ["mine", "other"]
+
+
+def test_job_heartbeat_and_interrupted_jobs(tmp_path):
+    import threading
+
+    from storage import jobs
+    from storage.backends import LocalFilesystemBackend
+    from storage.cache import write_json_object
+
+    backend = LocalFilesystemBackend(tmp_path)
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    with (
+        patch("storage.client.storage_backend", backend),
+        patch("storage.jobs._ensure_heartbeat"),
+    ):
+        job = jobs.submit_job("test", "u", work)
+        assert started.wait(5)
+        record = jobs.read_job(job["job_id"])
+        assert record["status"] == "running"
+
+        jobs._touch_active_jobs()
+        assert jobs.read_job(job["job_id"])["updated_at"] > record["updated_at"]
+        release.set()
+        for _ in range(500):
+            if job["job_id"] not in jobs._active_jobs:
+                break
+            threading.Event().wait(0.01)
+        assert jobs.read_job(job["job_id"])["result"] == "done"
+
+        # A running job whose worker went away stops being touched
+        stale = dict(job, status="running", updated_at="2024-01-01T00:00:00+00:00")
+        write_json_object(jobs.get_job_key(job["job_id"]), stale)
+        with patch("storage.jobs.JOB_RECORD_TTL_SECONDS", float("inf")):
+            assert jobs.read_job(job["job_id"])["status"] == "interrupted"
+        # ... and the record eventually expires
+        assert jobs.read_job(job["job_id"]) is None
+        with patch("storage.jobs.JOB_RECORD_TTL_SECONDS", -1):
+            assert jobs.expire_job_records() == 1
+        assert list(backend.list("_jobs/")) == []
+
+
+def test_invalid_session_leaves_story_unchanged(tmp_path):
+    import io
+    import zlib
+
+    import msgpack
+
+    from storage.backends import LocalFilesystemBackend
+    from storage.objects import save_story_with_session
+
+    backend = LocalFilesystemBackend(tmp_path)
+    metadata = {
+        **_story_metadata(),
+        "title": "t",
+        "description": "",
+        "tags": [],
+        "created_at": "2024-01-01T00:00:00+00:00",
+        "updated_at": "2024-01-01T00:00:00+00:00",
+        "version": "1.0",
+    }
+    invalid_session = io.BytesIO(b"\x92\x01")  # msgpack array missing an item
+
+    def save(story, session):
+        story_data = {"filename": "s.mvsj", "data": io.BytesIO(story)}
+        return save_story_with_session("story", story_data, session, metadata)
 
-    from storage.quota import count_user_sessions
+    with patch("storage.client.storage_backend", backend):
+        # Create
+        with pytest.raises(APIError) as exc_info:
+            save(b'{"kind": "single"}', invalid_session)
+        assert exc_info.value.status_code == 400
+        assert list(backend.list("")) == []
 
-    assert count_user_sessions("u") == 2
+        # Update
+        save(b'{"v": 1}', io.BytesIO(zlib.compress(msgpack.packb({"v": 1}))))
+        keys = [obj["key"] for obj in backend.list("")]
+        with pytest.raises(APIError):
+            save(b'{"v": 2}', invalid_session)
+        assert [obj["key"] for obj in backend.list("")] == keys
+        assert backend.get("u/stories/abc12345/data.mvsj")[0] == b'{"v": 1}'
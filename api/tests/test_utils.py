@@ -5,7 +5,12 @@ import io
 import pytest
 from werkzeug.exceptions import RequestEntityTooLarge
 
-from utils import SizeLimitedStream, SizeValidationMiddleware, validate_payload_size
+from utils import (
+    SizeLimitedStream,
+    SizeValidationMiddleware,
+    stream_json_array,
+    validate_payload_size,
+)
 
 
 def test_validate_payload_size_no_content_length(app):
@@ -48,3 +53,29 @@ def test_size_validation_middleware_rejects_large_request():
     result = list(middleware(environ, start_response))
     assert status_holder["status"].startswith("413")
     assert isinstance(result, list) and result
+
+
+def test_stream_json_array_encodes_lazily_in_chunks(app, monkeypatch):
+    import json
+
+    monkeypatch.setattr("utils.JSON_STREAM_CHUNK_SIZE", 20)
+    consumed = []
+
+    def items():
+        for i in range(5):
+            consumed.append(i)
+            yield {"id": f"s{i}", "title": "x" * 10}
+
+    with app.test_request_context("/"):
+        resp = stream_json_array(items())
+    assert resp.mimetype == "application/json"
+    assert consumed == []
+
+    chunks = list(resp.response)
+    assert len(chunks) > 1
+    assert json.loads("".join(chunks)) == [
+        {"id": f"s{i}", "title": "x" * 10} for i in range(5)
+    ]
+
+    with app.test_request_context("/"):
+        assert json.loads("".join(stream_json_array([]).response)) == []
@@ -1,13 +1,26 @@
 """Utility functions and decorators."""
 
 import logging
+import os
+import tempfile
 from functools import wraps
 
-from flask import current_app, jsonify, request
+from flask import Request, Response, current_app, jsonify, request
+from werkzeug.datastructures import ContentRange
 from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
 
 logger = logging.getLogger(__name__)
 
+# Uploaded files are kept in memory up to this size, then spooled to disk
+UPLOAD_SPOOL_MAX_MEMORY_BYTES = int(
+    os.getenv("UPLOAD_SPOOL_MAX_MEMORY_BYTES", str(1024 * 1024))
+)
+
+# Encoded JSON is flushed to the client in chunks of about this many bytes
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+
 
 def validate_payload_size(max_size_mb=None):
     """
@@ -94,6 +107,169 @@ def validate_payload_size(max_size_mb=None):
     return decorator
 
 
+class SpooledUploadRequest(Request):
+    """
+    Request class that buffers uploaded files in bounded memory.
+
+    Each uploaded file is written to a SpooledTemporaryFile that moves to
+    disk once it grows beyond UPLOAD_SPOOL_MAX_MEMORY_BYTES, so the memory a
+    worker spends on an upload does not depend on the file size.
+    """
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        return tempfile.SpooledTemporaryFile(
+            max_size=UPLOAD_SPOOL_MAX_MEMORY_BYTES, mode="rb+"
+        )
+
+
+def get_upload_stream(file_storage):
+    """
+    Get the spooled stream of an uploaded file and its size, without reading it.
+
+    Args:
+        file_storage: Uploaded werkzeug FileStorage
+
+    Returns:
+        tuple: The stream, rewound to the start, and its size in bytes
+    """
+    stream = file_storage.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return stream, size
+
+
+def stream_json_array(items, status=200):
+    """
+    Build a response that encodes a JSON array one element at a time.
+
+    Unlike jsonify, neither the full list of converted items nor the full
+    encoded body is held in memory: elements are encoded as the iterable is
+    consumed and sent in chunks of about JSON_STREAM_CHUNK_SIZE bytes, so the
+    first bytes go out before the last item is converted.
+
+    Args:
+        items: Iterable of JSON-serializable values, consumed lazily
+        status: HTTP status code of the response
+    """
+    # Encode like jsonify; captured here as the generator runs outside the app context
+    dumps = current_app.json.dumps
+
+    def generate():
+        chunk = ["["]
+        chunk_size = 1
+        for index, item in enumerate(items):
+            encoded = ("," if index else "") + dumps(item)
+            chunk.append(encoded)
+            chunk_size += len(encoded)
+            if chunk_size >= JSON_STREAM_CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk, chunk_size = [], 0
+        chunk.append("]\n")
+        yield "".join(chunk)
+
+    return Response(generate(), status=status, mimetype="application/json")
+
+
+def set_object_validators(response, stat):
+    """Set the ETag and Last-Modified of a stored object on a response."""
+    response.set_etag(stat.etag)
+    response.last_modified = stat.last_modified
+    # Objects change when a story is updated, so caches must revalidate
+    response.cache_control.no_cache = True
+
+
+def conditional_object_response(stat):
+    """
+    Answer a conditional request for a stored object from its stat alone.
+
+    Returns:
+        Response or None: A 304 response if the client's copy is current
+            (If-None-Match / If-Modified-Since), otherwise None
+    """
+    if is_resource_modified(
+        request.environ, etag=stat.etag, last_modified=stat.last_modified
+    ):
+        return None
+    response = Response(status=304)
+    set_object_validators(response, stat)
+    return response
+
+
+def _if_range_matches(stat):
+    """Check whether a Range request's If-Range (if any) names this object."""
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == stat.etag
+    if if_range.date is not None:
+        return stat.last_modified.replace(microsecond=0) <= if_range.date
+    return True
+
+
+def stream_object_response(stat, read, mimetype, download_name=None):
+    """
+    Build a response that relays a stored object's body as it is read.
+
+    The body is never held in memory as a whole. The response carries the
+    object's ETag and Last-Modified, conditional requests are answered with
+    304 without reading the body, and a single byte range is answered with
+    206 from a ranged storage read.
+
+    Args:
+        stat: Stat of the stored object, with its size, ETag and modification time
+        read: Function `read(offset=0, length=0)` returning an iterable
+            that yields the object body (or the given range of it) in chunks.
+            A whole body with a fileno() is passed to the server's file
+            wrapper, which can send it with os.sendfile
+        mimetype: Content type of the response
+        download_name: If given, serve the body as an attachment with this name
+    """
+    not_modified = conditional_object_response(stat)
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = None
+    requested_range = request.range
+    if (
+        requested_range is not None
+        and requested_range.units == "bytes"
+        and len(requested_range.ranges) == 1
+        and _if_range_matches(stat)
+    ):
+        byte_range = requested_range.range_for_length(stat.size)
+        if byte_range is None:
+            response = Response(status=416)
+            response.headers["Content-Range"] = f"bytes */{stat.size}"
+            return response
+
+    if byte_range is None:
+        body = read()
+        if hasattr(body, "fileno"):
+            body = wrap_file(request.environ, body, buffer_size=64 * 1024)
+        response = Response(body, mimetype=mimetype, direct_passthrough=True)
+        response.content_length = stat.size
+    else:
+        start, stop = byte_range
+        response = Response(
+            read(start, stop - start),
+            status=206,
+            mimetype=mimetype,
+            direct_passthrough=True,
+        )
+        response.content_length = stop - start
+        response.content_range = ContentRange("bytes", start, stop, stat.size)
+
+    response.accept_ranges = "bytes"
+    set_object_validators(response, stat)
+    if download_name:
+        response.headers.set(
+            "Content-Disposition", "attachment", filename=download_name
+        )
+    return response
+
+
 class SizeLimitedStream:
     """Stream wrapper that enforces size limits during reading."""
 